@@ -2,14 +2,43 @@
 
 # استيراد المكتبات اللازمة
 import asyncio  # للعمليات غير المتزامنة (مثل الانتظار)
+import logging
+import time
 
 from pyrogram import filters  # لاستخدام فلاتر الرسائل (لتحديد الأوامر)
-from pyrogram.enums import ChatMembersFilter  # لتحديد نوع الأعضاء (مثل المشرفين)
 from pyrogram.errors import FloodWait  # للتعامل مع أخطاء الإرسال المتكرر (Flood)
 from YukkiMusic import app  # استيراد كائن التطبيق الرئيسي للبوت
 
-# قائمة لتخزين معرفات الدردشات التي تجري فيها عملية المنشن حاليًا لمنع التكرار
-SPAM_CHATS = []
+# دلو الرموز المشترك لضبط معدل الإرسال (يتعلم من قيم FloodWait)
+try:
+    from .flood_control import TokenBucket
+except ImportError:
+    from flood_control import TokenBucket
+
+# سجل الأعضاء المشترك (يُحدَّث تدريجيًا، مزامنة كاملة دورية فقط)
+try:
+    from .member_roster import FLAG_BOT, FLAG_DELETED, NOT_TAGGABLE, get_admin_ids, get_admin_members, get_roster
+except ImportError:
+    from member_roster import FLAG_BOT, FLAG_DELETED, NOT_TAGGABLE, get_admin_ids, get_admin_members, get_roster
+
+logger = logging.getLogger(__name__)
+
+# مجموعة معرفات الدردشات التي تجري فيها عملية المنشن حاليًا (set: فحص العضوية O(1))
+# الإلغاء = إزالة الدردشة من المجموعة، والمحرك يتحقق منها قبل كل إرسال وأثناء الانتظار
+SPAM_CHATS = set()
+# تقدم عملية المنشن لكل دردشة: {chat_id: {"done", "total", "messages", "started", "paused_until"}}
+TAG_PROGRESS = {}
+
+# --- إعدادات محرك المنشن ---
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096  # حد طول الرسالة (بوحدات UTF-16 كما يحسبها تيليجرام)
+MAX_MENTIONS_PER_MESSAGE = 90  # تيليجرام يقبل 100 كيان كحد أقصى؛ نترك هامشًا لتنسيق نص النداء
+TAG_SEND_RATE = 0.5  # رسائل في الثانية لكل دردشة في البداية (يتكيف مع FloodWait)
+TAG_MAX_SEND_RATE = 1.0
+TAG_MAX_FLOOD_WAIT_SECONDS = 900  # انتظار أطول من هذا يوقف العملية بدل الاستئناف
+MENTION_SEPARATOR = "  "
+
+# دلو رموز لكل دردشة، يحتفظ بالمعدل المتعلَّم بين العمليات
+_tag_buckets = {}
 
 
 # دالة للتحقق مما إذا كان المستخدم مشرفًا في الدردشة
@@ -17,36 +46,124 @@ async def is_admin(chat_id, user_id):
     """
     يتحقق مما إذا كان معرف المستخدم المحدد هو مشرف في معرف الدردشة المحدد.
     """
-    admin_ids = [
-        admin.user.id
-        # حلقة غير متزامنة للحصول على قائمة المشرفين
-        async for admin in app.get_chat_members(
-            chat_id, filter=ChatMembersFilter.ADMINISTRATORS
-        )
-    ]
+    # قائمة المشرفين من السجل المشترك (تُحدَّث صفحة المشرفين فقط عند انتهاء صلاحيتها)
+    admin_ids = await get_admin_ids(app, chat_id)
     # التحقق مما إذا كان معرف المستخدم موجودًا في قائمة معرفات المشرفين
     if user_id in admin_ids:
         return True
     return False
 
 
-# معالج الرسائل للأوامر المتعلقة بمنشن جميع الأعضاء
-@app.on_message(
-    filters.command(["all", "تاك", "mentionall", "tagall"], prefixes=["/", "@", ""])
-)
-async def tag_all_users(_, message):
+def _utf16_len(text):
+    """طول النص كما يحسبه تيليجرام (وحدات UTF-16)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+async def get_chat_roster(chat_id, admins_only=False):
     """
-    يقوم بعمل منشن لجميع الأعضاء في المجموعة (باستثناء البوتات والمحذوفين).
-    يتطلب أن يكون المستخدم الذي استدعى الأمر مشرفًا.
+    يعيد قائمة الأعضاء القابلين للمنشن [(user_id, first_name), ...] (بدون البوتات والمحذوفين والمحظورين).
+    القائمة تُقرأ من سجل الأعضاء المشترك محليًا، ولا تُعاد صفحات الأعضاء إلا عند المزامنة الدورية.
     """
-    # التحقق مما إذا كان مرسل الرسالة مشرفًا
-    admin = await is_admin(message.chat.id, message.from_user.id)
-    if not admin:
-        # إذا لم يكن مشرفًا، لا تفعل شيئًا
-        return
+    if admins_only:
+        # صفحة المشرفين فقط، بدون مزامنة كاملة للأعضاء
+        return [(user_id, name) for user_id, name, _ in await get_admin_members(app, chat_id, exclude=NOT_TAGGABLE)]
+    roster = await get_roster(app, chat_id)
+    # لقطة من السجل: قد يتغير السجل أثناء عملية المنشن
+    return [(user_id, name) for user_id, name, _ in roster.iter_members(exclude=NOT_TAGGABLE)]
+
+
+def format_mention(user_id, first_name):
+    # الأقواس في الاسم تكسر رابط الماركداون
+    name = first_name.replace("[", "(").replace("]", ")").strip() or "مستخدم"
+    return f"[{name}](tg://user?id={user_id})"
+
 
+def pack_mentions(roster, start, header=""):
+    """
+    يجمع أكبر عدد ممكن من المنشنات في رسالة واحدة بدءًا من الموضع start،
+    ضمن حد الكيانات (MAX_MENTIONS_PER_MESSAGE) وحد طول النص المعروض.
+    يعيد (نص المنشنات، الموضع التالي).
+    """
+    # الطول المعروض: نص النداء + اسم كل عضو + الفاصل (رابط الماركداون لا يُحسب)
+    length = _utf16_len(header) + 1 if header else 0
+    parts = []
+    index = start
+    while index < len(roster) and len(parts) < MAX_MENTIONS_PER_MESSAGE:
+        user_id, first_name = roster[index]
+        mention = format_mention(user_id, first_name)
+        visible = _utf16_len(mention[1:mention.index("](")]) + len(MENTION_SEPARATOR)
+        if parts and length + visible > TELEGRAM_MAX_MESSAGE_LENGTH:
+            break
+        parts.append(mention)
+        length += visible
+        index += 1
+    return MENTION_SEPARATOR.join(parts), index
+
+
+def _job_active(chat_id, progress):
+    """العملية ما زالت جارية: لم تُلغَ، ولم تحل محلها عملية أحدث في نفس الدردشة."""
+    return chat_id in SPAM_CHATS and TAG_PROGRESS.get(chat_id) is progress
+
+
+async def _sleep_unless_cancelled(chat_id, progress, seconds):
+    """ينتظر المدة المطلوبة، ويعيد False فورًا إذا أُلغيت العملية أثناء الانتظار."""
+    deadline = time.monotonic() + seconds
+    while _job_active(chat_id, progress):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        await asyncio.sleep(min(remaining, 1.0))
+    return False
+
+
+def new_tag_progress():
+    return {"done": 0, "total": 0, "messages": 0, "started": time.monotonic(), "paused_until": 0.0}
+
+
+async def run_tag_job(chat_id, progress, roster, send, header=""):
+    """
+    محرك المنشن: يرسل المنشنات على دفعات مجمّعة بمعدل يضبطه دلو الرموز.
+    عند FloodWait ينتظر المدة المطلوبة ثم يستأنف من نفس الدفعة (لا يتخلى عن العملية).
+    send(mentions_text) ترسل رسالة واحدة. progress هو TAG_PROGRESS[chat_id] ويُحدَّث أثناء التشغيل.
+    """
+    bucket = _tag_buckets.get(chat_id)
+    if bucket is None:
+        bucket = _tag_buckets[chat_id] = TokenBucket(TAG_SEND_RATE, max_rate=TAG_MAX_SEND_RATE)
+    progress["total"] = len(roster)
+    position = 0
+    while position < len(roster) and _job_active(chat_id, progress):
+        mentions, next_position = pack_mentions(roster, position, header)
+        await bucket.acquire()
+        if not _job_active(chat_id, progress):
+            break
+        try:
+            await send(mentions)
+        except FloodWait as e:
+            wait_seconds = float(e.value or 1)
+            bucket.on_flood_wait(wait_seconds)
+            if wait_seconds > TAG_MAX_FLOOD_WAIT_SECONDS:
+                logger.warning(f"Tagging in chat {chat_id} stopped: FloodWait {wait_seconds}s at {position}/{len(roster)}.")
+                break
+            logger.info(f"Tagging in chat {chat_id}: FloodWait {wait_seconds}s, resuming at {position}/{len(roster)} (rate now {bucket.rate:.2f}/s).")
+            progress["paused_until"] = time.monotonic() + wait_seconds
+            if not await _sleep_unless_cancelled(chat_id, progress, wait_seconds):
+                break
+            continue  # إعادة نفس الدفعة
+        bucket.on_success()
+        position = next_position
+        progress["done"] = position
+        progress["messages"] += 1
+    return progress
+
+
+async def start_tag_job(message, admins_only=False):
+    """
+    المنطق المشترك لأوامر منشن الكل ومنشن المشرفين:
+    التحقق من عدم وجود عملية جارية، تحديد النص أو الرد، ثم تشغيل المحرك.
+    """
+    chat_id = message.chat.id
     # التحقق مما إذا كانت عملية منشن جارية بالفعل في هذه الدردشة
-    if message.chat.id in SPAM_CHATS:
+    if chat_id in SPAM_CHATS:
         # إذا كانت جارية، أرسل رسالة تحذيرية
         return await message.reply_text(
             "النداء بدا اذا اردت ايقافه اضغط  /cancel"
@@ -65,100 +182,51 @@ async def tag_all_users(_, message):
         )
         return
 
-    # إذا كانت الرسالة ردًا
-    if replied:
-        usernum = 0  # عداد المستخدمين في الدفعة الحالية
-        usertxt = ""  # النص الذي يحتوي على المنشنات
-        try:
-            # أضف معرف الدردشة إلى قائمة الدردشات النشطة
-            SPAM_CHATS.append(message.chat.id)
-            # حلقة للحصول على جميع أعضاء الدردشة
-            async for m in app.get_chat_members(message.chat.id):
-                # إذا تم إلغاء العملية أثناء الحلقة، توقف
-                if message.chat.id not in SPAM_CHATS:
-                    break
-                # تجاهل الحسابات المحذوفة والبوتات
-                if m.user.is_deleted or m.user.is_bot:
-                    continue
-                usernum += 1
-                # إضافة منشن للمستخدم إلى النص
-                usertxt += f"[{m.user.first_name}](tg://user?id={m.user.id})  "
-                # إذا وصل عدد المستخدمين في الدفعة إلى 7
-                if usernum == 7:
-                    # أرسل المنشنات كرد على الرسالة الأصلية
-                    await replied.reply_text(
-                        usertxt,
-                        disable_web_page_preview=True,  # تعطيل معاينة الروابط
-                    )
-                    # انتظر ثانية واحدة لتجنب قيود تيليجرام
-                    await asyncio.sleep(1)
-                    # إعادة تعيين العداد والنص للدفعة التالية
-                    usernum = 0
-                    usertxt = ""
-
-            # إرسال أي منشنات متبقية بعد انتهاء الحلقة
-            if usernum != 0:
-                await replied.reply_text(
-                    usertxt,
-                    disable_web_page_preview=True,
-                )
-        # التعامل مع خطأ FloodWait (الإرسال المتكرر)
-        except FloodWait as e:
-            # انتظر للمدة المحددة في الخطأ
-            await asyncio.sleep(e.value)
-        # في النهاية، حاول إزالة معرف الدردشة من القائمة النشطة
-        try:
-            SPAM_CHATS.remove(message.chat.id)
-        except Exception:
-            pass
-    # إذا لم تكن الرسالة ردًا (ولكنها تحتوي على نص)
-    else:
-        usernum = 0
-        usertxt = ""
-        try:
-            # الحصول على النص من الرسالة (بعد الأمر)
-            text = message.text.split(None, 1)[1]
-            # أضف معرف الدردشة إلى القائمة النشطة
-            SPAM_CHATS.append(message.chat.id)
-            # حلقة للحصول على جميع أعضاء الدردشة
-            async for m in app.get_chat_members(message.chat.id):
-                # إذا تم إلغاء العملية، توقف
-                if message.chat.id not in SPAM_CHATS:
-                    break
-                # تجاهل الحسابات المحذوفة والبوتات
-                if m.user.is_deleted or m.user.is_bot:
-                    continue
-                usernum += 1
-                # إضافة منشن للمستخدم
-                usertxt += f"[{m.user.first_name}](tg://user?id={m.user.id})  "
-                # إذا وصلت الدفعة إلى 7 مستخدمين
-                if usernum == 7:
-                    # أرسل رسالة جديدة تحتوي على النص الأصلي والمنشنات
-                    await app.send_message(
-                        message.chat.id,
-                        f"{text}\n{usertxt}",
-                        disable_web_page_preview=True,
-                    )
-                    # انتظر ثانيتين
-                    await asyncio.sleep(2)
-                    # إعادة تعيين العداد والنص
-                    usernum = 0
-                    usertxt = ""
-            # إرسال أي منشنات متبقية
-            if usernum != 0:
-                await app.send_message(
-                    message.chat.id,
-                    f"{text}\n\n{usertxt}",
-                    disable_web_page_preview=True,
-                )
-        # التعامل مع خطأ FloodWait
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-        # في النهاية، حاول إزالة معرف الدردشة من القائمة النشطة
-        try:
-            SPAM_CHATS.remove(message.chat.id)
-        except Exception:
-            pass
+    # أضف معرف الدردشة إلى مجموعة الدردشات النشطة
+    SPAM_CHATS.add(chat_id)
+    progress = TAG_PROGRESS[chat_id] = new_tag_progress()
+    try:
+        roster = await get_chat_roster(chat_id, admins_only)
+        if replied:
+            # إرسال المنشنات كرد على الرسالة الأصلية
+            header = ""
+
+            async def send(mentions):
+                await replied.reply_text(mentions, disable_web_page_preview=True)
+        else:
+            # إرسال رسالة جديدة تحتوي على النص الأصلي والمنشنات
+            header = message.text.split(None, 1)[1]
+
+            async def send(mentions):
+                await app.send_message(chat_id, f"{header}\n{mentions}", disable_web_page_preview=True)
+
+        await run_tag_job(chat_id, progress, roster, send, header)
+        logger.info(f"Tagging in chat {chat_id} finished: {progress['done']}/{progress['total']} in {progress['messages']} message(s).")
+    except FloodWait as e:
+        # FloodWait أثناء جلب قائمة الأعضاء
+        logger.warning(f"FloodWait {e.value}s while fetching members of chat {chat_id}; tagging aborted.")
+    finally:
+        # في النهاية، إزالة معرف الدردشة من المجموعة النشطة (إلا إذا بدأت عملية أحدث بعد الإلغاء)
+        if TAG_PROGRESS.get(chat_id) is progress:
+            SPAM_CHATS.discard(chat_id)
+            TAG_PROGRESS.pop(chat_id, None)
+
+
+# معالج الرسائل للأوامر المتعلقة بمنشن جميع الأعضاء
+@app.on_message(
+    filters.command(["all", "تاك", "mentionall", "tagall"], prefixes=["/", "@", ""])
+)
+async def tag_all_users(_, message):
+    """
+    يقوم بعمل منشن لجميع الأعضاء في المجموعة (باستثناء البوتات والمحذوفين).
+    يتطلب أن يكون المستخدم الذي استدعى الأمر مشرفًا.
+    """
+    # التحقق مما إذا كان مرسل الرسالة مشرفًا
+    admin = await is_admin(message.chat.id, message.from_user.id)
+    if not admin:
+        # إذا لم يكن مشرفًا، لا تفعل شيئًا
+        return
+    await start_tag_job(message)
 
 
 # دالة لعمل منشن لجميع المشرفين (تُستدعى داخليًا)
@@ -167,99 +235,7 @@ async def tag_all_admins(_, message):
     يقوم بعمل منشن لجميع المشرفين في المجموعة.
     مشابهة لدالة tag_all_users ولكن تستهدف المشرفين فقط.
     """
-    # التحقق مما إذا كانت عملية منشن جارية بالفعل
-    if message.chat.id in SPAM_CHATS:
-        return await message.reply_text(
-            "النداء بدا اذا اردت ايقافه اضغط  /cancel"
-            # الترجمة: "عملية المنشن قيد التشغيل بالفعل. إذا كنت تريد إيقافها، استخدم /cancel"
-        )
-
-    replied = message.reply_to_message
-    # التحقق من وجود نص أو رد
-    if len(message.command) < 2 and not replied:
-        await message.reply_text(
-            "** اكتب النداء الذي تريد ان تنادي به الكل, مثلا »** `@all حوار مع نكراني`"
-            # الترجمة: "** أعطِ نصًا لعمل منشن للكل، مثل »** `@admins مرحبًا يا أصدقاء`"
-        )
-        return
-
-    # إذا كانت الرسالة ردًا
-    if replied:
-        usernum = 0
-        usertxt = ""
-        try:
-            SPAM_CHATS.append(message.chat.id)
-            # حلقة للحصول على المشرفين فقط
-            async for m in app.get_chat_members(
-                message.chat.id, filter=ChatMembersFilter.ADMINISTRATORS
-            ):
-                if message.chat.id not in SPAM_CHATS:
-                    break
-                if m.user.is_deleted or m.user.is_bot:
-                    continue
-                usernum += 1
-                usertxt += f"[{m.user.first_name}](tg://user?id={m.user.id})  "
-                if usernum == 7:
-                    # إرسال المنشنات كرد
-                    await replied.reply_text(
-                        usertxt,
-                        disable_web_page_preview=True,
-                    )
-                    await asyncio.sleep(1)
-                    usernum = 0
-                    usertxt = ""
-            # إرسال المنشنات المتبقية
-            if usernum != 0:
-                await replied.reply_text(
-                    usertxt,
-                    disable_web_page_preview=True,
-                )
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-        try:
-            SPAM_CHATS.remove(message.chat.id)
-        except Exception:
-            pass
-    # إذا لم تكن الرسالة ردًا (ولكنها تحتوي على نص)
-    else:
-        usernum = 0
-        usertxt = ""
-        try:
-            text = message.text.split(None, 1)[1]
-            SPAM_CHATS.append(message.chat.id)
-            # حلقة للحصول على المشرفين فقط
-            async for m in app.get_chat_members(
-                message.chat.id, filter=ChatMembersFilter.ADMINISTRATORS
-            ):
-                if message.chat.id not in SPAM_CHATS:
-                    break
-                if m.user.is_deleted or m.user.is_bot:
-                    continue
-                usernum += 1
-                usertxt += f"[{m.user.first_name}](tg://user?id={m.user.id})  "
-                if usernum == 7:
-                    # إرسال رسالة جديدة بالنص والمنشنات
-                    await app.send_message(
-                        message.chat.id,
-                        f"{text}\n{usertxt}",
-                        disable_web_page_preview=True,
-                    )
-                    await asyncio.sleep(2)
-                    usernum = 0
-                    usertxt = ""
-            # إرسال المنشنات المتبقية
-            if usernum != 0:
-                await app.send_message(
-                    message.chat.id,
-                    f"{text}\n\n{usertxt}",
-                    disable_web_page_preview=True,
-                )
-        except FloodWait as e:
-            await asyncio.sleep(e.value)
-        try:
-            SPAM_CHATS.remove(message.chat.id)
-        except Exception:
-            pass
+    await start_tag_job(message, admins_only=True)
 
 
 # معالج الرسائل لأوامر المشرفين والإبلاغ
@@ -279,13 +255,8 @@ async def admintag_with_reporting(client, message):
     chat_id = message.chat.id
     from_user_id = message.from_user.id
 
-    # الحصول على قائمة معرفات المشرفين
-    admins = [
-        admin.user.id
-        async for admin in client.get_chat_members(
-            chat_id, filter=ChatMembersFilter.ADMINISTRATORS
-        )
-    ]
+    # الحصول على قائمة معرفات المشرفين (من السجل المشترك)
+    admins = await get_admin_ids(client, chat_id)
 
     # إذا كان الأمر هو "report"
     if message.command[0] == "report":
@@ -337,12 +308,10 @@ async def admintag_with_reporting(client, message):
     text = f"Reported {user_mention} to admins!." # النص الأساسي للرسالة
     # الترجمة: "تم الإبلاغ عن {user_mention} للمشرفين!."
 
-    # إضافة منشنات مخفية لجميع المشرفين (غير البوتات وغير المحذوفين)
-    for admin in admins:
-        admin_member = await client.get_chat_member(chat_id, admin)
-        if not admin_member.user.is_bot and not admin_member.user.is_deleted:
-            # استخدام الحرف Unicode U+2063 لإنشاء منشن مخفي
-            text += f"[\u2063](tg://user?id={admin})"
+    # إضافة منشنات مخفية لجميع المشرفين (غير البوتات وغير المحذوفين، من أعلام السجل بدون طلب لكل مشرف)
+    for admin in await get_admin_ids(client, chat_id, exclude=FLAG_BOT | FLAG_DELETED):
+        # استخدام الحرف Unicode U+2063 لإنشاء منشن مخفي
+        text += f"[\u2063](tg://user?id={admin})"
 
     # إرسال رسالة الإبلاغ كرد على الرسالة المبلغ عنها
     await reply.reply_text(text)
@@ -373,15 +342,14 @@ async def cancelcmd(_, message):
     if not admin:
         return
 
-    # التحقق مما إذا كانت الدردشة في قائمة العمليات النشطة
+    # التحقق مما إذا كانت الدردشة في مجموعة العمليات النشطة
     if chat_id in SPAM_CHATS:
-        try:
-            # إزالة الدردشة من القائمة لإيقاف العملية
-            SPAM_CHATS.remove(chat_id)
-        except Exception:
-            pass
+        # إزالة الدردشة من المجموعة لإيقاف العملية (المحرك يتوقف قبل الإرسال التالي أو أثناء الانتظار)
+        SPAM_CHATS.discard(chat_id)
+        progress = TAG_PROGRESS.get(chat_id)
+        done_text = f"\nتم نداء {progress['done']} من {progress['total']}" if progress else ""
         # إرسال رسالة تأكيد بالإيقاف
-        return await message.reply_text("**تم ايقاف عمية النداء!**")
+        return await message.reply_text(f"**تم ايقاف عمية النداء!**{done_text}")
         # الترجمة: "**تم إيقاف عملية المنشن بنجاح!**"
     else:
         # إذا لم تكن هناك عملية جارية
@@ -390,6 +358,29 @@ async def cancelcmd(_, message):
         return
 
 
+# معالج الرسائل لعرض تقدم عملية النداء الجارية
+@app.on_message(
+    filters.command(["tagstatus", "حالة_النداء"], prefixes=["/", "@", ""]) & filters.group
+)
+async def tag_status_cmd(_, message):
+    """
+    يعرض تقدم عملية النداء الجارية في الدردشة (عدد من تم نداؤهم والرسائل والانتظار).
+    """
+    progress = TAG_PROGRESS.get(message.chat.id)
+    if message.chat.id not in SPAM_CHATS or not progress:
+        return await message.reply_text("**لا تتم اي عملية نداء!**")
+    elapsed = int(time.monotonic() - progress["started"])
+    text = (
+        f"**تقدم النداء:** {progress['done']} / {progress['total']}\n"
+        f"**الرسائل المرسلة:** {progress['messages']}\n"
+        f"**المدة:** {elapsed} ثانية"
+    )
+    paused = int(progress["paused_until"] - time.monotonic())
+    if paused > 0:
+        text += f"\n**متوقف مؤقتًا (FloodWait):** {paused} ثانية ثم يستأنف"
+    await message.reply_text(text)
+
+
 # تعريف اسم الوحدة (للاستخدام داخل البوت)
 __MODULE__ = "Tᴀɢᴀʟʟ"
 # نص المساعدة الخاص بهذه الوحدة
@@ -400,6 +391,8 @@ __HELP__ = """
 /admins | @admins | /report [نص] أو [بالرد على رسالة] - لعمل منشن لجميع المشرفين في مجموعتك أو الإبلاغ عن رسالة لهم
 
 
+/tagstatus أو @tagstatus | حالة_النداء - لعرض تقدم عملية النداء الجارية
+
 /cancel أو @cancel | /offmention أو @offmention | /mentionoff أو @mentionoff | /cancelall أو @cancelall - لإيقاف أي عملية منشن جارية
 
 **__ملاحظة__** هذه الأوامر يمكن استخدامها فقط بواسطة مشرفي الدردشة وتأكد من أن البوت ومساعده (إذا كان موجودًا) لديهم صلاحيات المشرف في مجموعتك.
@@ -7,7 +7,7 @@ from dateutil.relativedelta import relativedelta
 from pathlib import Path
 
 from pyrogram import Client, filters
-from pyrogram.enums import ChatMembersFilter, ChatMemberStatus, ParseMode # استيراد ParseMode
+from pyrogram.enums import ChatMemberStatus, ParseMode # استيراد ParseMode
 from pyrogram.errors import (
     UserAlreadyParticipant, UserNotParticipant, ChatAdminRequired,
     ChannelPrivate, UserNotParticipant as PyrogramUserNotParticipant,
@@ -18,6 +18,12 @@ from pyrogram.errors import RPCError
 # --- استيراد مكونات YukkiMusic ---
 from YukkiMusic import app # استيراد العميل الرئيسي للبوت
 
+# --- سجل الأعضاء المشترك (قائمة المشرفين مخزنة ومحدثة من أحداث الأعضاء) ---
+try:
+    from .member_roster import FLAG_BOT, get_admin_ids
+except ImportError:
+    from member_roster import FLAG_BOT, get_admin_ids
+
 # --- استيراد المجدول ---
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -186,8 +192,8 @@ async def update_admin_list():
     print(f"[{datetime.now()}] [Monitor] جاري تحديث قائمة المشرفين للمحادثة {TARGET_CHAT_ID}...")
     fetched_admin_ids = set()
     try:
-        async for member in app.get_chat_members(TARGET_CHAT_ID, filter=ChatMembersFilter.ADMINISTRATORS):
-            if not member.user.is_bot: fetched_admin_ids.add(member.user.id)
+        # من السجل المشترك: صفحة المشرفين لا تُعاد إلا إذا انتهت صلاحيتها (ADMIN_RESYNC_SECONDS)
+        fetched_admin_ids = await get_admin_ids(app, TARGET_CHAT_ID, exclude=FLAG_BOT)
         admins_to_track = fetched_admin_ids - EXCLUDED_ADMIN_IDS
         print(f"[Monitor] تم جلب {len(fetched_admin_ids)} مشرف، سيتم تتبع {len(admins_to_track)} مشرف (بعد استثناء {len(EXCLUDED_ADMIN_IDS)}).")
         if admins_to_track:
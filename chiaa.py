@@ -18,24 +18,37 @@ except ImportError as e:
     app = None
     print(f"[HADITH_DEBUG] >>> WARNING: Could not import 'app' from 'YukkiMusic'. Error: {e}")
 
-import sqlite3, json, os, re, redis, html, logging, asyncio, uuid
-from typing import List, Dict, Optional, Any, Set, Tuple
+import sqlite3, json, os, re, html, logging, asyncio, uuid, time
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
+try:
+    from .hadith_store import (
+        DB_NAME, SNIPPET_CONTEXT_WORDS, HADITH_SEARCH_LIMIT, normalize_arabic, get_db_connection, update_stats,
+        get_hadith_snippets, search_hadiths_db, get_hadith_details, get_hadith_details_by_db_id, clear_local_search_cache,
+        init_db, populate_db_from_json, # Re-exported: setup_hadith_db.py builds the database through chiaa
+    )
+except ImportError:
+    from hadith_store import (
+        DB_NAME, SNIPPET_CONTEXT_WORDS, HADITH_SEARCH_LIMIT, normalize_arabic, get_db_connection, update_stats,
+        get_hadith_snippets, search_hadiths_db, get_hadith_details, get_hadith_details_by_db_id, clear_local_search_cache,
+        init_db, populate_db_from_json, # Re-exported: setup_hadith_db.py builds the database through chiaa
+    )
+
 # ==============================================================================
 #  Configuration
 # ==============================================================================
 BOT_OWNER_ID = 6504095190 # !!! استبدل بمعرف المالك الحقيقي !!!
 JSON_FILE = '1.json'
-DB_NAME = 'hadith_bot.db'
 MAX_MESSAGE_LENGTH = 4000
-SNIPPET_CONTEXT_WORDS = 7
 MAX_SNIPPETS_DISPLAY = 10
-USE_REDIS = True
-REDIS_HOST = 'localhost'
-REDIS_PORT = 6379
-REDIS_DB = 0
-CACHE_EXPIRY_SECONDS = 3600 * 6
+RESULT_SETS_MAX = 500 # Cached result lists for the next/previous page buttons
+RESULT_SET_TTL_SECONDS = 3600
+CONVERSATION_TTL_SECONDS = 1800 # Abandoned add-hadith conversations expire after this
+STATE_FLUSH_DELAY_SECONDS = 2 # Write-behind: state changes are batched to SQLite after this delay
+# قاعدة البيانات وفهرس البحث وذاكرة النتائج المؤقتة في hadith_store.py (DB_NAME, HADITH_SEARCH_LIMIT ...)
 
 # ==============================================================================
 #  Logging
@@ -45,168 +58,69 @@ logging.getLogger("pyrogram").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # ==============================================================================
-#  Redis Connection
-# ==============================================================================
-redis_pool = None
-redis_available = False
-if USE_REDIS:
-    try:
-        redis_pool = redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True, socket_connect_timeout=5)
-        r_conn_test = redis.Redis(connection_pool=redis_pool)
-        r_conn_test.ping(); redis_available = True; logger.info(f"Redis pool created ({REDIS_HOST}:{REDIS_PORT})")
-    except Exception as e: logger.warning(f"Redis connection failed. Caching disabled. Error: {e}"); USE_REDIS = False
-def get_redis_connection() -> Optional[redis.Redis]:
-    if redis_available and redis_pool:
-        try: return redis.Redis(connection_pool=redis_pool)
-        except Exception as e: logger.error(f"Redis connection error: {e}", exc_info=True)
-    return None
-
-# ==============================================================================
-#  Arabic Text Normalization (Taa Marbuta preserved AGAIN)
-# ==============================================================================
-alef_regex = re.compile(r'[أإآ]');
-# التأكد من أن السطر التالي معطل للحفاظ على التاء المربوطة
-# taa_marbuta_regex = re.compile(r'ة');
-yaa_regex = re.compile(r'ى')
-diacritics_punctuation_regex = re.compile(r'[\u064B-\u065F\u0670\u0640\u0610-\u061A\u06D6-\u06ED.,;:!؟\-_\'"()\[\]{}«»]')
-extra_space_regex = re.compile(r'\s+')
-def normalize_arabic(text: str) -> str:
-    """يطبق تطبيعًا محسنًا للنص العربي مع الحفاظ على التاء المربوطة."""
-    if not text or not isinstance(text, str): return ""
-    try:
-        text = alef_regex.sub('ا', text)
-        # text = taa_marbuta_regex.sub('ه', text) # <-- التأكد من أنه معطل
-        text = yaa_regex.sub('ي', text)
-        text = diacritics_punctuation_regex.sub('', text)
-        text = extra_space_regex.sub(' ', text).strip()
-        return text
-    except Exception as e: logger.error(f"Normalization error: {e}", exc_info=True); return text
-
-# ==============================================================================
-#  Database Functions
+#  Result Pages (نافذة من rowids لكل صفحة)
 # ==============================================================================
-def get_db_connection() -> sqlite3.Connection:
+result_sets: "OrderedDict[str, Tuple[float, str, array]]" = OrderedDict() # {token: (expires_at, search_query, rowids)}
+
+def store_result_set(search_query: str, rowids: List[int]) -> str:
+    token = uuid.uuid4().hex[:8]
+    result_sets[token] = (time.monotonic() + RESULT_SET_TTL_SECONDS, search_query, array('I', rowids))
+    while len(result_sets) > RESULT_SETS_MAX: result_sets.popitem(last=False)
+    return token
+
+def get_result_set(token: str) -> Optional[Tuple[str, array]]:
+    entry = result_sets.get(token)
+    if entry is None: return None
+    if entry[0] < time.monotonic(): del result_sets[token]; return None
+    return entry[1], entry[2]
+
+def make_snippet(text_norm: str, norm_query: str) -> str:
+    snippet = "..."
     try:
-        conn = sqlite3.connect(DB_NAME, timeout=10); conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL;"); conn.execute("PRAGMA busy_timeout = 5000;")
-        conn.execute("PRAGMA foreign_keys = ON;")
-        return conn
-    except sqlite3.Error as e: logger.critical(f"DB Connect Error: {e}", exc_info=True); raise
-
-def init_db(): # يجب تشغيله مرة واحدة عبر setup_hadith_db.py
-    logger.info("Initializing database schema (if needed)...")
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS hadiths_fts USING fts5(original_id UNINDEXED, book UNINDEXED, arabic_text, grading UNINDEXED, tokenize='unicode61 remove_diacritics 2');")
-            cursor.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID;")
-            stats_keys = ['search_count', 'hadith_added_count', 'hadith_approved_count', 'hadith_rejected_count']
-            cursor.executemany("INSERT OR IGNORE INTO stats (key, value) VALUES (?, 0)", [(k,) for k in stats_keys])
-            cursor.execute("CREATE TABLE IF NOT EXISTS pending_hadiths (submission_id INTEGER PRIMARY KEY AUTOINCREMENT, submitter_id INTEGER NOT NULL, submitter_username TEXT, book TEXT NOT NULL, arabic_text TEXT NOT NULL, grading TEXT, submission_time DATETIME DEFAULT CURRENT_TIMESTAMP, approval_message_id INTEGER NULL);")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_pending_submitter ON pending_hadiths(submitter_id);")
-            cursor.execute("CREATE TABLE IF NOT EXISTS user_states (user_id INTEGER PRIMARY KEY, state INTEGER NOT NULL, data TEXT) WITHOUT ROWID;")
-            logger.info("Database schema initialized/verified.")
-    except sqlite3.Error as e: logger.critical(f"CRITICAL: Database initialization failed: {e}", exc_info=True); raise
-
-def populate_db_from_json(filename: str): # يجب تشغيله مرة واحدة عبر setup_hadith_db.py
-    """يملأ جدول الأحاديث (FTS) من ملف JSON، ويحذف البيانات القديمة أولاً."""
-    logger.info("Checking database population...")
-    try:
-        if not os.path.exists(filename): logger.error(f"JSON file '{filename}' not found."); return
-
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-
-            # !! حذف البيانات الموجودة أولاً لتطبيق التطبيع الجديد !!
-            logger.warning("Dropping existing data from hadiths_fts to apply new normalization...")
-            cursor.execute("DELETE FROM hadiths_fts;")
-            logger.info("Existing data dropped. Populating with new normalization...")
-
-            with open(filename, 'r', encoding='utf-8') as f: data = json.load(f)
-            if not isinstance(data, list): logger.error("JSON is not a list."); return
-
-            added = 0; skipped = 0; to_insert = []
-            logger.info(f"Processing {len(data)} entries from JSON...")
-            for idx, h in enumerate(data):
-                if not isinstance(h, dict): skipped += 1; continue
-                text = h.get('arabicText')
-                if not text or not isinstance(text, str): skipped += 1; continue
-                book = h.get('book') or "غير معروف"; orig_id = str(h.get('id', f'gen_{uuid.uuid4()}'))
-                grading = h.get('majlisiGrading'); cleaned = re.sub(r"^\s*\d+[\s\u0640\.\-–—]*", "", text).strip()
-                if not cleaned: skipped += 1; continue
-                # استخدام الدالة المعدلة التي تحافظ على التاء المربوطة
-                normalized = normalize_arabic(cleaned)
-                if not normalized: skipped += 1; continue
-                to_insert.append((orig_id, book, normalized, grading)); added += 1
-                if (idx + 1) % 5000 == 0: logger.info(f"Processed {idx+1}/{len(data)}...")
-
-            if to_insert:
-                logger.info(f"Inserting {len(to_insert)} hadiths...")
-                cursor.executemany("INSERT INTO hadiths_fts (original_id, book, arabic_text, grading) VALUES (?, ?, ?, ?)", to_insert)
-                logger.info(f"Added {added} hadiths with new normalization. Skipped {skipped}.")
-            else: logger.warning("No valid hadiths found in JSON to insert.")
-
-    except Exception as e: logger.error(f"Population Error: {e}", exc_info=True)
-
-def update_stats(key: str, increment: int = 1):
-    try:
-        with get_db_connection() as conn: conn.execute("INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;", (key, increment))
-    except Exception as e: logger.error(f"Stat Update Error for '{key}': {e}", exc_info=True)
-
-def search_hadiths_db(query: str) -> List[int]:
-    original_query_str = query.strip(); normalized_search_query = normalize_arabic(original_query_str) # سيستخدم التطبيع الجديد
-    if not normalized_search_query: return []
-    print(f"  [HADITH_DEBUG] --- search_hadiths_db: Normalized query: '{normalized_search_query}'")
-    cache_key = f"hadith_search:{normalized_search_query}"; unique_rowids: List[int] = []; seen_original_ids: Set[str] = set()
-    if USE_REDIS: # Cache Check
-        redis_conn = get_redis_connection()
-        if redis_conn:
-            try:
-                cached_data = redis_conn.get(cache_key)
-                if cached_data:
-                    cached_rowids = json.loads(cached_data)
-                    if isinstance(cached_rowids, list): print(f"  [HADITH_DEBUG] --- search_hadiths_db: Cache HIT ({len(cached_rowids)} results)"); return cached_rowids
-                    else: redis_conn.delete(cache_key)
-            except Exception as e: logger.error(f"Redis GET error: {e}", exc_info=True)
-    try: # DB Search
-        with get_db_connection() as conn:
-            cursor = conn.cursor(); prefixes = ['و', 'ف', 'ب', 'ل', 'ك']
-            fts_query_parts = [f'"{normalized_search_query}"'] + [f'"{p}{normalized_search_query}"' for p in prefixes]
-            fts_match_query = " OR ".join(fts_query_parts)
-            print(f"  [HADITH_DEBUG] --- search_hadiths_db: Executing FTS query: {fts_match_query}")
-            cursor.execute("SELECT rowid, original_id FROM hadiths_fts WHERE hadiths_fts MATCH ? ORDER BY rank DESC", (fts_match_query,))
-            results = cursor.fetchall()
-            print(f"  [HADITH_DEBUG] --- search_hadiths_db: FTS query found {len(results)} potential matches.")
-            for row in results:
-                original_id_str = str(row['original_id']) if row['original_id'] is not None else None
-                if original_id_str and original_id_str not in seen_original_ids:
-                    seen_original_ids.add(original_id_str); unique_rowids.append(row['rowid'])
-            print(f"  [HADITH_DEBUG] --- search_hadiths_db: Deduplicated results count: {len(unique_rowids)}")
-            if USE_REDIS and unique_rowids: # Cache Set
-                redis_conn_set = get_redis_connection()
-                if redis_conn_set:
-                    try: redis_conn_set.set(cache_key, json.dumps(unique_rowids), ex=CACHE_EXPIRY_SECONDS); print("  [HADITH_DEBUG] --- search_hadiths_db: Results cached.")
-                    except Exception as e: logger.error(f"Redis SET error: {e}", exc_info=True)
-    except sqlite3.Error as e:
-         if "no such table" in str(e).lower(): logger.error(f"DB Error: 'hadiths_fts' table missing? {e}")
-         else: logger.error(f"DB search error: {e}", exc_info=True)
-    except Exception as e: logger.error(f"Unexpected search error: {e}", exc_info=True)
-    return unique_rowids
-
-def get_hadith_details_by_db_id(row_id: int) -> Optional[Dict[str, Any]]:
-    print(f"  [HADITH_DEBUG] --- get_hadith_details_by_db_id: Fetching details for rowid {row_id}")
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor(); cursor.execute("SELECT rowid, original_id, book, arabic_text, grading FROM hadiths_fts WHERE rowid = ?", (row_id,))
-            details = cursor.fetchone()
-            if details: print("  [HADITH_DEBUG] --- get_hadith_details_by_db_id: Details found.")
-            else: print("  [HADITH_DEBUG] --- get_hadith_details_by_db_id: Details NOT found.")
-            return dict(details) if details else None
-    except sqlite3.Error as e:
-         if "no such table" in str(e).lower(): logger.error(f"DB Error: 'hadiths_fts' table missing? {e}")
-         else: logger.error(f"DB Detail Fetch Error: {e}", exc_info=True)
-    except Exception as e: logger.error(f"Unexpected Detail Fetch Error: {e}", exc_info=True)
-    return None
+        idx = text_norm.find(norm_query)
+        if idx != -1:
+            start = max(0, idx - (SNIPPET_CONTEXT_WORDS * 7)); end = min(len(text_norm), idx + len(norm_query) + (SNIPPET_CONTEXT_WORDS * 7))
+            ctx = text_norm[start:end]; esc_ctx = html.escape(ctx); esc_kw = html.escape(text_norm[idx : idx + len(norm_query)])
+            snippet = esc_ctx.replace(esc_kw, f"<b>{esc_kw}</b>", 1)
+            if start > 0: snippet = "... " + snippet
+            if end < len(text_norm): snippet = snippet + " ..."
+        else: snippet = html.escape(text_norm[:SNIPPET_CONTEXT_WORDS * 14]) + "..."
+    except Exception as e: snippet = html.escape(text_norm[:50]) + "..." ; logger.error(f"Snippet error: {e}")
+    return snippet
+
+def build_results_page(search_query: str, rowids, page: int) -> Tuple[str, List[InlineKeyboardButton], int]:
+    """
+    يبني صفحة واحدة (نافذة من MAX_SNIPPETS_DISPLAY نتيجة) باستعلام واحد لقاعدة البيانات.
+    Returns (snippets_text, view_buttons, total_pages) for the window rowids[page*N:(page+1)*N].
+    """
+    total_pages = max(1, -(-len(rowids) // MAX_SNIPPETS_DISPLAY))
+    first = page * MAX_SNIPPETS_DISPLAY
+    window = list(rowids[first:first + MAX_SNIPPETS_DISPLAY])
+    snippets_by_rowid = get_hadith_snippets(search_query, window) # One round trip for the whole page
+    missing = [row_id for row_id in window if row_id not in snippets_by_rowid]
+    details_by_rowid = get_hadith_details(missing) if missing else {} # e.g. the phrase no longer matches after an edit
+    norm_query = normalize_arabic(search_query)
+    response_snippets = ""; buttons_list = []
+    for i, row_id in enumerate(window, start=first):
+        if row_id in snippets_by_rowid: book, snippet = snippets_by_rowid[row_id]; book = html.escape(book)
+        elif row_id in details_by_rowid:
+            details = details_by_rowid[row_id]
+            book = html.escape(details.get('book', 'غير معروف')); snippet = make_snippet(details.get('arabic_text', ''), norm_query)
+        else: logger.warning(f"Could not get details for rowid {row_id} in multi-result snippet gen."); continue
+        response_snippets += f"{i + 1}. 📖 <b>{book}</b>\n   📝 <i>{snippet}</i>\n\n"
+        trunc_book = book[:20] + ('...' if len(book) > 20 else '')
+        buttons_list.append(InlineKeyboardButton(f"{i + 1}. {trunc_book}", callback_data=f"view_{row_id}"))
+    return response_snippets.strip(), buttons_list, total_pages
+
+def format_result_count(count: int) -> str:
+    return f"{count}+" if count >= HADITH_SEARCH_LIMIT else str(count) # The SQL LIMIT was reached
+
+def build_page_keyboard(buttons_list: List[InlineKeyboardButton], token: str, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    rows = [[btn] for btn in buttons_list]; nav_row = []
+    if page > 0: nav_row.append(InlineKeyboardButton("◀️ السابق", callback_data=f"hpage_{token}_{page - 1}"))
+    if page < total_pages - 1: nav_row.append(InlineKeyboardButton("التالي ▶️", callback_data=f"hpage_{token}_{page + 1}"))
+    if nav_row: rows.append(nav_row)
+    return InlineKeyboardMarkup(rows)
 
 def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
     parts = [];
@@ -235,45 +149,88 @@ def arabic_number_to_word(n: int) -> str:
 #  Conversation State Management
 # ==============================================================================
 STATE_IDLE = 0; STATE_ASK_BOOK = 1; STATE_ASK_TEXT = 2; STATE_ASK_GRADING = 3
+# الحالة تُحفظ في الذاكرة (قراءة بدون قاعدة بيانات)، وتُكتب إلى user_states لاحقاً على دفعات (write-behind)
+user_states_cache: Dict[int, Tuple[int, Optional[Dict], float]] = {} # {user_id: (state, data, expires_at)} - keys = active users
+pending_state_writes: Dict[int, Optional[Tuple[int, Optional[Dict]]]] = {} # {user_id: (state, data) or None for delete}
+state_flush_task: Optional[asyncio.Task] = None
+
+def has_active_state(user_id: int) -> bool:
+    """O(1) check used by the message filter: is this user in the middle of a conversation?"""
+    entry = user_states_cache.get(user_id)
+    if entry is None: return False
+    if entry[2] < time.monotonic(): # Abandoned conversation
+        logger.info(f"Conversation state for user {user_id} expired after {CONVERSATION_TTL_SECONDS}s.")
+        clear_user_state(user_id); return False
+    return True
+
+def _flush_user_states():
+    """Writes all pending state changes in one transaction (blocking; run via asyncio.to_thread)."""
+    if not pending_state_writes: return
+    writes = dict(pending_state_writes); pending_state_writes.clear()
+    upserts = [(uid, change[0], json.dumps(change[1], ensure_ascii=False) if change[1] else None) for uid, change in writes.items() if change is not None]
+    deletes = [(uid,) for uid, change in writes.items() if change is None]
+    try:
+        with get_db_connection() as conn:
+            if upserts: conn.executemany("INSERT OR REPLACE INTO user_states (user_id, state, data) VALUES (?, ?, ?)", upserts)
+            if deletes: conn.executemany("DELETE FROM user_states WHERE user_id = ?", deletes)
+        print(f"  [HADITH_CONVO_DEBUG] Flushed {len(upserts)} state write(s), {len(deletes)} delete(s).")
+    except sqlite3.Error as e:
+        logger.error(f"DB Error flushing {len(writes)} user state change(s): {e}", exc_info=True)
+        for uid, change in writes.items(): pending_state_writes.setdefault(uid, change) # Retry on the next flush
+
+async def _state_flush_later():
+    global state_flush_task
+    try:
+        await asyncio.sleep(STATE_FLUSH_DELAY_SECONDS)
+        await asyncio.to_thread(_flush_user_states)
+    finally:
+        state_flush_task = None
+        if pending_state_writes: _schedule_state_flush()
+
+def _schedule_state_flush():
+    global state_flush_task
+    if state_flush_task is not None: return
+    try: state_flush_task = asyncio.get_running_loop().create_task(_state_flush_later())
+    except RuntimeError: _flush_user_states() # No running loop (scripts/tests): write through
+
 def set_user_state(user_id: int, state: int, data: Optional[Dict] = None):
     print(f"  [HADITH_CONVO_DEBUG] Setting state for {user_id} to {state}")
     logger.debug(f"Setting state for user {user_id} to {state} with data: {data}")
-    try:
-        with get_db_connection() as conn:
-            json_data = json.dumps(data, ensure_ascii=False) if data else None
-            conn.execute("INSERT OR REPLACE INTO user_states (user_id, state, data) VALUES (?, ?, ?)", (user_id, state, json_data))
-    except Exception as e: logger.error(f"DB Error setting state for user {user_id}: {e}", exc_info=True)
+    user_states_cache[user_id] = (state, data, time.monotonic() + CONVERSATION_TTL_SECONDS)
+    pending_state_writes[user_id] = (state, data); _schedule_state_flush()
 
 def get_user_state(user_id: int) -> Optional[Tuple[int, Optional[Dict]]]:
     print(f"  [HADITH_CONVO_DEBUG] Getting state for {user_id}")
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor(); cursor.execute("SELECT state, data FROM user_states WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-            if row:
-                state = row['state']; data = json.loads(row['data']) if row['data'] else None
-                print(f"  [HADITH_CONVO_DEBUG] Found state for {user_id}: State={state}")
-                logger.debug(f"Got state for user {user_id}: State={state}, Data={data}")
-                return state, data
-            else:
-                print(f"  [HADITH_CONVO_DEBUG] No state found for {user_id}, returning IDLE.")
-                return STATE_IDLE, None
-    except sqlite3.Error as e:
-         if "no such table" in str(e).lower(): logger.error(f"DB Error: 'user_states' table missing? Run setup script. {e}")
-         else: logger.error(f"DB Error getting state for user {user_id}: {e}", exc_info=True);
-         return None, None # Indicate error
-    except json.JSONDecodeError as e: logger.error(f"JSON Decode Error state data user {user_id}: {e}", exc_info=True); clear_user_state(user_id); return STATE_IDLE, None
-    except Exception as e: logger.error(f"Unexpected error getting state for user {user_id}: {e}", exc_info=True); return None, None
+    if not has_active_state(user_id):
+        print(f"  [HADITH_CONVO_DEBUG] No state found for {user_id}, returning IDLE.")
+        return STATE_IDLE, None
+    state, data, _ = user_states_cache[user_id]
+    logger.debug(f"Got state for user {user_id}: State={state}, Data={data}")
+    return state, data
 
 def clear_user_state(user_id: int):
     print(f"  [HADITH_CONVO_DEBUG] Clearing state for {user_id}")
     logger.debug(f"Clearing state for user {user_id}")
+    if user_states_cache.pop(user_id, None) is None and user_id not in pending_state_writes: return # Nothing stored
+    pending_state_writes[user_id] = None; _schedule_state_flush()
+
+def load_user_states():
+    """Restores in-progress conversations saved before a restart (they get a fresh TTL)."""
     try:
-        with get_db_connection() as conn: conn.execute("DELETE FROM user_states WHERE user_id = ?", (user_id,))
+        with get_db_connection() as conn:
+            rows = conn.execute("SELECT user_id, state, data FROM user_states").fetchall()
     except sqlite3.Error as e:
-         if "no such table" in str(e).lower(): logger.error(f"DB Error: 'user_states' table missing? Run setup script. {e}")
-         else: logger.error(f"DB Error clearing state for user {user_id}: {e}", exc_info=True)
-    except Exception as e: logger.error(f"Unexpected error clearing state for user {user_id}: {e}", exc_info=True)
+         if "no such table" in str(e).lower(): logger.warning(f"'user_states' table missing; run setup script. {e}")
+         else: logger.error(f"DB Error loading user states: {e}", exc_info=True)
+         return
+    expires_at = time.monotonic() + CONVERSATION_TTL_SECONDS
+    for row in rows:
+        try: data = json.loads(row['data']) if row['data'] else None
+        except json.JSONDecodeError as e: logger.error(f"JSON Decode Error state data user {row['user_id']}: {e}"); continue
+        if row['state'] != STATE_IDLE: user_states_cache[row['user_id']] = (row['state'], data, expires_at)
+    logger.info(f"Restored {len(user_states_cache)} in-progress conversation state(s).")
+
+load_user_states()
 
 # ==============================================================================
 #  Helper Function for Formatting Hadith Output
@@ -309,6 +266,8 @@ async def send_paginated_message(client: Client, chat_id: int, header: str, text
 #  Custom Filter Definition
 # ==============================================================================
 async def is_private_text_not_command_via_bot(flt, client: Client, message: Message) -> bool:
+    # فحص O(1) في الذاكرة أولاً: معظم الرسائل الخاصة ليست ضمن محادثة إضافة حديث
+    if not (message.from_user and has_active_state(message.from_user.id)): return False
     is_correct = bool(message.text and message.chat and message.chat.type == ChatType.PRIVATE and not message.via_bot and not message.text.startswith("/"))
     return is_correct
 non_command_private_text_filter = filters.create(is_private_text_not_command_via_bot)
@@ -340,7 +299,7 @@ if app:
         update_stats('search_count')
         try:
             print("[HADITH_DEBUG] ---> Calling search_hadiths_db...")
-            matching_rowids = search_hadiths_db(search_query)
+            matching_rowids = await search_hadiths_db(search_query)
             num_results = len(matching_rowids)
             print(f"[HADITH_DEBUG] ---> search_hadiths_db returned {num_results} results.")
             if num_results == 0:
@@ -358,8 +317,9 @@ if app:
             elif num_results == 2:
                 print(f"[HADITH_DEBUG] ---> Handling {num_results} results directly (paginated)...")
                 await message.reply_text(f"✅ تم العثور على نتيجتين. جاري إرسالهما:", quote=True); await asyncio.sleep(0.5)
+                details_by_rowid = get_hadith_details(matching_rowids)
                 for i, row_id in enumerate(matching_rowids):
-                    details = get_hadith_details_by_db_id(row_id)
+                    details = details_by_rowid.get(row_id)
                     if details:
                         header, text, footer = format_hadith_parts(details)
                         result_header = f"--- [ النتيجة {i+1} / {num_results} ] ---\n" + header
@@ -372,46 +332,50 @@ if app:
             elif 2 < num_results <= MAX_SNIPPETS_DISPLAY: # عرض 3 إلى 10 كمقتطفات وأزرار
                 print(f"[HADITH_DEBUG] ---> Handling {num_results} results with snippets/buttons...")
                 response_header = f"💡 تم العثور على <b>{num_results}</b> نتائج تطابق '<b>{safe_search_query}</b>'.\n\n"
-                response_snippets = ""; buttons_list = []
-                print(f"[HADITH_DEBUG] ---> Generating {num_results} snippets/buttons...")
-                for i, row_id in enumerate(matching_rowids):
-                    details = get_hadith_details_by_db_id(row_id)
-                    if details:
-                        book = html.escape(details.get('book', 'غير معروف')); text_norm = details.get('arabic_text', '')
-                        snippet = "..."; norm_query = normalize_arabic(search_query)
-                        try:
-                            idx = text_norm.find(norm_query)
-                            if idx != -1:
-                                start = max(0, idx - (SNIPPET_CONTEXT_WORDS * 7)); end = min(len(text_norm), idx + len(norm_query) + (SNIPPET_CONTEXT_WORDS * 7))
-                                ctx = text_norm[start:end]; esc_ctx = html.escape(ctx); esc_kw = html.escape(text_norm[idx : idx + len(norm_query)])
-                                snippet = esc_ctx.replace(esc_kw, f"<b>{esc_kw}</b>", 1)
-                                if start > 0: snippet = "... " + snippet
-                                if end < len(text_norm): snippet = snippet + " ..."
-                            else: snippet = html.escape(text_norm[:SNIPPET_CONTEXT_WORDS * 14]) + "..."
-                        except Exception as e: snippet = html.escape(text_norm[:50]) + "..." ; logger.error(f"Snippet error: {e}")
-                        response_snippets += f"{i + 1}. 📖 <b>{book}</b>\n   📝 <i>{snippet}</i>\n\n"
-                        trunc_book = book[:20] + ('...' if len(book) > 20 else '')
-                        buttons_list.append(InlineKeyboardButton(f"{i + 1}. {trunc_book}", callback_data=f"view_{row_id}"))
-                    else: logger.warning(f"Could not get details for rowid {row_id} in multi-result snippet gen.")
+                response_snippets, buttons_list, _ = build_results_page(search_query, matching_rowids, 0)
                 if buttons_list:
                     print("[HADITH_DEBUG] ---> Sending snippet list and buttons...")
                     keyboard = InlineKeyboardMarkup([[btn] for btn in buttons_list])
-                    full_response_text = response_header + response_snippets.strip()
+                    full_response_text = response_header + response_snippets
                     # إرسال المقتطفات أولاً
                     await message.reply_text(full_response_text, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
                     # إرسال رسالة الأزرار منفصلة
                     await message.reply_text("اضغط على رقم الحديث لعرضه كاملاً:", reply_markup=keyboard)
                     print("[HADITH_DEBUG] ---> Finished sending snippets/buttons.")
                 else: print("[HADITH_DEBUG] ---> ERROR: Failed to generate buttons."); await message.reply_text("⚠️ خطأ في تجهيز النتائج للعرض.")
-            elif num_results > MAX_SNIPPETS_DISPLAY: # أكثر من 10 نتائج
-                print(f"[HADITH_DEBUG] ---> Handling too many results (>{MAX_SNIPPETS_DISPLAY})...")
-                await message.reply_text(f"⚠️ تم العثور على <b>{num_results}</b> نتيجة.\nالنتائج كثيرة جدًا لعرضها.\n<b>يرجى تحديد بحثك بإضافة المزيد من الكلمات.</b>", parse_mode=ParseMode.HTML)
+            elif num_results > MAX_SNIPPETS_DISPLAY: # أكثر من 10 نتائج: صفحات من 10 مع أزرار التالي/السابق
+                print(f"[HADITH_DEBUG] ---> Handling {num_results} results in pages of {MAX_SNIPPETS_DISPLAY}...")
+                token = store_result_set(search_query, matching_rowids)
+                response_snippets, buttons_list, total_pages = build_results_page(search_query, matching_rowids, 0)
+                response_header = f"💡 تم العثور على <b>{format_result_count(num_results)}</b> نتيجة تطابق '<b>{safe_search_query}</b>' (الصفحة 1 من {total_pages}).\n\n"
+                await message.reply_text(response_header + response_snippets, parse_mode=ParseMode.HTML, disable_web_page_preview=True,
+                                         reply_markup=build_page_keyboard(buttons_list, token, 0, total_pages))
         except Exception as e:
             print(f"[HADITH_DEBUG] ---> EXCEPTION in handle_search_pyrogram: {e}")
             logger.error(f"Error handling search query '{search_query}': {e}", exc_info=True)
             try: await message.reply_text("⚠️ حدث خطأ غير متوقع أثناء البحث.")
             except Exception: pass
 
+    # --- معالج أزرار صفحات النتائج ---
+    @app.on_callback_query(filters.regex(r"^hpage_([0-9a-f]{8})_(\d+)$"))
+    async def handle_results_page_callback(client: Client, callback_query: CallbackQuery):
+        token = callback_query.matches[0].group(1); page = int(callback_query.matches[0].group(2))
+        result_set = get_result_set(token)
+        if not result_set: await callback_query.answer("انتهت صلاحية نتائج البحث، يرجى البحث مرة أخرى.", show_alert=True); return
+        search_query, rowids = result_set
+        try:
+            response_snippets, buttons_list, total_pages = build_results_page(search_query, rowids, page)
+            if not buttons_list: await callback_query.answer("لا توجد نتائج في هذه الصفحة.", show_alert=True); return
+            response_header = f"💡 تم العثور على <b>{format_result_count(len(rowids))}</b> نتيجة تطابق '<b>{html.escape(search_query)}</b>' (الصفحة {page + 1} من {total_pages}).\n\n"
+            await callback_query.edit_message_text(response_header + response_snippets, parse_mode=ParseMode.HTML, disable_web_page_preview=True,
+                                                   reply_markup=build_page_keyboard(buttons_list, token, page, total_pages))
+            await callback_query.answer()
+        except MessageNotModified: await callback_query.answer()
+        except Exception as e:
+            logger.error(f"Error showing results page {page} of {token}: {e}", exc_info=True)
+            try: await callback_query.answer("حدث خطأ غير متوقع!", show_alert=True)
+            except Exception: pass
+
     # --- معالج زر عرض التفاصيل ---
     @app.on_callback_query(filters.regex(r"^view_(\d+)"))
     async def handle_view_callback_pyrogram(client: Client, callback_query: CallbackQuery):
@@ -624,6 +588,7 @@ if app:
                 cursor.execute("DELETE FROM pending_hadiths WHERE submission_id = ?", (submission_id,))
                 update_stats('hadith_approved_count')
                 logger.info(f"Approved {submission_id}, added as {new_hadith_id}, deleted from pending.")
+            clear_local_search_cache() # نتائج البحث المخزنة لا تتضمن الحديث الجديد
             try: await callback_query.edit_message_text(f"{callback_query.message.text.html}\n\n--- ✅ تمت الموافقة ---", reply_markup=None)
             except MessageNotModified: pass
             except Exception as e: logger.warning(f"Could not edit owner msg {pending['approval_message_id']} on approve: {e}")
@@ -1,9 +1,14 @@
 import os
-import json
 import re
 import asyncio
 import logging
 import html # Import html module for escaping
+import math
+import time
+import heapq
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor # Fuzzy scoring runs off the event loop
 
 # Logging setup (consider using the main bot's logger if available)
 # Define logger early so the import attempt below can use it
@@ -27,10 +32,27 @@ except ImportError:
 # Only import pyrogram related things if app import potentially succeeded
 # or handle the case where they are needed even without app (e.g., for types)
 from pyrogram import Client, filters, types # Client might not be needed if only using imported app
-from pyrogram.errors import MessageIdInvalid
+from pyrogram.errors import MessageIdInvalid, MessageNotModified
 from pyrogram.enums import ParseMode # Import ParseMode enum
-from fuzzywuzzy import process, fuzz # For fuzzy string matching
-import pyarabic.araby as araby # For removing Arabic diacritics
+# Prefer rapidfuzz (C++ scorer, drop-in API); fall back to fuzzywuzzy if it isn't installed
+try:
+    from rapidfuzz import process, fuzz # For fuzzy string matching
+    from rapidfuzz.utils import default_process as fuzzy_processor # fuzzywuzzy's preprocessing (lowercase/strip)
+    FUZZY_BACKEND = "rapidfuzz"
+except ImportError:
+    from fuzzywuzzy import process, fuzz # For fuzzy string matching
+    fuzzy_processor = None # fuzzywuzzy's token_set_ratio preprocesses by itself
+    FUZZY_BACKEND = "fuzzywuzzy"
+
+# --- Shared Telegram file_id store (re-sends use the file_id instead of re-uploading) ---
+try:
+    from .file_id_cache import make_file_content_key, send_cached_media
+    from .json_stream import iter_json_array
+    from .arabic_text import normalize_arabic, tokenize # Same "search" profile as the Quran plugin
+except ImportError:
+    from file_id_cache import make_file_content_key, send_cached_media
+    from json_stream import iter_json_array
+    from arabic_text import normalize_arabic, tokenize # Same "search" profile as the Quran plugin
 
 
 # --- Configuration ---
@@ -76,33 +98,190 @@ except Exception as e:
 
 
 # --- Globals ---
-fatwa_data = [] # To store loaded fatwa data
-fatwa_search_list = [] # To store data prepared for fuzzy search
+# Everything built from one load of fatwas.json lives in one dict, replaced as a single
+# reference by load_fatwas. Readers take `store = fatwa_store` once and use only that,
+# so a reload can never pair a new index with old data.
+#   data: {fatwa_id: fatwa_entry} - O(1) lookup by ID
+#   choices: {fatwa_id: search_text} - built once at load, passed directly to extractOne
+#   chunks: choices split into slices; the worker scores one slice per extractOne call
+#   index: inverted index (BM25) over title/question/categories
+#   terms: {fatwa_id: Counter(tokens)} - reused for unchanged fatwas on reload
+#   signature: (mtime_ns, size) of the loaded fatwas.json
+fatwa_store = {"data": {}, "choices": {}, "chunks": [], "index": None, "terms": {}, "signature": None}
+
+# --- Hot reload settings ---
+FATWA_RELOAD_CHECK_SECONDS = 30 # How often the watcher checks fatwas.json (0 disables it)
+FATWA_ADMIN_IDS = [6504095190] # Users allowed to run the reload command
+_fatwa_reload_lock = asyncio.Lock()
+_fatwa_watcher_task = None
+
+# --- Ranked search / pagination settings ---
+BM25_K1 = 1.5
+BM25_B = 0.75
+FATWA_TOP_K = 10 # Max results offered for browsing
+FATWA_RESULT_SETS_MAX = 500 # Cached result sets for next/previous buttons
+FATWA_RESULT_SET_TTL_SECONDS = 3600
+fatwa_result_sets = OrderedDict() # {token: (expires_at, [fatwa_id, ...])}
+
+# --- Search worker pool ---
+# Scoring runs in these threads so the event loop (moderation handlers etc.) never waits on it.
+# It is split into chunks so no single C call holds the GIL for long.
+FUZZY_SCORE_CUTOFF = 65
+FATWA_SEARCH_WORKERS = 2 # Threads doing the scoring
+FATWA_SEARCH_MAX_CONCURRENCY = 4 # Searches running or queued at once; others wait their turn
+FATWA_SEARCH_TIMEOUT_SECONDS = 10
+FATWA_SEARCH_CHUNK_SIZE = 2000
+_fatwa_search_executor = ThreadPoolExecutor(max_workers=FATWA_SEARCH_WORKERS, thread_name_prefix="fatwa-search")
+_fatwa_search_semaphore = asyncio.Semaphore(FATWA_SEARCH_MAX_CONCURRENCY)
 
 # --- Helper Functions ---
 
-def remove_diacritics(text):
-    """Removes Arabic diacritics (tashkeel) from text."""
-    if not text:
-        return ""
+def build_fatwa_index(doc_terms: dict) -> dict:
+    """
+    Builds an inverted index {token: [(fatwa_id, term_frequency), ...]} plus the
+    document lengths BM25 needs, from per-fatwa token counts {fatwa_id: Counter}.
+    """
+    postings = {}
+    doc_lengths = {}
+    for fatwa_id, term_counts in doc_terms.items():
+        doc_lengths[fatwa_id] = sum(term_counts.values())
+        for token, tf in term_counts.items():
+            postings.setdefault(token, []).append((fatwa_id, tf))
+    total_docs = len(doc_lengths)
+    avg_length = (sum(doc_lengths.values()) / total_docs) if total_docs else 0.0
+    idf = {token: math.log(1 + (total_docs - len(plist) + 0.5) / (len(plist) + 0.5)) for token, plist in postings.items()}
+    logger.info(f"Built fatwa inverted index: {len(postings)} tokens over {total_docs} fatwas.")
+    return {"postings": postings, "doc_lengths": doc_lengths, "avg_length": avg_length, "idf": idf}
+
+def _rank_bm25(query: str, index: dict, limit: int) -> list:
+    """Runs in the worker pool. Returns up to `limit` fatwa IDs, best BM25 score first."""
+    if not index or not index["avg_length"]:
+        return []
+    postings, doc_lengths, idf = index["postings"], index["doc_lengths"], index["idf"]
+    length_norm = BM25_B / index["avg_length"]
+    scores = {}
+    for token in set(tokenize(query)):
+        token_postings = postings.get(token)
+        if not token_postings:
+            continue
+        token_idf = idf[token]
+        for fatwa_id, tf in token_postings:
+            denominator = tf + BM25_K1 * (1 - BM25_B + length_norm * doc_lengths[fatwa_id])
+            scores[fatwa_id] = scores.get(fatwa_id, 0.0) + token_idf * tf * (BM25_K1 + 1) / denominator
+    return [fatwa_id for fatwa_id, _ in heapq.nlargest(limit, scores.items(), key=lambda item: item[1])]
+
+def _fatwas_file_signature(path: str):
+    """(mtime_ns, size) of the data file, used to notice edits without reading it."""
     try:
-        # Use pyarabic to remove diacritics
-        return araby.strip_tashkeel(text)
-    except Exception as e:
-        logger.error(f"Error removing diacritics from '{text[:50]}...': {e}")
-        return text # Return original text if error occurs
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def build_fatwa_structures(raw_items, previous_data: dict | None = None, previous_choices: dict | None = None, previous_terms: dict | None = None) -> dict:
+    """
+    Builds every search structure from the JSON items (any iterable) into fresh objects.
+    Fatwas whose entry is unchanged since the previous load (same ID, same fields)
+    reuse their search text and token counts, so a reload only re-tokenizes the diff.
+    """
+    previous_data = previous_data or {}
+    previous_choices = previous_choices or {}
+    previous_terms = previous_terms or {}
+    new_data = {}
+    new_choices = {}
+    new_terms = {}
+    items_processed = 0
+    items_reused = 0
+    items_seen = 0
+    for i, item in enumerate(raw_items):
+        items_seen += 1
+         # Basic validation of item structure
+        if not isinstance(item, dict):
+            logger.warning(f"Skipping invalid item at index {i} in fatwas.json (not a dictionary). Item: {item}")
+            continue
+
+        # Store original data
+        # Use 'id' from JSON if present and valid, otherwise use index 'i'
+        fatwa_id = item.get('id', i)
+        if not isinstance(fatwa_id, (int, str)): # Basic check for valid ID type
+            logger.warning(f"Invalid 'id' type found for item at index {i}. Using index as ID. Item: {item}")
+            fatwa_id = i
+
+        fatwa_entry = {
+            'id': fatwa_id,
+            'question': item.get('question', ''),
+            'answer': item.get('answer', ''),
+            'title': item.get('title', ''),
+            'categories': item.get('categories', []),
+            'link': item.get('link', ''),
+            'audio': item.get('audio', '')
+        }
+        # Check for duplicate IDs before appending
+        if fatwa_id in new_data:
+             logger.warning(f"Duplicate fatwa ID '{fatwa_id}' found at index {i}. Skipping item: {item}")
+             continue
+
+        previous_entry = previous_data.get(fatwa_id)
+        if previous_entry == fatwa_entry:
+            new_data[fatwa_id] = previous_entry # Unchanged: keep the old objects
+            if fatwa_id in previous_terms:
+                new_choices[fatwa_id] = previous_choices[fatwa_id]
+                new_terms[fatwa_id] = previous_terms[fatwa_id]
+            items_processed += 1
+            items_reused += 1
+            continue
+
+        new_data[fatwa_id] = fatwa_entry
+
+        # --- Prepare data for searching (UPDATED LOGIC) ---
+        # Get categories, ensure it's a list, handle potential errors
+        categories_list = item.get('categories', [])
+        if not isinstance(categories_list, list):
+            logger.warning(f"Categories field is not a list for fatwa ID {fatwa_id}. Skipping categories in search text.")
+            categories_list = []
+        # Normalize each category and join them with spaces
+        categories_text = " ".join([normalize_arabic(str(cat)) for cat in categories_list])
+
+        # Combine title, question, and categories text for searching (excludes answer)
+        search_text = f"{normalize_arabic(item.get('title', ''))} {normalize_arabic(item.get('question', ''))} {categories_text}"
+        # --- End of Updated Logic ---
+
+        if search_text.strip(): # Only add if there's searchable text
+            new_choices[fatwa_id] = search_text.strip() # Same ID as the "data" key
+            new_terms[fatwa_id] = Counter(tokenize(search_text))
+        else:
+             logger.warning(f"No searchable text (title/question/categories) found for fatwa ID '{fatwa_id}'. Skipping search list entry.")
+
+        items_processed += 1
+
+    choice_items = list(new_choices.items())
+    new_chunks = [
+        dict(choice_items[i:i + FATWA_SEARCH_CHUNK_SIZE]) for i in range(0, len(choice_items), FATWA_SEARCH_CHUNK_SIZE)
+    ]
+    if previous_data:
+        removed = len(previous_data.keys() - new_data.keys())
+        logger.info(f"Fatwa diff: {items_reused} unchanged, {items_processed - items_reused} new/changed, {removed} removed.")
+    return {
+        "data": new_data,
+        "choices": new_choices,
+        "chunks": new_chunks,
+        "terms": new_terms,
+        "index": build_fatwa_index(new_terms),
+        "items_processed": items_processed,
+        "items_seen": items_seen,
+    }
 
 def load_fatwas():
-    """Loads fatwa data from the JSON file."""
-    global fatwa_data, fatwa_search_list
+    """
+    Loads fatwa data from the JSON file and swaps the new search structures in.
+    Safe to call from a background thread: everything is built into new objects first
+    and the module globals are replaced in one step, so searches never see a
+    half-built index. On any error the previously loaded data stays active.
+    """
+    global fatwa_store
     absolute_path = os.path.abspath(FATWAS_FILE_PATH)
     logger.info(f"Attempting to load fatwas from: {absolute_path}") # Path should now be corrected
 
-    # Reset lists before loading
-    fatwa_data = []
-    fatwa_search_list = []
-    raw_data = [] # Initialize raw_data
-
     try:
         # Check if file exists
         if not os.path.exists(absolute_path):
@@ -115,88 +294,27 @@ def load_fatwas():
              logger.error(f"Read permission denied for file: {absolute_path}")
              return False
 
-        # Proceed to read the file
-        logger.info(f"File found and accessible. Reading content from: {absolute_path}")
-        with open(absolute_path, 'r', encoding='utf-8') as f:
-            # Handle empty file case
-            content = f.read()
-            if not content.strip(): # Check if content is empty or just whitespace
-                logger.warning(f"Fatwa data file is empty or contains only whitespace: {absolute_path}")
-                # Keep raw_data as [], lists will remain empty
-            else:
-                # Rewind file pointer before reading json
-                f.seek(0)
-                try:
-                    raw_data = json.load(f)
-                    logger.info(f"Successfully decoded JSON. Found {len(raw_data) if isinstance(raw_data, list) else 'N/A'} potential items.")
-                    # Validate if raw_data is a list
-                    if not isinstance(raw_data, list):
-                        logger.error(f"JSON content is not a list as expected. Type found: {type(raw_data)}")
-                        raw_data = [] # Reset to prevent further errors
-                        return False
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding JSON from file: {absolute_path} - {e}")
-                    return False # Stop processing if JSON is invalid
-
-        # Process the loaded data
-        logger.info(f"Processing {len(raw_data)} items from JSON data.")
-        items_processed = 0
-        for i, item in enumerate(raw_data):
-             # Basic validation of item structure
-            if not isinstance(item, dict):
-                logger.warning(f"Skipping invalid item at index {i} in fatwas.json (not a dictionary). Item: {item}")
-                continue
-
-            # Store original data
-            # Use 'id' from JSON if present and valid, otherwise use index 'i'
-            fatwa_id = item.get('id', i)
-            if not isinstance(fatwa_id, (int, str)): # Basic check for valid ID type
-                logger.warning(f"Invalid 'id' type found for item at index {i}. Using index as ID. Item: {item}")
-                fatwa_id = i
-
-            fatwa_entry = {
-                'id': fatwa_id,
-                'question': item.get('question', ''),
-                'answer': item.get('answer', ''),
-                'title': item.get('title', ''),
-                'categories': item.get('categories', []),
-                'link': item.get('link', ''),
-                'audio': item.get('audio', '')
-            }
-            # Check for duplicate IDs before appending
-            if any(f['id'] == fatwa_id for f in fatwa_data):
-                 logger.warning(f"Duplicate fatwa ID '{fatwa_id}' found at index {i}. Skipping item: {item}")
-                 continue
-
-            fatwa_data.append(fatwa_entry)
-
-            # --- Prepare data for searching (UPDATED LOGIC) ---
-            # Get categories, ensure it's a list, handle potential errors
-            categories_list = item.get('categories', [])
-            if not isinstance(categories_list, list):
-                logger.warning(f"Categories field is not a list for fatwa ID {fatwa_id}. Skipping categories in search text.")
-                categories_list = []
-            # Remove diacritics from each category and join them with spaces
-            categories_text = " ".join([remove_diacritics(str(cat)) for cat in categories_list])
-
-            # Combine title, question, and categories text for searching (excludes answer)
-            search_text = f"{remove_diacritics(item.get('title', ''))} {remove_diacritics(item.get('question', ''))} {categories_text}"
-            # --- End of Updated Logic ---
-
-            if search_text.strip(): # Only add if there's searchable text
-                fatwa_search_list.append({
-                    'id': fatwa_entry['id'], # Store the same ID used in fatwa_data
-                    'search_text': search_text.strip()
-                })
-            else:
-                 logger.warning(f"No searchable text (title/question/categories) found for fatwa ID '{fatwa_id}'. Skipping search list entry.")
+        # Signature taken before reading: an edit during the read is picked up by the next check
+        file_signature = _fatwas_file_signature(absolute_path)
 
-            items_processed += 1
-
-        logger.info(f"Successfully processed {items_processed} fatwa items. `fatwa_search_list` size: {len(fatwa_search_list)}")
-        if not fatwa_search_list and raw_data:
+        # Stream the file item by item: neither the raw text nor the decoded list is held in memory
+        logger.info(f"File found and accessible. Streaming items from: {absolute_path}")
+        try:
+            previous = fatwa_store
+            built = build_fatwa_structures(iter_json_array(absolute_path), previous["data"], previous["choices"], previous["terms"])
+        except ValueError as e: # json.JSONDecodeError / ijson errors, or a top level that isn't a list
+            logger.error(f"Error decoding JSON from file: {absolute_path} - {e}")
+            return False # Keep the previously loaded data
+
+        # Atomic swap: one reference assignment replaces every structure together
+        fatwa_store = {
+            "data": built["data"], "choices": built["choices"], "chunks": built["chunks"],
+            "index": built["index"], "terms": built["terms"], "signature": file_signature,
+        }
+        logger.info(f"Successfully processed {built['items_processed']} fatwa items. Search choices size: {len(built['choices'])}")
+        if not built["choices"] and built["items_seen"]:
              logger.warning("Processed JSON data but the search list is still empty. Check item structure or content in JSON.")
-        elif not raw_data:
+        elif not built["items_seen"]:
               logger.info("JSON file was empty or contained no valid items.")
 
         return True # Loading process completed (even if no data was found in an empty file)
@@ -208,41 +326,90 @@ def load_fatwas():
         logger.error(f"An unexpected error occurred during fatwa loading: {e}", exc_info=True)
         return False
 
-async def search_fatwa_fuzzy(query: str):
+async def reload_fatwas() -> bool:
+    """
+    Rebuilds the fatwa structures in a background thread (the event loop and the
+    search pool keep serving the old index meanwhile). Reloads run one at a time.
+    """
+    async with _fatwa_reload_lock:
+        logger.info("Reloading fatwa data in the background...")
+        return await asyncio.to_thread(load_fatwas)
+
+async def watch_fatwas_file():
+    """Polls fatwas.json's mtime/size and reloads it when the file changes."""
+    while True:
+        await asyncio.sleep(FATWA_RELOAD_CHECK_SECONDS)
+        try:
+            current_signature = _fatwas_file_signature(os.path.abspath(FATWAS_FILE_PATH))
+            if current_signature and current_signature != fatwa_store["signature"]:
+                logger.info("fatwas.json changed on disk; reloading.")
+                await reload_fatwas()
+        except Exception as e:
+            logger.error(f"Error in fatwas.json watcher: {e}", exc_info=True)
+
+def ensure_fatwa_watcher():
+    """Starts the file watcher once, from inside the running event loop."""
+    global _fatwa_watcher_task
+    if FATWA_RELOAD_CHECK_SECONDS and _fatwa_watcher_task is None:
+        _fatwa_watcher_task = asyncio.create_task(watch_fatwas_file()) # Keep a reference so the task isn't GC'd
+
+def _best_fuzzy_match(search_term: str, chunks: list):
+    """
+    Runs in the worker pool. Scores every chunk with extractOne and keeps the best hit.
+    Returns (matched_text, score, fatwa_id) or None, like extractOne on a dict.
+    """
+    best_match = None
+    for chunk in chunks:
+        # extractOne returns (choice_text, score, choice_key) where key is the dict key (fatwa id)
+        if fuzzy_processor:
+            match = process.extractOne(search_term, chunk, scorer=fuzz.token_set_ratio, processor=fuzzy_processor, score_cutoff=FUZZY_SCORE_CUTOFF)
+        else:
+            match = process.extractOne(search_term, chunk, scorer=fuzz.token_set_ratio, score_cutoff=FUZZY_SCORE_CUTOFF)
+        if match and (best_match is None or match[1] > best_match[1]):
+            best_match = match
+    return best_match
+
+async def run_fatwa_search_job(func, *args):
+    """
+    Runs func(*args) in the fatwa search pool with bounded concurrency and a timeout.
+    The semaphore slot is released when the worker actually finishes (not on timeout),
+    so timed-out searches can't pile up unbounded work in the pool.
+    """
+    await _fatwa_search_semaphore.acquire()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(_fatwa_search_executor, func, *args)
+    except Exception:
+        _fatwa_search_semaphore.release()
+        raise
+    future.add_done_callback(lambda _: _fatwa_search_semaphore.release())
+    return await asyncio.wait_for(asyncio.shield(future), timeout=FATWA_SEARCH_TIMEOUT_SECONDS)
+
+async def search_fatwa_fuzzy(query: str, store: dict | None = None):
     """
     Searches for fatwas using fuzzy matching.
     """
-    if not fatwa_search_list:
+    store = store or fatwa_store
+    if not store["choices"]:
         # This warning is expected if load_fatwas returned True but file was empty/invalid structure
         logger.warning("Fatwa search list is empty. Cannot perform search. Check previous logs for loading issues.")
         return []
 
-    # Remove diacritics from the search query
-    search_term = remove_diacritics(query)
+    # Normalize the search query the same way as the search texts
+    search_term = normalize_arabic(query)
     if not search_term:
         return []
 
-    # Use fuzzywuzzy's process.extractOne to find the best match
+    # Use process.extractOne (rapidfuzz, or fuzzywuzzy as fallback) in the worker pool to find the best match
     # scorer changed to fuzz.token_set_ratio for potentially better matching with word order/subset differences
     # score_cutoff kept at 65
+    logger.info(f"Performing fuzzy search ({FUZZY_BACKEND}) with scorer=token_set_ratio and score_cutoff={FUZZY_SCORE_CUTOFF}")
     try:
-        # Create a dictionary mapping the fatwa ID to its searchable text
-        # This allows extractOne to return the ID directly
-        choices = {item['id']: item['search_text'] for item in fatwa_search_list if item.get('search_text')}
-        if not choices:
-             logger.warning("Fuzzy search attempted but no search texts available in fatwa_search_list.")
-             return []
-
-        # extractOne returns (choice_text, score, choice_key) where key is the dict key (fatwa id)
-        logger.info(f"Performing fuzzy search with scorer=token_set_ratio and score_cutoff=65") # Log scorer being used
-        best_match = process.extractOne(
-            search_term,
-            choices, # Pass the dictionary {id: search_text}
-            scorer=fuzz.token_set_ratio, # Changed scorer
-            score_cutoff=65 # Adjusted score cutoff (was 70)
-        )
+        best_match = await run_fatwa_search_job(_best_fuzzy_match, search_term, store["chunks"])
+    except asyncio.TimeoutError:
+        logger.error(f"Fuzzy search timed out after {FATWA_SEARCH_TIMEOUT_SECONDS}s for query '{query}'")
+        return []
     except Exception as e:
-        logger.error(f"Error during fuzzywuzzy matching: {e}", exc_info=True)
+        logger.error(f"Error during fuzzy matching: {e}", exc_info=True)
         return []
 
 
@@ -251,7 +418,7 @@ async def search_fatwa_fuzzy(query: str):
         matched_text, score, original_fatwa_id = best_match
         logger.info(f"Fuzzy search found match (score {score}): '{matched_text[:100]}...' for query '{query}' (Fatwa ID: {original_fatwa_id})")
         # Find the original fatwa data using the ID returned by extractOne
-        original_fatwa = next((f for f in fatwa_data if f['id'] == original_fatwa_id), None)
+        original_fatwa = store["data"].get(original_fatwa_id)
 
         if original_fatwa:
             return [original_fatwa] # Return as a list to match original JS structure
@@ -263,11 +430,123 @@ async def search_fatwa_fuzzy(query: str):
         logger.info(f"No fuzzy match found for query: '{query}'")
         return []
 
+async def search_fatwas_ranked(query: str, limit: int = FATWA_TOP_K) -> list:
+    """
+    Returns up to `limit` fatwas ranked by BM25 over the inverted index.
+    Falls back to the single fuzzy best match when no index token matches (e.g. typos).
+    """
+    store = fatwa_store
+    if store["index"] and query.strip():
+        try:
+            ranked_ids = await run_fatwa_search_job(_rank_bm25, query, store["index"], limit)
+        except asyncio.TimeoutError:
+            logger.error(f"BM25 search timed out after {FATWA_SEARCH_TIMEOUT_SECONDS}s for query '{query}'")
+            ranked_ids = []
+        except Exception as e:
+            logger.error(f"Error during BM25 search: {e}", exc_info=True)
+            ranked_ids = []
+        results = [store["data"][fatwa_id] for fatwa_id in ranked_ids if fatwa_id in store["data"]]
+        if results:
+            logger.info(f"BM25 search returned {len(results)} result(s) for query '{query}'")
+            return results
+    return await search_fatwa_fuzzy(query, store)
+
+def store_result_set(fatwa_ids: list) -> str:
+    """Caches a result list for the next/previous buttons and returns its short token."""
+    token = uuid.uuid4().hex[:8]
+    fatwa_result_sets[token] = (time.monotonic() + FATWA_RESULT_SET_TTL_SECONDS, fatwa_ids)
+    while len(fatwa_result_sets) > FATWA_RESULT_SETS_MAX:
+        fatwa_result_sets.popitem(last=False)
+    return token
+
+def get_result_set(token: str) -> list | None:
+    entry = fatwa_result_sets.get(token)
+    if not entry:
+        return None
+    if entry[0] < time.monotonic():
+        del fatwa_result_sets[token]
+        return None
+    return entry[1]
+
+def format_fatwa_message(result: dict, position: int | None = None, total: int | None = None) -> str:
+    """Formats one fatwa as HTML; adds a "result i of n" header when browsing several results."""
+    # Escape potentially problematic HTML characters in the data itself
+    title = html.escape(result.get('title', 'بدون عنوان') or 'بدون عنوان')
+    question = html.escape(result.get('question', ''))
+    answer = html.escape(result.get('answer', '')) # Escape answer even if not searched
+    link = html.escape(result.get('link', ''))
+
+    formatted_message = ""
+    if total and total > 1:
+        formatted_message += f"📄 النتيجة {position} من {total}\n\n"
+    # Removed <pre> tags to avoid code-like formatting
+    formatted_message += f"📜 <b>{title}</b> 📜\n\n" # Use <b> for bold
+    if question:
+         formatted_message += f"❓ <b>السؤال:</b>\n{question}\n\n" # Just use escaped text
+    if answer:
+         formatted_message += f"📜 <b>الإجابة:</b>\n{answer}\n\n" # Just use escaped text
+    if link:
+         # Use <a> for link
+         formatted_message += f'🔗 <a href="{link}">رابط الفتوى</a>'
+    else:
+         formatted_message += "🔗 (لا يوجد رابط متوفر)"
+    return formatted_message
+
+def build_results_keyboard(token: str, index: int, total: int, has_audio: bool) -> types.InlineKeyboardMarkup | None:
+    """Previous/next buttons (and an audio button when not already sent) for result `index` of a cached set."""
+    rows = []
+    nav_row = []
+    if index > 0:
+        nav_row.append(types.InlineKeyboardButton("◀️ السابق", callback_data=f"fatwa_page_{token}_{index - 1}"))
+    if index < total - 1:
+        nav_row.append(types.InlineKeyboardButton("التالي ▶️", callback_data=f"fatwa_page_{token}_{index + 1}"))
+    if nav_row:
+        rows.append(nav_row)
+    if has_audio:
+        rows.append([types.InlineKeyboardButton("🔊 التسجيل الصوتي", callback_data=f"fatwa_audio_{token}_{index}")])
+    return types.InlineKeyboardMarkup(rows) if rows else None
+
+def make_fatwa_audio_caption(result: dict) -> str:
+    # Use the ORIGINAL title for the audio caption
+    original_caption_title = result.get('title', '')
+    # REMOVE "درجة حديث " prefix specifically for the caption if it exists
+    prefix_to_remove_caption = "درجة حديث "
+    if original_caption_title.startswith(prefix_to_remove_caption):
+        caption_title_to_use = original_caption_title[len(prefix_to_remove_caption):]
+    else:
+        caption_title_to_use = original_caption_title
+    # Corrected audio caption prefix
+    return f"🔊 تسجيل صوتي: {html.escape(caption_title_to_use)}"
+
+async def send_fatwa_audio(client: Client, chat_id: int, result: dict, reply_to_message_id: int):
+    """Sends the fatwa's audio (URL or local path), reusing the Telegram file_id after the first upload."""
+    audio_url_or_path = result['audio']
+    # Sanitize title for filename
+    safe_title = re.sub(r'[\\/*?:"<>|]', "", result.get('title', 'audio')) # Remove invalid chars
+    filename = f"{safe_title[:50].strip()}.mp3" # Limit length and add extension
+
+    # URLs are keyed by the URL itself, local files by path + size + mtime
+    if os.path.isfile(audio_url_or_path):
+        audio_content_key = f"fatwa_audio:{make_file_content_key(audio_url_or_path)}"
+    else:
+        audio_content_key = f"fatwa_audio:{audio_url_or_path}"
+
+    logger.info(f"Attempting to send audio: {audio_url_or_path}")
+    await send_cached_media( # Reuses the Telegram file_id after the first upload
+        audio_content_key, client.send_audio, "audio", audio_url_or_path,
+        chat_id=chat_id,
+        caption=make_fatwa_audio_caption(result),
+        file_name=filename,
+        reply_to_message_id=reply_to_message_id
+    )
+    logger.info(f"Successfully sent audio for fatwa '{result.get('title', '')}'")
+
 # --- Pyrogram Handlers ---
 # These handlers will only be registered if `app` was successfully imported.
 
 async def handle_fatwa_request(client: Client, message: types.Message, keyword: str):
     """Common logic to handle fatwa search requests."""
+    ensure_fatwa_watcher()
     # `client` argument here is the `app` instance passed by the decorator
     message_id = message.id
     chat_id = message.chat.id
@@ -292,91 +571,33 @@ async def handle_fatwa_request(client: Client, message: types.Message, keyword:
          # Continue without the waiting message if sending failed
 
     try:
-        # Perform the search
-        search_result = await search_fatwa_fuzzy(keyword)
+        # Perform the ranked search (top-k, browsable with next/previous buttons)
+        search_result = await search_fatwas_ranked(keyword)
 
         if search_result:
-            # Get the first result (matching JS behavior)
+            # Show the best result first; the rest are served from the cached result set
             result = search_result[0]
-
-            # --- Format the message using HTML ---
-            # Get original title
-            original_title = result.get('title', 'بدون عنوان')
-
-            # --- REMOVED: Prefix removal logic ---
-            # Now uses the original title directly for display
-            title_to_display = original_title
-            # --- END REMOVED ---
-
-            # Escape potentially problematic HTML characters in the data itself
-            title = html.escape(title_to_display) # Use the (original) title for display
-            question = html.escape(result.get('question', ''))
-            answer = html.escape(result.get('answer', '')) # Escape answer even if not searched
-            link = html.escape(result.get('link', ''))
-
-            # Removed <pre> tags to avoid code-like formatting
-            formatted_message = f"📜 <b>{title}</b> 📜\n\n" # Use <b> for bold
-            if question:
-                 formatted_message += f"❓ <b>السؤال:</b>\n{question}\n\n" # Just use escaped text
-            if answer:
-                 formatted_message += f"📜 <b>الإجابة:</b>\n{answer}\n\n" # Just use escaped text
-            if link:
-                 # Use <a> for link
-                 formatted_message += f'🔗 <a href="{link}">رابط الفتوى</a>'
-            else:
-                 formatted_message += "🔗 (لا يوجد رابط متوفر)"
-            # --- End of HTML Formatting ---
-
+            total = len(search_result)
+            token = store_result_set([entry['id'] for entry in search_result]) if total > 1 else None
+            reply_markup = build_results_keyboard(token, 0, total, has_audio=False) if token else None
 
             # Send the text result (Pyrogram handles splitting long messages)
             # Use ParseMode.HTML
             sent_message = await client.send_message( # Use the client passed to the handler
                 chat_id=chat_id,
-                text=formatted_message,
+                text=format_fatwa_message(result, 1, total),
                 parse_mode=ParseMode.HTML, # Corrected parse mode to HTML
                 disable_web_page_preview=True,
-                reply_to_message_id=message_id
+                reply_to_message_id=message_id,
+                reply_markup=reply_markup
             )
 
             # Send the audio file if available
             if result.get('audio'):
-                audio_url_or_path = result['audio']
                 try:
-                    # Sanitize title for filename
-                    safe_title = re.sub(r'[\\/*?:"<>|]', "", result.get('title', 'audio')) # Remove invalid chars
-                    filename = f"{safe_title[:50].strip()}.mp3" # Limit length and add extension
-
-                    # --- Refined Audio Caption Logic ---
-                    # Use the ORIGINAL title for the audio caption
-                    original_caption_title = result.get('title', '')
-                    # REMOVE "درجة حديث " prefix specifically for the caption if it exists
-                    prefix_to_remove_caption = "درجة حديث " # Define prefix again for clarity
-                    if original_caption_title.startswith(prefix_to_remove_caption):
-                        caption_title_to_use = original_caption_title[len(prefix_to_remove_caption):]
-                    else:
-                        caption_title_to_use = original_caption_title
-                    # Escape the potentially modified title for the caption
-                    escaped_caption_title = html.escape(caption_title_to_use)
-
-                    # Corrected audio caption prefix
-                    audio_caption = f"🔊 تسجيل صوتي: {escaped_caption_title}"
-                    # --- End of Refined Audio Caption Logic ---
-
-
-                    logger.info(f"Attempting to send audio: {audio_url_or_path}")
-                    await client.send_audio( # Use the client passed to the handler
-                        chat_id=chat_id,
-                        audio=audio_url_or_path,
-                        caption=audio_caption, # Use updated caption
-                        # caption parse_mode defaults to the client's default, usually None or HTML
-                        # Set explicitly if needed: parse_mode=ParseMode.HTML
-                        file_name=filename,
-                        reply_to_message_id=message_id # Reply to original user message
-                        # Consider replying to the text result instead: reply_to_message_id=sent_message.id
-                    )
-                    logger.info(f"Successfully sent audio for fatwa '{result.get('title', '')}'")
+                    await send_fatwa_audio(client, chat_id, result, message_id)
                 except Exception as audio_err:
-                    logger.error(f"Failed to send audio {audio_url_or_path} for fatwa '{result.get('title', '')}': {audio_err}", exc_info=True)
+                    logger.error(f"Failed to send audio {result['audio']} for fatwa '{result.get('title', '')}': {audio_err}", exc_info=True)
                     # Optionally notify user about audio failure
                     # await client.send_message(chat_id, "لم أتمكن من إرسال الملف الصوتي لهذه الفتوى.", reply_to_message_id=message_id)
 
@@ -462,6 +683,59 @@ if app:
              logger.warning("[Fatwa Text Handler - Group 0] Filter matched but no regex groups found.")
     # --- End of Text Trigger Handler ---
 
+    # --- Result Browsing (next/previous and per-result audio) ---
+    @app.on_callback_query(filters.regex(r"^fatwa_page_([0-9a-f]{8})_(\d+)$"))
+    async def fatwa_page_callback(client: Client, callback_query: types.CallbackQuery):
+        """Shows another result from a cached result set by editing the message in place."""
+        token = callback_query.matches[0].group(1)
+        index = int(callback_query.matches[0].group(2))
+        fatwa_ids = get_result_set(token)
+        fatwa_data = fatwa_store["data"]
+        if not fatwa_ids or index >= len(fatwa_ids) or fatwa_ids[index] not in fatwa_data:
+            await callback_query.answer("انتهت صلاحية نتائج البحث، يرجى البحث مرة أخرى.", show_alert=True)
+            return
+        result = fatwa_data[fatwa_ids[index]]
+        try:
+            await callback_query.message.edit_text(
+                format_fatwa_message(result, index + 1, len(fatwa_ids)),
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True,
+                reply_markup=build_results_keyboard(token, index, len(fatwa_ids), has_audio=bool(result.get('audio')) and index > 0)
+            )
+            await callback_query.answer()
+        except MessageNotModified:
+            await callback_query.answer()
+        except Exception as e:
+            logger.error(f"Error showing fatwa result {index} of set {token}: {e}", exc_info=True)
+            await callback_query.answer("حدث خطأ أثناء عرض النتيجة.", show_alert=True)
+
+    @app.on_callback_query(filters.regex(r"^fatwa_audio_([0-9a-f]{8})_(\d+)$"))
+    async def fatwa_audio_callback(client: Client, callback_query: types.CallbackQuery):
+        """Sends the audio of the result currently shown (the first result's audio is sent with the search)."""
+        token = callback_query.matches[0].group(1)
+        index = int(callback_query.matches[0].group(2))
+        fatwa_ids = get_result_set(token)
+        result = fatwa_store["data"].get(fatwa_ids[index]) if fatwa_ids and index < len(fatwa_ids) else None
+        if not result or not result.get('audio'):
+            await callback_query.answer("انتهت صلاحية نتائج البحث، يرجى البحث مرة أخرى.", show_alert=True)
+            return
+        await callback_query.answer("🔊 جاري إرسال التسجيل الصوتي...")
+        try:
+            await send_fatwa_audio(client, callback_query.message.chat.id, result, callback_query.message.id)
+        except Exception as audio_err:
+            logger.error(f"Failed to send audio {result['audio']} for fatwa '{result.get('title', '')}': {audio_err}", exc_info=True)
+
+    # --- Reload Command (admins only) ---
+    @app.on_message(filters.command("reloadfatwas") & filters.user(FATWA_ADMIN_IDS))
+    async def fatwa_reload_handler(client: Client, message: types.Message):
+        """Reloads fatwas.json without restarting the bot."""
+        ensure_fatwa_watcher()
+        status_message = await message.reply_text("🔄 جاري إعادة تحميل الفتاوى...", reply_to_message_id=message.id)
+        if await reload_fatwas():
+            await status_message.edit_text(f"✅ تمت إعادة تحميل الفتاوى. عدد الفتاوى القابلة للبحث: {len(fatwa_store['choices'])}")
+        else:
+            await status_message.edit_text("❌ فشلت إعادة التحميل، وما زالت البيانات السابقة مستخدمة. راجع السجلات.")
+
     logger.info(f"Fatwa command handler registered for all chats.")
     logger.info(f"Fatwa text handler registered for all chats (Private and Groups/Channels) in default group 0.") # Updated log message
 
@@ -481,8 +755,8 @@ if not load_fatwas():
 #    raise RuntimeError("Failed to load essential fatwa data.")
 else:
      # Log success or warning based on list content
-     if fatwa_search_list:
-        logger.info(f"Fatwa data loaded successfully at module import. Search list size: {len(fatwa_search_list)}")
+     if fatwa_store["choices"]:
+        logger.info(f"Fatwa data loaded successfully at module import. Search list size: {len(fatwa_store['choices'])}")
      else:
         logger.warning("Fatwa data loading function completed at module import, but the search list is empty (e.g., file was empty or contained no valid items).")
 
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+مخزن دائم لمعرفات ملفات تيليجرام (file_id) مشترك بين الإضافات.
+Persistent content-key -> Telegram file_id store shared by every plugin.
+
+After the first upload of a piece of media (reciter audio, fatwa audio, an upscaled
+image...) the file_id from the returned Message is stored here. Later sends of the
+same content pass the file_id instead, which is instant and uses no bandwidth.
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import logging
+import os
+import sqlite3
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pyrogram.errors import FileIdInvalid, FileReferenceExpired, MediaEmpty
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات ---
+FILE_ID_DB_PATH = "file_id_cache.db"
+MEDIA_TYPES = ("audio", "photo", "document", "voice", "video", "animation")
+# Errors meaning a stored file_id can no longer be used and the media must be re-uploaded
+STALE_FILE_ID_ERRORS = (FileIdInvalid, FileReferenceExpired, MediaEmpty, ValueError)
+
+_memory_cache: Dict[str, Tuple[str, str]] = {} # {content_key: (media_type, file_id)}
+
+
+def get_db_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(FILE_ID_DB_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    return conn
+
+
+def init_db():
+    try:
+        with get_db_connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS media_file_ids (content_key TEXT PRIMARY KEY, media_type TEXT NOT NULL, "
+                "file_id TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP) WITHOUT ROWID;"
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to initialize file_id cache DB at {FILE_ID_DB_PATH}: {e}", exc_info=True)
+
+
+def make_file_content_key(path: str) -> str:
+    """Content key for a local file: path plus size and mtime, so an edited file is re-uploaded."""
+    try:
+        stat = os.stat(path)
+        return f"file:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return f"file:{os.path.abspath(path)}"
+
+
+def get_cached_media(content_key: str) -> Optional[Tuple[str, str]]:
+    """Returns (media_type, file_id) for content_key, or None if it was never uploaded."""
+    cached = _memory_cache.get(content_key)
+    if cached:
+        return cached
+    try:
+        with get_db_connection() as conn:
+            row = conn.execute("SELECT media_type, file_id FROM media_file_ids WHERE content_key = ?", (content_key,)).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"file_id cache read failed for '{content_key}': {e}")
+        return None
+    if row:
+        _memory_cache[content_key] = (row[0], row[1])
+        return _memory_cache[content_key]
+    return None
+
+
+def get_file_id(content_key: str) -> Optional[str]:
+    cached = get_cached_media(content_key)
+    return cached[1] if cached else None
+
+
+def store_file_id(content_key: str, media_type: str, file_id: str):
+    _memory_cache[content_key] = (media_type, file_id)
+    try:
+        with get_db_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media_file_ids (content_key, media_type, file_id) VALUES (?, ?, ?)",
+                (content_key, media_type, file_id)
+            )
+    except sqlite3.Error as e:
+        logger.error(f"file_id cache write failed for '{content_key}': {e}")
+
+
+def forget_file_id(content_key: str):
+    _memory_cache.pop(content_key, None)
+    try:
+        with get_db_connection() as conn:
+            conn.execute("DELETE FROM media_file_ids WHERE content_key = ?", (content_key,))
+    except sqlite3.Error as e:
+        logger.error(f"file_id cache delete failed for '{content_key}': {e}")
+
+
+def remember_sent_media(content_key: str, message) -> Optional[str]:
+    """
+    يحفظ معرف الملف من الرسالة المرسلة.
+    Stores the file_id of the media carried by `message` (the return value of
+    send_audio / reply_photo / reply_document ...). Returns the file_id or None.
+    """
+    if message is None:
+        return None
+    for media_type in MEDIA_TYPES:
+        media = getattr(message, media_type, None)
+        if media is None:
+            continue
+        if media_type == "photo" and isinstance(media, list): # Older Pyrogram returns a list of sizes
+            media = media[-1]
+        file_id = getattr(media, "file_id", None)
+        if file_id:
+            store_file_id(content_key, media_type, file_id)
+            return file_id
+    return None
+
+
+async def send_cached_media(content_key: str, send_func: Callable[..., Awaitable[Any]], media_field: str, source: Any, **kwargs) -> Any:
+    """
+    يرسل الوسائط باستخدام file_id المحفوظ إن وجد، وإلا يرفع المصدر ويحفظ المعرف الناتج.
+    Calls `send_func(**{media_field: file_id}, **kwargs)` when content_key is cached,
+    falling back to `source` (URL, path or file object) if the file_id went stale.
+    The file_id of a fresh upload is stored for next time.
+    """
+    file_id = get_file_id(content_key)
+    if file_id:
+        try:
+            return await send_func(**{media_field: file_id}, **kwargs)
+        except STALE_FILE_ID_ERRORS as e:
+            logger.warning(f"Cached file_id for '{content_key}' is no longer valid ({type(e).__name__}); re-uploading.")
+            forget_file_id(content_key)
+    sent = await send_func(**{media_field: source}, **kwargs)
+    remember_sent_media(content_key, sent)
+    return sent
+
+
+init_db()
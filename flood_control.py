@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+أدوات مشتركة لتنظيم معدل الإرسال إلى تيليجرام والتعامل مع FloodWait.
+Shared Telegram send pacing for plugins that send several messages in a row.
+
+Instead of fixed `asyncio.sleep()` calls between sends, plugins route each send
+through a `SendLimiter`, which spaces sends per chat and, on FloodWait, pauses
+that chat for exactly the time Telegram asked for and retries. Long bulk jobs
+(mass mentions, bulk admin actions) pace themselves with an adaptive `TokenBucket`.
+Live-updating messages (countdowns, progress bars, status lines) go through the
+shared `edit_scheduler`, which keeps every edit inside per-chat and global budgets.
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pyrogram.errors import FloodWait, MessageNotModified
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات ---
+DEFAULT_PER_CHAT_INTERVAL = 1.0 # Telegram: ~1 message per second per chat
+DEFAULT_MAX_FLOOD_RETRIES = 3
+MAX_FLOOD_WAIT_SECONDS = 300 # Give up instead of sleeping longer than this
+DEFAULT_EDIT_INTERVAL = 3.0 # Live edits per chat: ~20 per minute, Telegram's group budget
+DEFAULT_GLOBAL_EDIT_RATE = 20.0 # Live edits per second across all chats (sends need the rest of ~30/s)
+
+
+class SendLimiter:
+    """
+    يضبط توقيت الإرسال لكل محادثة ويحترم FloodWait.
+    Spaces calls per chat by `per_chat_interval` seconds and retries on FloodWait.
+    """
+
+    def __init__(self, per_chat_interval: float = DEFAULT_PER_CHAT_INTERVAL, max_retries: int = DEFAULT_MAX_FLOOD_RETRIES):
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._next_slot: Dict[int, float] = {} # {chat_id: monotonic time of the next free slot}
+
+    async def wait(self, chat_id: int):
+        """Reserves the next send slot for chat_id and sleeps until it arrives."""
+        now = time.monotonic()
+        if len(self._next_slot) > 10000:
+            self._next_slot = {cid: t for cid, t in self._next_slot.items() if t > now} # Drop idle chats
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.per_chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def penalize(self, chat_id: int, seconds: float):
+        """Pushes the chat's next slot back after a FloodWait."""
+        self._next_slot[chat_id] = max(self._next_slot.get(chat_id, 0.0), time.monotonic() + seconds)
+
+    async def run(self, chat_id: int, func: Callable[..., Awaitable[Any]], /, *args, **kwargs) -> Any:
+        """
+        ينفذ استدعاء الإرسال في موعده ويعيد المحاولة عند FloodWait.
+        Awaits `func(*args, **kwargs)` in the chat's next slot. On FloodWait the chat is
+        paused for the requested time and the call is retried up to `max_retries` times.
+        """
+        attempt = 0
+        while True:
+            await self.wait(chat_id)
+            try:
+                return await func(*args, **kwargs)
+            except FloodWait as e:
+                wait_seconds = float(e.value or 1)
+                attempt += 1
+                if attempt > self.max_retries or wait_seconds > MAX_FLOOD_WAIT_SECONDS:
+                    logger.warning(f"FloodWait {wait_seconds}s in chat {chat_id}; giving up after {attempt} attempt(s).")
+                    raise
+                logger.warning(f"FloodWait {wait_seconds}s in chat {chat_id}; retry {attempt}/{self.max_retries}.")
+                self.penalize(chat_id, wait_seconds)
+
+
+class TokenBucket:
+    """
+    دلو رموز يتكيف مع FloodWait: يبطئ عند الحظر ويسرّع تدريجياً عند النجاح.
+    Token bucket whose refill rate adapts to Telegram's answers (AIMD): every FloodWait
+    halves the rate and pauses the bucket for the requested time, every success adds
+    `increase_step` back, up to `max_rate`. Long-running jobs keep one bucket per chat
+    so the learned rate carries over between runs.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.05, max_rate: Optional[float] = None,
+                 increase_step: float = 0.01, decrease_factor: float = 0.5):
+        self.rate = rate # Tokens (sends) per second
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self._updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one can be taken now)."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now + max(0.0, 1.0 - self.tokens) / self.rate
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Sleeps until a token is available, then takes it."""
+        while True:
+            wait_seconds = self.delay()
+            if wait_seconds <= 0:
+                self.tokens -= 1.0
+                return
+            await asyncio.sleep(wait_seconds)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def decrease(self):
+        """Multiplicative decrease only: buffered tokens and other callers are not paused."""
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+
+    def on_flood_wait(self, seconds: float):
+        """Multiplicative decrease plus a pause for exactly the time Telegram asked for."""
+        self.decrease()
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self._updated_at = max(self._updated_at, self.paused_until) # No refill while paused
+
+
+class EditScheduler:
+    """
+    مجدول مشترك لتعديل الرسائل الحية ضمن ميزانية لكل محادثة وميزانية عامة.
+    Shared budget for live-updating messages. `submit()` records the latest text for a
+    message and returns at once; one worker sends the edits, at most one per
+    `per_chat_interval` per chat and `global_rate` per second overall. A newer text
+    replaces a pending one (latest value wins) and a text equal to the one already
+    shown is dropped. FloodWait pauses only that chat and halves the global rate.
+    Final texts go through `edit_now()`, which discards the pending update first so
+    a stale progress line can never overwrite them.
+    """
+
+    def __init__(self, per_chat_interval: float = DEFAULT_EDIT_INTERVAL, global_rate: float = DEFAULT_GLOBAL_EDIT_RATE,
+                 max_retries: int = DEFAULT_MAX_FLOOD_RETRIES):
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(global_rate, capacity=global_rate, min_rate=1.0, increase_step=0.1)
+        # {(chat_id, message_id): (text, edit_func, kwargs, on_error)}; dict order = submission order
+        self._pending: Dict[Tuple[int, int], Tuple[str, Callable[..., Awaitable[Any]], dict, Optional[Callable]]] = {}
+        self._shown: Dict[Tuple[int, int], str] = {} # Last text Telegram has for each live message
+        self._in_flight: Dict[Tuple[int, int], asyncio.Task] = {}
+        self._chat_ready_at: Dict[int, float] = {} # {chat_id: monotonic time the next edit is allowed}
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, chat_id: int, message_id: int, text: str, edit_func: Callable[..., Awaitable[Any]],
+               on_error: Optional[Callable[[Exception], Any]] = None, **kwargs):
+        """
+        يسجل أحدث نص للرسالة دون انتظار.
+        Queues `edit_func(text, **kwargs)` for the message, replacing any pending text.
+        `on_error(exc)` is called for failures other than FloodWait (e.g. the message was deleted).
+        """
+        key = (chat_id, message_id)
+        if len(self._shown) > 10000:
+            self._shown.clear() # Worst case one redundant edit per live message
+        if self._shown.get(key) == text and key not in self._in_flight:
+            self._pending.pop(key, None) # Already on screen: nothing to send
+            return
+        self._pending[key] = (text, edit_func, kwargs, on_error)
+        self._wakeup.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def update_message(self, message, text: str, **kwargs):
+        """submit() for a pyrogram Message (uses message.edit_text)."""
+        self.submit(message.chat.id, message.id, text, message.edit_text, **kwargs)
+
+    def forget(self, chat_id: int, message_id: int):
+        """Drops the pending edit and remembered text, e.g. before deleting the message."""
+        key = (chat_id, message_id)
+        self._pending.pop(key, None)
+        self._shown.pop(key, None)
+
+    async def edit_now(self, chat_id: int, message_id: int, text: str, edit_func: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        """
+        يرسل النص النهائي للرسالة بعد إلغاء أي تحديث معلق.
+        Sends a final text: drops the pending update, waits for an in-flight one, then
+        edits within the chat's budget, retrying on FloodWait like SendLimiter.run.
+        The message is forgotten afterwards. Other errors propagate to the caller.
+        """
+        key = (chat_id, message_id)
+        self._pending.pop(key, None)
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            await asyncio.wait({in_flight})
+        shown = self._shown.pop(key, None)
+        if shown == text:
+            return None
+        attempt = 0
+        while True:
+            delay = self._chat_ready_at.get(chat_id, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.bucket.acquire()
+            self._chat_ready_at[chat_id] = time.monotonic() + self.per_chat_interval
+            try:
+                return await edit_func(text, **kwargs)
+            except MessageNotModified:
+                return None
+            except FloodWait as e:
+                wait_seconds = float(e.value or 1)
+                self._on_flood_wait(chat_id, wait_seconds)
+                attempt += 1
+                if attempt > self.max_retries or wait_seconds > MAX_FLOOD_WAIT_SECONDS:
+                    logger.warning(f"FloodWait {wait_seconds}s editing in chat {chat_id}; giving up after {attempt} attempt(s).")
+                    raise
+
+    async def finish_message(self, message, text: str, **kwargs) -> Any:
+        """edit_now() for a pyrogram Message."""
+        return await self.edit_now(message.chat.id, message.id, text, message.edit_text, **kwargs)
+
+    def _on_flood_wait(self, chat_id: int, seconds: float):
+        self._chat_ready_at[chat_id] = max(self._chat_ready_at.get(chat_id, 0.0), time.monotonic() + seconds)
+        self.bucket.decrease() # Halve the global rate; the burst stays available to the other chats
+
+    def _next_ready(self, now: float) -> Tuple[Optional[Tuple[int, int]], float]:
+        """The oldest pending message whose chat may be edited now, else (None, earliest ready time)."""
+        earliest = float("inf")
+        for key in self._pending:
+            if key in self._in_flight:
+                continue
+            ready_at = self._chat_ready_at.get(key[0], 0.0)
+            if ready_at <= now:
+                return key, now
+            earliest = min(earliest, ready_at)
+        return None, earliest
+
+    async def _run(self):
+        while self._pending:
+            self._wakeup.clear()
+            now = time.monotonic()
+            key, ready_at = self._next_ready(now)
+            if key is None:
+                timeout = None if ready_at == float("inf") else ready_at - now # inf: all pending are in flight
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.bucket.acquire()
+            item = self._pending.pop(key, None)
+            if item is None or key in self._in_flight: # Taken by edit_now() while waiting for a token
+                continue
+            self._chat_ready_at[key[0]] = time.monotonic() + self.per_chat_interval
+            self._in_flight[key] = asyncio.create_task(self._send(key, *item))
+        if len(self._chat_ready_at) > 10000:
+            now = time.monotonic()
+            self._chat_ready_at = {cid: t for cid, t in self._chat_ready_at.items() if t > now} # Drop idle chats
+
+    async def _send(self, key: Tuple[int, int], text: str, edit_func: Callable[..., Awaitable[Any]], kwargs: dict,
+                    on_error: Optional[Callable[[Exception], Any]]):
+        try:
+            await edit_func(text, **kwargs)
+            self._shown[key] = text
+            self.bucket.on_success()
+        except MessageNotModified:
+            self._shown[key] = text
+        except FloodWait as e:
+            logger.warning(f"FloodWait {e.value}s on live edit in chat {key[0]}; pausing that chat only.")
+            self._on_flood_wait(key[0], float(e.value or 1))
+            self._pending.setdefault(key, (text, edit_func, kwargs, on_error)) # Retry unless a newer text arrived
+        except Exception as e:
+            logger.warning(f"Live edit of message {key[1]} in chat {key[0]} failed: {e}")
+            self._shown.pop(key, None)
+            if on_error is not None:
+                try:
+                    result = on_error(e)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as callback_err:
+                    logger.error(f"on_error callback for chat {key[0]} failed: {callback_err}")
+        finally:
+            self._in_flight.pop(key, None)
+            self._wakeup.set()
+            if self._pending and (self._worker is None or self._worker.done()):
+                self._worker = asyncio.create_task(self._run())
+
+
+# Shared instances: polite per-chat send pacing, and the edit budget for live messages
+send_limiter = SendLimiter()
+edit_scheduler = EditScheduler()
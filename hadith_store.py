@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+فهرس الأحاديث المحلي (hadiths_fts) ودوال البحث فيه، مشترك بين إضافتي الحديث.
+Local hadith store shared by the hadith plugin (chiaa.py) and the sunah fallback search.
+
+Holds the SQLite FTS5 schema and population, the bm25-ranked search with its two-tier
+result cache (in-process LRU in front of async Redis), snippets and detail lookups.
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import asyncio
+import html
+import logging
+import os
+import re
+import sqlite3
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import redis.asyncio as aioredis # عميل Redis غير متزامن (اختياري)
+except ImportError:
+    aioredis = None
+
+try:
+    from .json_stream import iter_json_array, iter_batches
+    from .arabic_text import normalize_arabic as normalize_text, PROFILE_HADITH
+except ImportError:
+    from json_stream import iter_json_array, iter_batches
+    from arabic_text import normalize_arabic as normalize_text, PROFILE_HADITH
+
+logger = logging.getLogger(__name__)
+
+# ==============================================================================
+#  Configuration
+# ==============================================================================
+DB_NAME = 'hadith_bot.db'
+SNIPPET_CONTEXT_WORDS = 7
+USE_REDIS = True
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+REDIS_DB = 0
+CACHE_EXPIRY_SECONDS = 3600 * 6
+SEARCH_CACHE_SIZE = 2048 # In-process LRU entries (queries) in front of Redis
+REDIS_RETRY_AFTER_SECONDS = 60 # Skip Redis for this long after a failure
+SEARCH_CACHE_KEY_PREFIX = "hadith_search:v3:" # v3 = packed uint32 rowids, best bm25 first (v1 was a JSON list)
+HADITH_INSERT_BATCH_SIZE = 2000 # Rows per executemany while populating from JSON
+DETAILS_BATCH_SIZE = 500 # rowids per "WHERE rowid IN (...)" statement
+HADITH_SEARCH_LIMIT = 200 # Max unique results returned by SQLite per search
+FTS_CLITIC_PREFIXES = ('و', 'ف', 'ب', 'ل', 'ك')
+FTS_PREFIX_MIN_CHARS = 3 # Last word needs this many letters before "word*" prefix matching is added
+
+# ==============================================================================
+#  Redis Connection
+# ==============================================================================
+# عميل واحد مشترك (مجمع اتصالات واحد) يُنشأ عند أول استخدام داخل حلقة الأحداث
+redis_client = None
+redis_retry_at = 0.0
+if USE_REDIS and aioredis is None:
+    logger.warning("redis.asyncio not available (pip install redis). Search cache is in-process only."); USE_REDIS = False
+
+def get_redis_client():
+    """Returns the shared async Redis client, or None while Redis is disabled/backing off."""
+    global redis_client
+    if not USE_REDIS or time.monotonic() < redis_retry_at: return None
+    if redis_client is None:
+        pool = aioredis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, socket_connect_timeout=2, socket_timeout=2)
+        redis_client = aioredis.Redis(connection_pool=pool); logger.info(f"Async Redis pool created ({REDIS_HOST}:{REDIS_PORT})")
+    return redis_client
+
+def mark_redis_down(error: Exception):
+    global redis_retry_at
+    logger.warning(f"Redis error, using in-process cache only for {REDIS_RETRY_AFTER_SECONDS}s. Error: {error}")
+    redis_retry_at = time.monotonic() + REDIS_RETRY_AFTER_SECONDS
+
+# ==============================================================================
+#  Search Result Cache (in-process LRU -> Redis)
+# ==============================================================================
+# النتائج تُخزن كمصفوفة أعداد مضغوطة (4 بايت لكل rowid) بدلاً من قائمة JSON
+search_cache: "OrderedDict[str, Tuple[float, array]]" = OrderedDict() # {normalized_query: (expires_at, rowids)}
+
+def pack_rowids(rowids) -> bytes:
+    return array('I', rowids).tobytes()
+
+def unpack_rowids(payload: bytes) -> array:
+    rowids = array('I'); rowids.frombytes(payload); return rowids
+
+def _search_cache_get_local(key: str) -> Optional[array]:
+    entry = search_cache.get(key)
+    if entry is None: return None
+    if entry[0] < time.monotonic(): del search_cache[key]; return None
+    search_cache.move_to_end(key); return entry[1]
+
+def _search_cache_put_local(key: str, rowids: array):
+    search_cache[key] = (time.monotonic() + CACHE_EXPIRY_SECONDS, rowids); search_cache.move_to_end(key)
+    while len(search_cache) > SEARCH_CACHE_SIZE: search_cache.popitem(last=False)
+
+async def search_cache_get(key: str) -> Optional[array]:
+    rowids = _search_cache_get_local(key)
+    if rowids is not None: return rowids
+    client = get_redis_client()
+    if client is None: return None
+    try: payload = await client.get(SEARCH_CACHE_KEY_PREFIX + key)
+    except Exception as e: mark_redis_down(e); return None
+    if not payload: return None
+    rowids = unpack_rowids(payload); _search_cache_put_local(key, rowids) # Promote to the in-process tier
+    return rowids
+
+async def search_cache_put(key: str, rowids: array):
+    _search_cache_put_local(key, rowids)
+    client = get_redis_client()
+    if client is None: return
+    try: await client.set(SEARCH_CACHE_KEY_PREFIX + key, pack_rowids(rowids), ex=CACHE_EXPIRY_SECONDS)
+    except Exception as e: mark_redis_down(e)
+
+def clear_local_search_cache():
+    """Drops the in-process tier (e.g. after a hadith is approved); Redis entries expire on their own."""
+    search_cache.clear()
+
+# ==============================================================================
+#  Arabic Text Normalization (Taa Marbuta preserved AGAIN)
+# ==============================================================================
+# ملف "hadith" المشترك في arabic_text.py يطابق التطبيع المخزن في hadiths_fts حرفياً
+def normalize_arabic(text: str) -> str:
+    """يطبق تطبيعًا محسنًا للنص العربي مع الحفاظ على التاء المربوطة."""
+    return normalize_text(text, PROFILE_HADITH)
+
+# ==============================================================================
+#  Database Functions
+# ==============================================================================
+def get_db_connection() -> sqlite3.Connection:
+    try:
+        conn = sqlite3.connect(DB_NAME, timeout=10); conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;"); conn.execute("PRAGMA busy_timeout = 5000;")
+        conn.execute("PRAGMA foreign_keys = ON;")
+        return conn
+    except sqlite3.Error as e: logger.critical(f"DB Connect Error: {e}", exc_info=True); raise
+
+def init_db(): # يجب تشغيله مرة واحدة عبر setup_hadith_db.py
+    logger.info("Initializing database schema (if needed)...")
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS hadiths_fts USING fts5(original_id UNINDEXED, book UNINDEXED, arabic_text, grading UNINDEXED, tokenize='unicode61 remove_diacritics 2');")
+            cursor.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID;")
+            stats_keys = ['search_count', 'hadith_added_count', 'hadith_approved_count', 'hadith_rejected_count']
+            cursor.executemany("INSERT OR IGNORE INTO stats (key, value) VALUES (?, 0)", [(k,) for k in stats_keys])
+            cursor.execute("CREATE TABLE IF NOT EXISTS pending_hadiths (submission_id INTEGER PRIMARY KEY AUTOINCREMENT, submitter_id INTEGER NOT NULL, submitter_username TEXT, book TEXT NOT NULL, arabic_text TEXT NOT NULL, grading TEXT, submission_time DATETIME DEFAULT CURRENT_TIMESTAMP, approval_message_id INTEGER NULL);")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_pending_submitter ON pending_hadiths(submitter_id);")
+            cursor.execute("CREATE TABLE IF NOT EXISTS user_states (user_id INTEGER PRIMARY KEY, state INTEGER NOT NULL, data TEXT) WITHOUT ROWID;")
+            logger.info("Database schema initialized/verified.")
+    except sqlite3.Error as e: logger.critical(f"CRITICAL: Database initialization failed: {e}", exc_info=True); raise
+
+def populate_db_from_json(filename: str): # يجب تشغيله مرة واحدة عبر setup_hadith_db.py
+    """يملأ جدول الأحاديث (FTS) من ملف JSON، ويحذف البيانات القديمة أولاً."""
+    logger.info("Checking database population...")
+    try:
+        if not os.path.exists(filename): logger.error(f"JSON file '{filename}' not found."); return
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            # !! حذف البيانات الموجودة أولاً لتطبيق التطبيع الجديد !!
+            logger.warning("Dropping existing data from hadiths_fts to apply new normalization...")
+            cursor.execute("DELETE FROM hadiths_fts;")
+            logger.info("Existing data dropped. Populating with new normalization...")
+
+            # قراءة الملف عنصراً عنصراً وإدراجه على دفعات: الذاكرة لا تكبر مع حجم الملف
+            stats = {"seen": 0, "skipped": 0}
+            def prepared_rows():
+                for h in iter_json_array(filename):
+                    stats["seen"] += 1
+                    if not isinstance(h, dict): stats["skipped"] += 1; continue
+                    text = h.get('arabicText')
+                    if not text or not isinstance(text, str): stats["skipped"] += 1; continue
+                    book = h.get('book') or "غير معروف"; orig_id = str(h.get('id', f'gen_{uuid.uuid4()}'))
+                    grading = h.get('majlisiGrading'); cleaned = re.sub(r"^\s*\d+[\s\u0640\.\-–—]*", "", text).strip()
+                    if not cleaned: stats["skipped"] += 1; continue
+                    # استخدام الدالة المعدلة التي تحافظ على التاء المربوطة
+                    normalized = normalize_arabic(cleaned)
+                    if not normalized: stats["skipped"] += 1; continue
+                    yield (orig_id, book, normalized, grading)
+
+            added = 0
+            logger.info(f"Streaming entries from JSON in batches of {HADITH_INSERT_BATCH_SIZE}...")
+            for batch in iter_batches(prepared_rows(), HADITH_INSERT_BATCH_SIZE):
+                cursor.executemany("INSERT INTO hadiths_fts (original_id, book, arabic_text, grading) VALUES (?, ?, ?, ?)", batch)
+                added += len(batch)
+                if added % (HADITH_INSERT_BATCH_SIZE * 5) == 0: logger.info(f"Inserted {added} hadiths ({stats['seen']} entries read)...")
+
+            if added: logger.info(f"Added {added} hadiths with new normalization. Skipped {stats['skipped']}.")
+            else: logger.warning("No valid hadiths found in JSON to insert.")
+
+    except Exception as e: logger.error(f"Population Error: {e}", exc_info=True)
+
+def update_stats(key: str, increment: int = 1):
+    try:
+        with get_db_connection() as conn: conn.execute("INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;", (key, increment))
+    except Exception as e: logger.error(f"Stat Update Error for '{key}': {e}", exc_info=True)
+
+def build_fts_query(normalized_search_query: str) -> str:
+    """
+    يبني استعلام FTS5: العبارة كما هي + مع حروف السوابق (و، ف، ب، ل، ك) + بحث بالبادئة (*) على آخر كلمة.
+    Builds the MATCH expression. Exact phrase variants are always included, so rows
+    matching exactly also match the prefix variants and score higher under bm25.
+    """
+    tokens = [t.replace('"', '""') for t in normalized_search_query.split()]
+    if not tokens: return ""
+    phrase = " ".join(tokens)
+    variants = [f'"{phrase}"'] + [f'"{p}{phrase}"' for p in FTS_CLITIC_PREFIXES]
+    if len(tokens[-1]) >= FTS_PREFIX_MIN_CHARS: # FTS5 prefix query: الصلا* -> الصلاة، الصلوات ...
+        variants += [f'"{phrase}"*'] + [f'"{p}{phrase}"*' for p in FTS_CLITIC_PREFIXES]
+    return " OR ".join(variants)
+
+def _search_hadiths_fts(normalized_search_query: str) -> List[int]:
+    """
+    Runs the FTS query (blocking sqlite; called via asyncio.to_thread): best bm25 first,
+    one row per original_id and at most HADITH_SEARCH_LIMIT rows, all inside SQLite.
+    """
+    fts_match_query = build_fts_query(normalized_search_query)
+    if not fts_match_query: return []
+    print(f"  [HADITH_DEBUG] --- search_hadiths_db: Executing FTS query: {fts_match_query}")
+    with get_db_connection() as conn:
+        try:
+            # bm25() can't be used under GROUP BY directly, so the matches are materialized first
+            rows = conn.execute(
+                "WITH matches AS MATERIALIZED (SELECT rowid AS rid, original_id, bm25(hadiths_fts) AS score FROM hadiths_fts WHERE hadiths_fts MATCH ?) "
+                "SELECT rid, MIN(score) AS best FROM matches WHERE original_id IS NOT NULL GROUP BY original_id ORDER BY best LIMIT ?",
+                (fts_match_query, HADITH_SEARCH_LIMIT)
+            ).fetchall()
+            unique_rowids = [row['rid'] for row in rows]
+        except sqlite3.OperationalError as e:
+            if "MATERIALIZED" not in str(e) and "syntax error" not in str(e): raise
+            # SQLite < 3.35: stream best-first rows and stop after HADITH_SEARCH_LIMIT unique original_ids
+            unique_rowids = []; seen_original_ids: Set[str] = set()
+            cursor = conn.execute("SELECT rowid, original_id FROM hadiths_fts WHERE hadiths_fts MATCH ? ORDER BY bm25(hadiths_fts)", (fts_match_query,))
+            for row in cursor:
+                original_id_str = str(row['original_id']) if row['original_id'] is not None else None
+                if original_id_str and original_id_str not in seen_original_ids:
+                    seen_original_ids.add(original_id_str); unique_rowids.append(row['rowid'])
+                    if len(unique_rowids) >= HADITH_SEARCH_LIMIT: break
+    print(f"  [HADITH_DEBUG] --- search_hadiths_db: FTS query returned {len(unique_rowids)} unique matches.")
+    return unique_rowids
+
+def get_hadith_snippets(search_query: str, rowids: List[int]) -> Dict[int, Tuple[str, str]]:
+    """يجلب الكتاب ومقتطف FTS5 (snippet) المظلل لعدة أحاديث باستعلام واحد: {rowid: (book, snippet_html)}."""
+    fts_match_query = build_fts_query(normalize_arabic(search_query))
+    if not fts_match_query or not rowids: return {}
+    placeholders = ",".join("?" * len(rowids))
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                f"SELECT rowid, book, snippet(hadiths_fts, 2, char(2), char(3), '…', {SNIPPET_CONTEXT_WORDS * 2}) AS snip "
+                f"FROM hadiths_fts WHERE hadiths_fts MATCH ? AND rowid IN ({placeholders})", [fts_match_query, *rowids]
+            ).fetchall()
+    except sqlite3.Error as e: logger.error(f"DB Snippet Fetch Error: {e}", exc_info=True); return {}
+    # \x02/\x03 mark the hits; they survive html.escape and become <b> tags afterwards
+    return {row['rowid']: (row['book'] or 'غير معروف', html.escape(row['snip'] or '').replace('\x02', '<b>').replace('\x03', '</b>')) for row in rows}
+
+async def search_hadiths_db(query: str) -> List[int]:
+    original_query_str = query.strip(); normalized_search_query = normalize_arabic(original_query_str) # سيستخدم التطبيع الجديد
+    if not normalized_search_query: return []
+    print(f"  [HADITH_DEBUG] --- search_hadiths_db: Normalized query: '{normalized_search_query}'")
+    cached_rowids = await search_cache_get(normalized_search_query) # Cache Check (memory, then Redis)
+    if cached_rowids is not None:
+        print(f"  [HADITH_DEBUG] --- search_hadiths_db: Cache HIT ({len(cached_rowids)} results)"); return list(cached_rowids)
+    unique_rowids: List[int] = []
+    try: # DB Search
+        unique_rowids = await asyncio.to_thread(_search_hadiths_fts, normalized_search_query)
+        print(f"  [HADITH_DEBUG] --- search_hadiths_db: Deduplicated results count: {len(unique_rowids)}")
+        if unique_rowids: # Cache Set
+            await search_cache_put(normalized_search_query, array('I', unique_rowids)); print("  [HADITH_DEBUG] --- search_hadiths_db: Results cached.")
+    except sqlite3.Error as e:
+         if "no such table" in str(e).lower(): logger.error(f"DB Error: 'hadiths_fts' table missing? {e}")
+         else: logger.error(f"DB search error: {e}", exc_info=True)
+    except Exception as e: logger.error(f"Unexpected search error: {e}", exc_info=True)
+    return unique_rowids
+
+def get_hadith_details(rowids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """يجلب تفاصيل عدة أحاديث باتصال واحد واستعلام واحد لكل دفعة (WHERE rowid IN ...)."""
+    rowids = [int(r) for r in dict.fromkeys(rowids)] # Dedup, keep order
+    if not rowids: return {}
+    print(f"  [HADITH_DEBUG] --- get_hadith_details: Fetching details for {len(rowids)} rowid(s)")
+    details_by_rowid: Dict[int, Dict[str, Any]] = {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(rowids), DETAILS_BATCH_SIZE): # SQLite caps bound variables per statement
+                batch = rowids[start:start + DETAILS_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(f"SELECT rowid, original_id, book, arabic_text, grading FROM hadiths_fts WHERE rowid IN ({placeholders})", batch)
+                for row in cursor.fetchall(): details_by_rowid[row['rowid']] = dict(row)
+        print(f"  [HADITH_DEBUG] --- get_hadith_details: {len(details_by_rowid)}/{len(rowids)} found.")
+    except sqlite3.Error as e:
+         if "no such table" in str(e).lower(): logger.error(f"DB Error: 'hadiths_fts' table missing? {e}")
+         else: logger.error(f"DB Detail Fetch Error: {e}", exc_info=True)
+    except Exception as e: logger.error(f"Unexpected Detail Fetch Error: {e}", exc_info=True)
+    return details_by_rowid
+
+def get_hadith_details_by_db_id(row_id: int) -> Optional[Dict[str, Any]]:
+    return get_hadith_details([row_id]).get(row_id)
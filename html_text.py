@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+تحويل نص HTML (كما ترجعه واجهات الحديث) إلى نص عادي دون بناء شجرة.
+HTML -> plain text for hadith texts returned by the search APIs.
+
+`convert_html_to_text` feeds the markup through one reusable `html.parser`
+extractor, with a fast path for text that has no tags or entities. Run this file
+directly to compare its output and speed with the previous BeautifulSoup version:
+
+    python html_text.py
+
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import logging
+from html.parser import HTMLParser
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """
+    Streaming HTML -> text: collects text nodes from parser events instead of building a
+    tree. Same output as BeautifulSoup's get_text(separator=' ', strip=True) after unwrapping
+    the <a> tags (each text node stripped, empty ones dropped, joined with one space).
+    """
+    SKIPPED_TAGS = {"script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip_depth = 0
+
+    def reset(self):
+        super().reset()
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS: self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self.skip_depth: self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth: return
+        data = data.strip()
+        if data: self.parts.append(data)
+
+_html_extractor = _HTMLTextExtractor() # أُنشئ مرة واحدة ويعاد ضبطه لكل نص (المعالجات تعمل على خيط الحلقة نفسه)
+
+def convert_html_to_text(html_content: str) -> str:
+    """Converts HTML content to plain text with the shared streaming extractor (no bs4 needed)."""
+    if not html_content: return ""
+    if "<" not in html_content and "&" not in html_content: return html_content.strip() # Plain text: nothing to parse
+    try:
+        _html_extractor.reset()
+        _html_extractor.feed(html_content)
+        _html_extractor.close()
+        return " ".join(_html_extractor.parts)
+    except Exception as e:
+        logger.error(f"Error converting HTML to text: {e}", exc_info=True)
+        return html_content
+
+
+# ==============================================================================
+#  Micro-benchmark: streaming extractor vs the previous BeautifulSoup conversion
+#  (python html_text.py)
+# ==============================================================================
+BENCH_SAMPLES = [
+    'حدثنا <a class="narrator" href="/n/1">محمد بن يحيى</a> عن <a class="narrator" href="/n/2">أحمد</a> قال: '
+    '<a class="matn">قَالَ رَسُولُ اللَّهِ ﷺ: الصَّلَاةُ عَمُودُ الدِّينِ</a> &amp; <b>صحيح</b>',
+    '<p>بَابُ <span class="chapter">فَضْلِ الْعِلْمِ</span></p><p><a class="matn">طَلَبُ الْعِلْمِ فَرِيضَةٌ</a></p>',
+    '  إِنَّمَا الْأَعْمَالُ بِالنِّيَّاتِ  ',
+]
+
+def _legacy_convert_html_to_text(html_content: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for a_tag in soup.find_all('a'): a_tag.unwrap()
+    for matn_tag in soup.find_all('a', class_='matn'): matn_tag.unwrap()
+    return soup.get_text(separator=' ', strip=True)
+
+def _benchmark_html_conversion():
+    import timeit
+    samples = BENCH_SAMPLES * 200
+    try:
+        import bs4 # noqa: F401
+    except ImportError:
+        bs4 = None
+    if bs4 is not None:
+        mismatches = [s for s in BENCH_SAMPLES if convert_html_to_text(s) != _legacy_convert_html_to_text(s)]
+        print(f"Output mismatches vs BeautifulSoup: {len(mismatches)}")
+        for sample in mismatches: print(f"  {sample!r}\n    new: {convert_html_to_text(sample)!r}\n    old: {_legacy_convert_html_to_text(sample)!r}")
+        implementations = (("BeautifulSoup (previous)", _legacy_convert_html_to_text), ("streaming extractor", convert_html_to_text))
+    else:
+        print("beautifulsoup4 not installed; benchmarking the streaming extractor only.")
+        implementations = (("streaming extractor", convert_html_to_text),)
+    for name, func in implementations:
+        seconds = min(timeit.repeat(lambda: [func(s) for s in samples], number=3, repeat=3)) / 3
+        print(f"{name:26s} {seconds * 1e6 / len(samples):8.2f} us/text")
+
+if __name__ == "__main__":
+    _benchmark_html_conversion()
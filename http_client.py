@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+عميل HTTP مشترك (HTTP/2) لجميع طلبات الإضافات الخارجية.
+Shared, pooled HTTP/2 client used by every plugin for outbound API calls.
+
+Plugins import the helpers from here instead of opening a new `httpx.AsyncClient`
+per request, so TLS handshakes and TCP connections are reused across all plugins.
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات ---
+HTTP_TIMEOUT = httpx.Timeout(15.0, connect=5.0) # Default timeout (per request override allowed)
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+MAX_CONNECTIONS_PER_HOST = 10 # Concurrent in-flight requests allowed per host
+RETRY_ATTEMPTS = 2 # Retries after the first attempt
+RETRY_BACKOFF_BASE = 0.5 # Seconds; doubled on every retry
+RETRY_BACKOFF_MAX = 8.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# --- الحالة الداخلية ---
+_client: Optional[httpx.AsyncClient] = None
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    يعيد العميل المشترك وينشئه عند أول استخدام.
+    Returns the shared client, creating it lazily (inside the running event loop) on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        try:
+            _client = httpx.AsyncClient(
+                http2=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, follow_redirects=True
+            )
+            logger.info("Shared HTTP/2 client created.")
+        except ImportError:
+            # httpx raises ImportError when http2=True but the 'h2' package is missing
+            logger.warning("'h2' not installed (pip install httpx[http2]). Shared client falls back to HTTP/1.1.")
+            _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, follow_redirects=True)
+    return _client
+
+
+async def close_http_client():
+    """Closes the shared client (call on bot shutdown). A later call to get_http_client() reopens it."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Shared HTTP client closed.")
+    _client = None
+
+
+def close_on_stop(bot):
+    """
+    يغلق العميل المشترك عند إيقاف البوت.
+    Wraps `bot.stop()` so the pooled connections are closed before the bot shuts down.
+    The plugin loader has no stop hook, so every plugin that uses this module calls it
+    with `app`; repeated calls wrap only once.
+    """
+    if bot is None or getattr(bot, "_http_client_stop_hooked", False):
+        return
+    original_stop = bot.stop
+
+    async def stop(*args, **kwargs):
+        try:
+            await close_http_client()
+        except Exception as e:
+            logger.warning(f"Closing the shared HTTP client failed: {e}")
+        return await original_stop(*args, **kwargs)
+
+    bot.stop = stop
+    bot._http_client_stop_hooked = True
+
+
+def _get_host_semaphore(host: str) -> asyncio.Semaphore:
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _host_semaphores[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return semaphore
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), RETRY_BACKOFF_MAX)
+    return min(RETRY_BACKOFF_BASE * (2 ** attempt), RETRY_BACKOFF_MAX)
+
+
+async def request_with_retry(method: str, url: str, *, retries: int = RETRY_ATTEMPTS, **kwargs) -> httpx.Response:
+    """
+    يرسل طلباً عبر العميل المشترك مع إعادة المحاولة بتأخير متزايد.
+    Sends a request through the shared client, retrying transport errors and
+    retryable status codes (429/5xx) with exponential backoff. Honours Retry-After.
+
+    Returns the final response (callers still call `raise_for_status()`);
+    raises the last `httpx.RequestError` if every attempt failed at transport level.
+    """
+    client = get_http_client()
+    semaphore = _get_host_semaphore(httpx.URL(url).host)
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt >= retries:
+                raise
+            delay = _retry_delay(attempt)
+            logger.warning(f"{method} {url} failed ({type(e).__name__}), retry {attempt + 1}/{retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+            delay = _retry_delay(attempt, response)
+            logger.warning(f"{method} {url} returned {response.status_code}, retry {attempt + 1}/{retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        return response
+
+
+async def get_with_retry(url: str, **kwargs) -> httpx.Response:
+    """Shortcut for `request_with_retry("GET", url, ...)`."""
+    return await request_with_retry("GET", url, **kwargs)
@@ -2,9 +2,10 @@
 
 import os
 import re
+import asyncio
 import logging
 import uuid
-import requests
+import httpx
 
 # Pyrogram imports
 from pyrogram import filters
@@ -28,6 +29,17 @@ except ImportError:
     # For this example, we'll let it potentially fail later if app is not available.
     app = None # Or some dummy object if needed for structure validation
 
+# --- العميل المشترك لطلبات HTTP ---
+try:
+    from .http_client import get_with_retry, close_on_stop
+    from .file_id_cache import STALE_FILE_ID_ERRORS, forget_file_id, get_cached_media, remember_sent_media
+    from .flood_control import edit_scheduler
+except ImportError:
+    from http_client import get_with_retry, close_on_stop
+    from file_id_cache import STALE_FILE_ID_ERRORS, forget_file_id, get_cached_media, remember_sent_media
+    from flood_control import edit_scheduler
+close_on_stop(app) # Close the shared HTTP client's pooled connections when the bot stops
+
 # --- Logging Configuration ---
 logging.basicConfig(
     level=logging.INFO,
@@ -57,10 +69,11 @@ else:
 
 # --- Upscale Function using Cloudinary ---
 
-def upscale_image_cloudinary(image_bytes: bytes) -> bytes | None:
+async def upscale_image_cloudinary(image_bytes: bytes) -> bytes | None:
     """
     يرفع الصورة إلى Cloudinary، ينشئ رابطًا للنسخة المحسنة،
     يقوم بتنزيلها، ثم يعيد بايتات الصورة المحسنة.
+    الرفع (مكتبة cloudinary المتزامنة) يتم في خيط منفصل، والتنزيل عبر العميل المشترك.
 
     Args:
         image_bytes: بايتات الصورة الأصلية.
@@ -80,7 +93,8 @@ def upscale_image_cloudinary(image_bytes: bytes) -> bytes | None:
     upload_result = None
     try:
         # 1. رفع الصورة مباشرة من البايتات
-        upload_result = cloudinary.uploader.upload(
+        upload_result = await asyncio.to_thread(
+            cloudinary.uploader.upload,
             image_bytes,
             public_id=temp_public_id,
             resource_type="image",
@@ -106,7 +120,7 @@ def upscale_image_cloudinary(image_bytes: bytes) -> bytes | None:
         # 3. تنزيل الصورة المحسنة من الرابط
         logger.info(f"Downloading upscaled image from {upscaled_url}...")
         try:
-            image_response = requests.get(upscaled_url, timeout=90) # مهلة أطول للملفات الكبيرة
+            image_response = await get_with_retry(upscaled_url, timeout=90.0) # مهلة أطول للملفات الكبيرة
             image_response.raise_for_status()
             upscaled_bytes = image_response.content
 
@@ -117,7 +131,7 @@ def upscale_image_cloudinary(image_bytes: bytes) -> bytes | None:
             logger.info(f"Successfully downloaded {len(upscaled_bytes)} bytes of the upscaled image.")
             return upscaled_bytes
 
-        except requests.exceptions.RequestException as download_err:
+        except httpx.HTTPError as download_err:
             logger.error(f"Failed to download upscaled image from Cloudinary URL: {download_err}", exc_info=True)
             return None # فشل التنزيل
 
@@ -165,10 +179,28 @@ if app:
         status_message = None # رسالة الحالة التي يتم تحديثها
         photo_path = None     # مسار الصورة الأصلية المؤقتة بعد التنزيل
         output_path = f'upscaled_output_{uuid.uuid4()}.png' # اسم ملف مؤقت فريد للنتيجة
+        caption_text = " تم تحسين الصورة بواسطة دعوة\n☁️   "
+        # نفس الصورة (file_unique_id) تعطي نفس النتيجة، فنعيد إرسال الملف المرفوع سابقاً
+        content_key = f"upscale:{message.reply_to_message.photo.file_unique_id}"
 
         try:
             user_id = message.from_user.id
             logger.info(f"Upscale request initiated by user {user_id}.")
+            # --- 0. إعادة استخدام نتيجة سابقة لنفس الصورة (بدون تنزيل أو تحسين أو رفع) ---
+            cached_media = get_cached_media(content_key)
+            if cached_media:
+                media_type, file_id = cached_media
+                try:
+                    if media_type == "photo":
+                        await message.reply_photo(photo=file_id, caption=caption_text)
+                    else:
+                        await message.reply_document(document=file_id, caption=caption_text)
+                    logger.info(f"Re-sent cached upscaled image ({media_type}) for {content_key}.")
+                    return
+                except STALE_FILE_ID_ERRORS as stale_err:
+                    logger.warning(f"Cached upscaled file_id is no longer valid ({stale_err}); processing again.")
+                    forget_file_id(content_key)
+
             status_message = await message.reply_text("⏳ جارٍ تحضير الصورة...")
 
             # --- 1. تنزيل الصورة الأصلية ---
@@ -180,7 +212,7 @@ if app:
                     os.makedirs(download_dir)
                 except OSError as dir_err:
                      logger.error(f"Failed to create download directory {download_dir}: {dir_err}")
-                     await status_message.edit("حدث خطأ في إعداد مجلد التنزيل.")
+                     await edit_scheduler.finish_message(status_message, "حدث خطأ في إعداد مجلد التنزيل.")
                      return
 
             # استخدام معرف فريد للملف المحمل لتجنب التضارب
@@ -191,7 +223,7 @@ if app:
             )
             if not photo_path or not os.path.exists(photo_path):
                  logger.error("Failed to download photo from Telegram.")
-                 await status_message.edit("حدث فشل أثناء تنزيل الصورة من تيليجرام.")
+                 await edit_scheduler.finish_message(status_message, "حدث فشل أثناء تنزيل الصورة من تيليجرام.")
                  return
             logger.info(f"Photo downloaded to: {photo_path}")
 
@@ -202,18 +234,18 @@ if app:
             logger.info(f"Original image size: {len(image_bytes)} bytes.")
 
             # --- 3. استدعاء دالة التحسين (باستخدام Cloudinary) ---
-            await status_message.edit("☁️ جارٍ التحسين...")
+            edit_scheduler.update_message(status_message, "☁️ جارٍ التحسين...")
             logger.info("Calling upscale_image_cloudinary function...")
-            upscaled_image_bytes = upscale_image_cloudinary(image_bytes)
+            upscaled_image_bytes = await upscale_image_cloudinary(image_bytes)
 
             # --- 4. التحقق من نتيجة التحسين ---
             if not upscaled_image_bytes:
                 logger.error("Upscaling failed (upscale_image_cloudinary returned None).")
-                await status_message.edit("حدث فشل أثناء عملية التحسين باستخدام دعوة. قد تكون الخدمة غير متاحة أو أن الصورة غير مدعومة.")
+                await edit_scheduler.finish_message(status_message, "حدث فشل أثناء عملية التحسين باستخدام دعوة. قد تكون الخدمة غير متاحة أو أن الصورة غير مدعومة.")
                 # التنظيف سيتم في finally
                 return
             logger.info(f"Upscaling successful. Received {len(upscaled_image_bytes)} bytes.")
-            await status_message.edit("💾 جارٍ حفظ الصورة المحسّنة مؤقتًا...")
+            edit_scheduler.update_message(status_message, "💾 جارٍ حفظ الصورة المحسّنة مؤقتًا...")
 
             # --- 5. كتابة الملف الناتج مؤقتًا ---
             logger.info(f"Writing upscaled image to temporary file: {output_path}...")
@@ -222,31 +254,33 @@ if app:
             logger.info(f"Finished writing output file: {output_path}")
 
             # --- 6. إرسال النتيجة إلى المستخدم ---
-            await status_message.edit("📤 جارٍ إرسال الصورة المحسّنة...")
+            edit_scheduler.update_message(status_message, "📤 جارٍ إرسال الصورة المحسّنة...")
             send_success = False
-            caption_text = " تم تحسين الصورة بواسطة دعوة\n☁️   "
             try:
                 logger.info("Attempting to send as photo...")
-                await message.reply_photo(photo=output_path, caption=caption_text)
+                sent_message = await message.reply_photo(photo=output_path, caption=caption_text)
+                remember_sent_media(content_key, sent_message)
                 logger.info("Successfully sent as photo.")
                 send_success = True
             except PhotoInvalidDimensions:
                 logger.warning("Sending as photo failed (Invalid Dimensions). Attempting to send as document.")
-                await status_message.edit("⚠️ أبعاد الصورة غير مدعومة كصورة، جارٍ الإرسال كملف...")
+                edit_scheduler.update_message(status_message, "⚠️ أبعاد الصورة غير مدعومة كصورة، جارٍ الإرسال كملف...")
                 try:
-                    await message.reply_document(document=output_path, caption=caption_text)
+                    sent_message = await message.reply_document(document=output_path, caption=caption_text)
+                    remember_sent_media(content_key, sent_message)
                     logger.info("Successfully sent as document.")
                     send_success = True
                 except Exception as doc_err:
                     logger.error(f"Failed to send as document: {doc_err}", exc_info=True)
-                    await status_message.edit(f"حدث فشل أثناء إرسال الملف: `{doc_err}`")
+                    await edit_scheduler.finish_message(status_message, f"حدث فشل أثناء إرسال الملف: `{doc_err}`")
             except Exception as send_err:
                 logger.error(f"Failed to send photo (other error): {send_err}", exc_info=True)
-                await status_message.edit(f"حدث فشل أثناء إرسال الصورة: `{send_err}`")
+                await edit_scheduler.finish_message(status_message, f"حدث فشل أثناء إرسال الصورة: `{send_err}`")
 
             # --- 7. حذف رسالة الحالة عند النجاح التام ---
             if send_success and status_message:
                 try:
+                    edit_scheduler.forget(status_message.chat.id, status_message.id) # A queued stage line must not outlive the message
                     await status_message.delete()
                     status_message = None # للإشارة إلى أنه تم حذفه
                     logger.info("Status message deleted after successful send.")
@@ -259,7 +293,7 @@ if app:
             logger.error(f"An unexpected error occurred in upscale_reply_image for user {user_id}: {e}", exc_info=True)
             if status_message:
                 try:
-                    await status_message.edit(f"حدث خطأ غير متوقع أثناء المعالجة ⚠️. تم تسجيل التفاصيل.")
+                    await edit_scheduler.finish_message(status_message, f"حدث خطأ غير متوقع أثناء المعالجة ⚠️. تم تسجيل التفاصيل.")
                 except Exception as edit_err:
                      logger.error(f"Failed to edit status message with final error: {edit_err}")
 
@@ -285,6 +319,7 @@ if app:
             if status_message:
                  logger.warning("Status message might still exist. Attempting final delete.")
                  try:
+                     edit_scheduler.forget(status_message.chat.id, status_message.id)
                      await status_message.delete()
                      logger.info("Final status message deleted during cleanup.")
                  except Exception as final_del_err:
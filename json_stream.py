@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+قراءة ملفات JSON الكبيرة عنصراً عنصراً بدلاً من تحميلها كاملة في الذاكرة.
+Streaming reader for the large JSON corpora (fatwas.json, the hadith dump, Quran.json).
+
+`iter_json_array(path)` yields the items of a top-level JSON array one at a time,
+so ingestion never holds the raw file text or the full decoded list in memory.
+It uses `ijson` when installed and a pure-stdlib incremental decoder otherwise.
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import itertools
+import json
+import logging
+from typing import Any, Iterable, Iterator, List
+
+try:
+    import ijson # Optional: C-backed streaming parser (pip install ijson)
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات ---
+STREAM_READ_SIZE = 64 * 1024 # Characters read from the file per step (stdlib path)
+DEFAULT_BATCH_SIZE = 1000
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+def _first_significant_char(f) -> str:
+    """Returns the first non-whitespace character of the file ('' if empty), then rewinds."""
+    while True:
+        chunk = f.read(STREAM_READ_SIZE)
+        if not chunk:
+            char = ""
+            break
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode("utf-8", errors="ignore") # Only the first character matters here
+        stripped = chunk.lstrip(_WHITESPACE + "\ufeff")
+        if stripped:
+            char = stripped[0]
+            break
+    f.seek(0)
+    return char
+
+
+def _iter_array_stdlib(f, read_size: int) -> Iterator[Any]:
+    """Incremental decoder for a top-level array using json.JSONDecoder.raw_decode on a sliding buffer."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk # Drop everything already consumed
+        pos = 0
+        return True
+
+    def skip_whitespace() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ""
+
+    fill()
+    if buffer.startswith("\ufeff"):
+        pos = 1
+    if skip_whitespace() != "[":
+        raise ValueError("JSON content is not a list (expected a top-level array).")
+    pos += 1
+    if skip_whitespace() == "]":
+        return
+
+    while True:
+        if not skip_whitespace():
+            raise json.JSONDecodeError("Unexpected end of file inside array", buffer, pos)
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or not fill(): # Value is cut at the buffer edge: read more and retry
+                    raise
+                continue
+            # A number cut at the buffer edge ("12" of "12.5e3") decodes fine but short:
+            # keep reading until something that can't be part of it follows
+            if isinstance(item, (int, float)) and not eof and not buffer[end:].lstrip(_NUMBER_CHARS) and fill():
+                continue
+            break
+        pos = end
+        yield item
+
+        separator = skip_whitespace()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise json.JSONDecodeError("Expected ',' or ']' after array item", buffer, max(pos - 1, 0))
+
+
+def iter_json_array(path: str, read_size: int = STREAM_READ_SIZE) -> Iterator[Any]:
+    """
+    يعيد عناصر مصفوفة JSON واحداً تلو الآخر.
+    Yields the items of the top-level array in `path`. An empty file yields nothing.
+    Raises ValueError (json.JSONDecodeError / ijson.JSONError) on malformed JSON or
+    when the top-level value is not an array; items before the error were already yielded.
+    """
+    if ijson is not None:
+        with open(path, "rb") as f:
+            first = _first_significant_char(f)
+            if not first:
+                return
+            if first != "[":
+                raise ValueError("JSON content is not a list (expected a top-level array).")
+            yield from ijson.items(f, "item", use_float=True)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        first = _first_significant_char(f)
+        if not first:
+            return
+        yield from _iter_array_stdlib(f, read_size)
+
+
+def iter_batches(items: Iterable[Any], size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Any]]:
+    """Groups an iterable into lists of at most `size` items (for executemany and friends)."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -28,6 +28,11 @@ from pyrogram.types import (
     Message, User, Chat, ChatMemberUpdated, ChatPrivileges, ChatPermissions, ChatMember
 )
 
+try:
+    from .flood_control import TokenBucket, edit_scheduler, MAX_FLOOD_WAIT_SECONDS
+except ImportError:
+    from flood_control import TokenBucket, edit_scheduler, MAX_FLOOD_WAIT_SECONDS
+
 app: Client | None = None
 try:
     from YukkiMusic import app as yukki_app
@@ -49,7 +54,14 @@ STATS_DB_V2 = "group_stats_v2.db"
 
 DELETE_CMD_LIMIT = 3
 DELETE_CMD_WINDOW_SECONDS = 3600
-MAX_DELETE_COUNT = 200
+MAX_DELETE_COUNT = 5000
+DELETE_CHUNK_SIZE = 100 # Telegram accepts at most 100 IDs per delete_messages call
+PURGE_CONCURRENCY = 3 # delete_messages calls in flight
+PURGE_RATE = 3.0 # Chunks per second (halved on FloodWait, grows back on success)
+PURGE_MAX_SCAN_FACTOR = 3 # Range purge scans at most count * factor IDs (gaps: deleted/service/too old)
+PURGE_MAX_EMPTY_ROUNDS = 3 # Stop after this many rounds that deleted nothing (older than the bot may delete)
+PURGE_PROGRESS_INTERVAL_SECONDS = 4
+PURGE_MAX_FLOOD_RETRIES = 3 # FloodWaits per chunk before the purge gives up (like SendLimiter / EditScheduler)
 DEFAULT_KICK_THRESHOLD = 3
 DEFAULT_MUTE_DAYS = 3
 WEEK_START_DAY = 0
@@ -884,6 +896,77 @@ async def unlock_chat_command(client: Client, message: Message):
         log.exception(f"Error deactivating delete lock in {chat_id}: {e}")
         await message.reply_text(f"❌ حدث خطأ أثناء إلغاء تفعيل قفل الحذف: {str(e)}")
 
+async def delete_message_chunk(client: Client, chat_id: int, message_ids: list, bucket: TokenBucket) -> int:
+    """Deletes up to DELETE_CHUNK_SIZE IDs in the bucket's next slot; FloodWait pauses the bucket and retries (up to PURGE_MAX_FLOOD_RETRIES)."""
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            deleted = await client.delete_messages(chat_id, message_ids, revoke=True)
+            bucket.on_success()
+            return deleted if isinstance(deleted, int) else len(message_ids)
+        except FloodWait as e:
+            wait_seconds = float(e.value or 1)
+            attempt += 1
+            if attempt > PURGE_MAX_FLOOD_RETRIES or wait_seconds > MAX_FLOOD_WAIT_SECONDS:
+                log.warning(f"FloodWait {wait_seconds}s purging chat {chat_id}; giving up after {attempt} attempt(s).")
+                raise
+            if time.monotonic() >= bucket.paused_until: # Concurrent chunks hit the same FloodWait: one decrease per pause
+                log.warning(f"FloodWait {wait_seconds}s purging chat {chat_id}; retrying chunk of {len(message_ids)}.")
+                bucket.on_flood_wait(wait_seconds)
+        except MessageIdsEmpty:
+            return 0 # None of these IDs exist any more
+
+async def purge_message_range(client: Client, chat_id: int, below_id: int, count: int, on_progress=None) -> int:
+    """
+    Deletes up to `count` messages with IDs below `below_id` without reading history:
+    supergroup message IDs are sequential per chat, so the IDs are computed and deleted
+    downwards in DELETE_CHUNK_SIZE chunks, PURGE_CONCURRENCY at a time. Each round only
+    issues as many IDs as are still needed, so gaps (deleted/service messages) are made up
+    for by the next round and the count is never overshot. Returns the number deleted.
+    """
+    bucket = TokenBucket(PURGE_RATE, capacity=PURGE_CONCURRENCY, max_rate=PURGE_RATE * 2, increase_step=0.1)
+    deleted_total = 0; next_id = below_id - 1; lowest_id = max(1, below_id - count * PURGE_MAX_SCAN_FACTOR); empty_rounds = 0
+    while deleted_total < count and next_id >= lowest_id and empty_rounds < PURGE_MAX_EMPTY_ROUNDS:
+        chunks = []; needed = count - deleted_total
+        while needed > 0 and len(chunks) < PURGE_CONCURRENCY and next_id >= lowest_id:
+            size = min(DELETE_CHUNK_SIZE, needed, next_id - lowest_id + 1)
+            chunks.append(list(range(next_id, next_id - size, -1)))
+            next_id -= size; needed -= size
+        tasks = [asyncio.create_task(delete_message_chunk(client, chat_id, chunk, bucket)) for chunk in chunks]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks: task.cancel() # No orphaned deletes after an error or cancellation
+            raise
+        round_deleted = sum(results); deleted_total += round_deleted
+        empty_rounds = 0 if round_deleted else empty_rounds + 1
+        if on_progress: await on_progress(deleted_total, count)
+    return deleted_total
+
+async def purge_from_history(client: Client, chat_id: int, below_id: int, count: int, on_progress=None) -> int:
+    """Basic groups (IDs not sequential per chat): streams history and deletes every full chunk as it arrives."""
+    bucket = TokenBucket(PURGE_RATE, capacity=PURGE_CONCURRENCY, max_rate=PURGE_RATE * 2, increase_step=0.1)
+    deleted_total = 0; chunk = []; pending = set()
+    async def flush(ids):
+        nonlocal deleted_total
+        deleted_total += await delete_message_chunk(client, chat_id, ids, bucket)
+        if on_progress: await on_progress(deleted_total, count)
+    try:
+        async for msg in client.get_chat_history(chat_id, limit=count, offset_id=below_id):
+            chunk.append(msg.id)
+            if len(chunk) == DELETE_CHUNK_SIZE:
+                if len(pending) >= PURGE_CONCURRENCY:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done: task.result() # A failed chunk stops the purge instead of being dropped silently
+                pending.add(asyncio.create_task(flush(chunk))); chunk = []
+        if chunk: pending.add(asyncio.create_task(flush(chunk)))
+        if pending: await asyncio.gather(*pending)
+    except BaseException:
+        for task in pending: task.cancel() # No orphaned deletes after an error or cancellation
+        raise
+    return deleted_total
+
 @app.on_message(filters.command(["حذف", "مسح"], prefixes=[""]) & filters.group, group=1)
 async def delete_messages_command(client: Client, message: Message):
     chat_id = message.chat.id; user_id = message.from_user.id; user_mention = message.from_user.mention(style="html")
@@ -914,21 +997,34 @@ async def delete_messages_command(client: Client, message: Message):
     if message.reply_to_message: target_message_id = message.reply_to_message.id; ids_to_delete_additionally.append(target_message_id); log.info(f"Delete command is a reply to message {target_message_id}. Deleting {count} messages before it.")
     else: log.info(f"Delete command is not a reply. Deleting {count} messages before {message.id}.")
 
-    message_ids_to_delete = []
-    try:
-        if count > 0 and target_message_id != message.id: # Only fetch history if count > 0 and it's not just deleting the command itself
-             async for msg in client.get_chat_history(chat_id, limit=count, offset_id=target_message_id, reverse=False): message_ids_to_delete.append(msg.id)
-
-        message_ids_to_delete.extend(ids_to_delete_additionally); message_ids_to_delete = list(set(message_ids_to_delete))
-
-        if original_count == 1 and not message.reply_to_message: message_ids_to_delete = [message.id]
-        elif original_count == 1 and message.reply_to_message: message_ids_to_delete = list(set([message.id, message.reply_to_message.id]))
-
-        deleted_count = 0
-        if message_ids_to_delete: deleted_count = await client.delete_messages(chat_id, message_ids_to_delete, revoke=True)
-        else: return await message.reply_text("لم أجد رسائل للحذف.")
+    status_msg = None; last_progress_at = 0.0
+    async def report_progress(done: int, total: int):
+        nonlocal status_msg, last_progress_at
+        now = time.monotonic()
+        if now - last_progress_at < PURGE_PROGRESS_INTERVAL_SECONDS: return # Throttled edits
+        last_progress_at = now
+        text = f"🗑️ جارِ الحذف... <b>{done}</b> / {total}"
+        try:
+            if status_msg is None: status_msg = await message.reply_text(text, parse_mode=ParseMode.HTML)
+            else: edit_scheduler.update_message(status_msg, text, parse_mode=ParseMode.HTML) # Shared edit budget, latest count wins
+        except FloodWait: pass # Progress is optional; never stall the purge for it
+        except Exception as e: log.warning(f"Could not update purge progress in chat {chat_id}: {e}")
 
-        conf_msg = await message.reply_text(f"🗑️ تم حذف <b>{deleted_count}</b> من الرسائل بنجاح.", parse_mode=ParseMode.HTML); await asyncio.sleep(5); await conf_msg.delete()
+    try:
+        deleted_count = await client.delete_messages(chat_id, list(set(ids_to_delete_additionally)), revoke=True) or 0
+        if is_multi_delete:
+            last_progress_at = time.monotonic() # First progress message only once the purge takes a while
+            if message.chat.type == ChatType.SUPERGROUP:
+                deleted_count += await purge_message_range(client, chat_id, target_message_id, count, report_progress)
+            else:
+                deleted_count += await purge_from_history(client, chat_id, target_message_id, count, report_progress)
+        if not deleted_count: return await message.reply_text("لم أجد رسائل للحذف.")
+
+        done_text = f"🗑️ تم حذف <b>{deleted_count}</b> من الرسائل بنجاح."
+        if original_count > MAX_DELETE_COUNT: done_text += f"\n(الحد الأقصى في المرة الواحدة {MAX_DELETE_COUNT})"
+        if status_msg: conf_msg = status_msg; await edit_scheduler.finish_message(conf_msg, done_text, parse_mode=ParseMode.HTML)
+        else: conf_msg = await message.reply_text(done_text, parse_mode=ParseMode.HTML)
+        await asyncio.sleep(5); await conf_msg.delete()
         if deleted_count > 0: await log_admin_action(client, f"🗑️ حذف رسائل ({deleted_count})", message.from_user, None, message.chat)
     except MessageDeleteForbidden: await message.reply_text("⚠️ ليس لدي صلاحية حذف الرسائل هنا.")
     except MessageIdsEmpty: await message.reply_text("⚠️ لم يتم تحديد رسائل صالحة للحذف.")
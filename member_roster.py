@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+سجل أعضاء مخزن لكل دردشة، يُحدَّث تدريجياً بدل إعادة جلب قائمة الأعضاء في كل أمر.
+Per-chat member roster shared by the tagging and bulk admin commands.
+
+Each chat keeps a sorted `array('q')` of user IDs with a parallel `bytearray` of
+status flags (bot, deleted, admin, owner, banned, restricted) and a list of first
+names. Plugins feed it from events they already handle (messages, ChatMemberUpdated)
+and after their own admin actions; a full `get_chat_members` resync (members, banned
+and restricted lists) only happens every ROSTER_RESYNC_SECONDS, and the small admin
+list every ADMIN_RESYNC_SECONDS.
+This module registers no handlers; it is safe for the plugin loader to import it.
+"""
+import asyncio
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pyrogram.enums import ChatMembersFilter, ChatMemberStatus
+from pyrogram.errors import ChatAdminRequired
+
+logger = logging.getLogger(__name__)
+
+# --- الإعدادات ---
+ROSTER_RESYNC_SECONDS = 6 * 3600 # Full member list (and banned list) re-paged at most this often
+ADMIN_RESYNC_SECONDS = 600 # Admin list is one short page, refreshed more often
+
+# --- أعلام الحالة (بايت واحد لكل عضو) ---
+FLAG_BOT = 1
+FLAG_DELETED = 2
+FLAG_ADMIN = 4
+FLAG_OWNER = 8
+FLAG_BANNED = 16
+FLAG_RESTRICTED = 32
+STATUS_FLAGS = FLAG_ADMIN | FLAG_OWNER | FLAG_BANNED | FLAG_RESTRICTED # Replaced on every status change
+NOT_TAGGABLE = FLAG_BOT | FLAG_DELETED | FLAG_BANNED
+
+
+class ChatRoster:
+    """
+    أعضاء دردشة واحدة: معرفات مرتبة في مصفوفة + بايت أعلام + الاسم الأول.
+    Sorted array of member IDs with parallel flags/names; lookups are a bisect.
+    """
+    __slots__ = ("chat_id", "ids", "flags", "names", "synced_at", "admins_synced_at")
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.ids = array("q")
+        self.flags = bytearray()
+        self.names: List[str] = []
+        self.synced_at = 0.0
+        self.admins_synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _find(self, user_id: int) -> Tuple[int, bool]:
+        index = bisect_left(self.ids, user_id)
+        return index, index < len(self.ids) and self.ids[index] == user_id
+
+    def get_flags(self, user_id: int) -> Optional[int]:
+        index, found = self._find(user_id)
+        return self.flags[index] if found else None
+
+    def upsert(self, user_id: int, flags: int, first_name: Optional[str] = None):
+        index, found = self._find(user_id)
+        if found:
+            self.flags[index] = flags
+            if first_name is not None:
+                self.names[index] = first_name
+        else:
+            self.ids.insert(index, user_id)
+            self.flags.insert(index, flags)
+            self.names.insert(index, first_name or "")
+
+    def set_status(self, user_id: int, status_flags: int):
+        """Replaces the status bits of a known member (bot/deleted bits are kept)."""
+        index, found = self._find(user_id)
+        if found:
+            self.flags[index] = (self.flags[index] & ~STATUS_FLAGS) | status_flags
+
+    def remove(self, user_id: int):
+        index, found = self._find(user_id)
+        if found:
+            del self.ids[index]
+            del self.flags[index]
+            del self.names[index]
+
+    def iter_members(self, include: int = 0, exclude: int = 0) -> Iterator[Tuple[int, str, int]]:
+        """Yields (user_id, first_name, flags) for members having all `include` bits and no `exclude` bits."""
+        ids, flags, names = self.ids, self.flags, self.names
+        for index in range(len(ids)):
+            member_flags = flags[index]
+            if member_flags & include == include and not member_flags & exclude:
+                yield ids[index], names[index], member_flags
+
+    def count(self, include: int = 0, exclude: int = 0) -> int:
+        return sum(1 for _ in self.iter_members(include, exclude))
+
+
+_rosters: Dict[int, ChatRoster] = {}
+_sync_locks: Dict[int, asyncio.Lock] = {}
+
+
+def _get_or_create(chat_id: int) -> ChatRoster:
+    roster = _rosters.get(chat_id)
+    if roster is None:
+        roster = _rosters[chat_id] = ChatRoster(chat_id)
+    return roster
+
+
+def _get_sync_lock(chat_id: int) -> asyncio.Lock:
+    lock = _sync_locks.get(chat_id)
+    if lock is None:
+        lock = _sync_locks[chat_id] = asyncio.Lock()
+    return lock
+
+
+def _status_flags(status) -> int:
+    if status == ChatMemberStatus.OWNER:
+        return FLAG_OWNER | FLAG_ADMIN
+    if status == ChatMemberStatus.ADMINISTRATOR:
+        return FLAG_ADMIN
+    if status == ChatMemberStatus.BANNED:
+        return FLAG_BANNED
+    if status == ChatMemberStatus.RESTRICTED:
+        return FLAG_RESTRICTED
+    return 0
+
+
+def _user_flags(user) -> int:
+    return (FLAG_BOT if user.is_bot else 0) | (FLAG_DELETED if user.is_deleted else 0)
+
+
+def note_member(chat_id: int, member):
+    """Records a ChatMember (from get_chat_members, get_chat_member or an update)."""
+    user = getattr(member, "user", None)
+    if user is None:
+        return
+    roster = _get_or_create(chat_id)
+    if member.status == ChatMemberStatus.LEFT:
+        roster.remove(user.id)
+    else:
+        roster.upsert(user.id, _user_flags(user) | _status_flags(member.status), user.first_name or "")
+
+
+def note_user(chat_id: int, user):
+    """
+    Records a user seen sending a message (cheap: a bisect, no RPC). Only chats that
+    already have a roster are updated; status bits of known members are left alone.
+    """
+    roster = _rosters.get(chat_id)
+    if roster is None or user is None:
+        return
+    index, found = roster._find(user.id)
+    if found:
+        roster.names[index] = user.first_name or ""
+    else:
+        roster.upsert(user.id, _user_flags(user), user.first_name or "")
+
+
+def apply_member_update(update):
+    """Applies a ChatMemberUpdated event (join, leave, ban, restrict, promote ...)."""
+    if update.new_chat_member:
+        note_member(update.chat.id, update.new_chat_member)
+    elif update.old_chat_member and update.old_chat_member.user: # No new member: the user left
+        roster = _rosters.get(update.chat.id)
+        if roster is not None:
+            roster.remove(update.old_chat_member.user.id)
+
+
+def set_member_status(chat_id: int, user_id: int, status_flags: int):
+    """Call after the bot itself changed a member (unban, unrestrict, promote ...)."""
+    roster = _rosters.get(chat_id)
+    if roster is not None:
+        roster.set_status(user_id, status_flags)
+
+
+def forget_member(chat_id: int, user_id: int):
+    roster = _rosters.get(chat_id)
+    if roster is not None:
+        roster.remove(user_id)
+
+
+async def _page_members(client, chat_id: int, roster: ChatRoster, member_filter=None) -> set:
+    seen = set()
+    kwargs = {"filter": member_filter} if member_filter is not None else {}
+    async for member in client.get_chat_members(chat_id, **kwargs):
+        if member.user is None:
+            continue
+        seen.add(member.user.id)
+        roster.upsert(member.user.id, _user_flags(member.user) | _status_flags(member.status), member.user.first_name or "")
+    return seen
+
+
+async def _sync_admins(client, chat_id: int, roster: ChatRoster):
+    admin_ids = await _page_members(client, chat_id, roster, ChatMembersFilter.ADMINISTRATORS)
+    for user_id, _, _ in list(roster.iter_members(include=FLAG_ADMIN)):
+        if user_id not in admin_ids: # Demoted since the last sync
+            roster.set_status(user_id, 0)
+    roster.admins_synced_at = time.monotonic()
+
+
+async def _full_sync(client, chat_id: int) -> ChatRoster:
+    """
+    Pages every member plus the banned and restricted lists into a fresh roster, then
+    swaps it in. The default member search stops at ~10k users and never returns
+    restricted users who left, so those lists are paged explicitly.
+    """
+    started = time.monotonic()
+    roster = ChatRoster(chat_id)
+    await _page_members(client, chat_id, roster)
+    for member_filter in (ChatMembersFilter.BANNED, ChatMembersFilter.RESTRICTED):
+        try:
+            await _page_members(client, chat_id, roster, member_filter)
+        except ChatAdminRequired: # Only admins can list these; the member list is still usable
+            logger.info(f"{member_filter} list of chat {chat_id} not readable (bot is not admin); skipped.")
+    roster.synced_at = roster.admins_synced_at = time.monotonic()
+    _rosters[chat_id] = roster
+    logger.info(f"Member roster for chat {chat_id} resynced: {len(roster)} entries in {roster.synced_at - started:.1f}s.")
+    return roster
+
+
+async def get_roster(client, chat_id: int, max_age: Optional[float] = None) -> ChatRoster:
+    """
+    يعيد سجل أعضاء الدردشة، مع مزامنة كاملة فقط عند انتهاء صلاحيته.
+    Returns the chat's roster. A full resync happens when the roster was never synced
+    or is older than `max_age` (default ROSTER_RESYNC_SECONDS); the admin flags are
+    refreshed separately every ADMIN_RESYNC_SECONDS. Concurrent callers share one sync.
+    May raise what get_chat_members raises (FloodWait, ChatAdminRequired ...).
+    """
+    max_age = ROSTER_RESYNC_SECONDS if max_age is None else max_age
+    async with _get_sync_lock(chat_id):
+        roster = _rosters.get(chat_id)
+        now = time.monotonic()
+        if roster is None or not roster.synced_at or now - roster.synced_at > max_age:
+            return await _full_sync(client, chat_id)
+        if not roster.admins_synced_at or now - roster.admins_synced_at > ADMIN_RESYNC_SECONDS:
+            await _sync_admins(client, chat_id, roster)
+        return roster
+
+
+async def get_admin_members(client, chat_id: int, exclude: int = 0) -> List[Tuple[int, str, int]]:
+    """
+    Admins (owner included) as (user_id, first_name, flags), refreshing only the admin
+    page when stale - never a full member resync. `exclude` drops admins with those
+    flags (e.g. FLAG_BOT | FLAG_DELETED).
+    """
+    roster = _rosters.get(chat_id)
+    if roster is None or not roster.admins_synced_at or time.monotonic() - roster.admins_synced_at > ADMIN_RESYNC_SECONDS:
+        async with _get_sync_lock(chat_id):
+            roster = _get_or_create(chat_id) # A full sync may have swapped it while we waited
+            if not roster.admins_synced_at or time.monotonic() - roster.admins_synced_at > ADMIN_RESYNC_SECONDS: # 0.0 = never synced (monotonic may be small after boot)
+                await _sync_admins(client, chat_id, roster)
+    return list(roster.iter_members(include=FLAG_ADMIN, exclude=exclude))
+
+
+async def get_admin_ids(client, chat_id: int, exclude: int = 0) -> set:
+    return {user_id for user_id, _, _ in await get_admin_members(client, chat_id, exclude)}
+
+
+def roster_stats() -> Dict[str, int]:
+    """Number of chats, entries and approximate bytes held (IDs + flags)."""
+    entries = sum(len(r) for r in _rosters.values())
+    return {"chats": len(_rosters), "entries": entries, "id_flag_bytes": entries * 9}
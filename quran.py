@@ -1,15 +1,39 @@
-import httpx  # For making asynchronous HTTP requests
+import httpx  # HTTP error types (requests go through the shared client)
 import logging # Import the logging library
 import re # Import regex library for text matching
 import asyncio # Import asyncio for potential delays
+import io # In-memory buffers for prefetched audio
 import json # To load the Quran data file
 import os # To check if file exists
+import sqlite3 # Persistent Tafsir cache
+import time # TTL bookkeeping for the query cache
+from collections import OrderedDict # In-memory LRU caches
 from urllib.parse import quote # Import the correct function for URL encoding
 from pyrogram import Client, filters
 # Import necessary types for buttons and callbacks
 # استيراد الأنواع اللازمة للأزرار والاستجابات
 from pyrogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
+# --- العميل المشترك لطلبات HTTP وتنظيم معدل الإرسال ---
+try:
+    from .http_client import get_with_retry, close_on_stop
+    from .flood_control import send_limiter
+    from .file_id_cache import get_file_id, send_cached_media
+    from .json_stream import iter_json_array
+    from .arabic_text import normalize_arabic # Shared "search" profile (same folding as fatwa search)
+except ImportError:
+    from http_client import get_with_retry, close_on_stop
+    from flood_control import send_limiter
+    from file_id_cache import get_file_id, send_cached_media
+    from json_stream import iter_json_array
+    from arabic_text import normalize_arabic # Shared "search" profile (same folding as fatwa search)
+
+# --- Redis (اختياري) لمشاركة ذاكرة نتائج البحث ---
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
 # --- Import thefuzz library ---
 # --- استيراد مكتبة thefuzz ---
 try:
@@ -31,6 +55,7 @@ except ImportError:
     except ImportError:
          logging.critical("لم يتم العثور على متغير العميل 'app' في YukkiMusic أو YukkiMusic. الـ decorator لن يعمل!")
          app = None
+close_on_stop(app) # Close the shared HTTP client's pooled connections when the bot stops
 
 
 # --- إعدادات Logging ---
@@ -50,8 +75,7 @@ QURAN_JSON_PATH = "Quran.json" # Assume file is in the same directory
 quran_data = []
 try:
     if os.path.exists(QURAN_JSON_PATH):
-        with open(QURAN_JSON_PATH, 'r', encoding='utf-8') as f:
-            quran_data = json.load(f)
+        quran_data = list(iter_json_array(QURAN_JSON_PATH)) # Streamed: no raw-text copy of the file in memory
         log.info(f"Successfully loaded {len(quran_data)} verses from {QURAN_JSON_PATH}")
     else:
         log.error(f"Quran data file not found at: {QURAN_JSON_PATH}. Local search will be disabled.")
@@ -59,30 +83,44 @@ except Exception as e:
     log.exception(f"Error loading Quran data from {QURAN_JSON_PATH}. Local search disabled.")
     quran_data = [] # Ensure it's an empty list on error
 
-# --- دالة تطبيع النص العربي (شاملة جداً - تستخدم للبحث الداخلي) ---
-# --- Comprehensive Arabic Text Normalization Function (Used for internal search comparison) ---
-def normalize_arabic(text: str) -> str:
-    """Removes Arabic diacritics, Tatweel, common Quranic symbols, normalizes characters and spacing."""
-    if not text:
-        return ""
-    # Remove common diacritics/Tashkeel and Quranic marks/symbols
-    text = re.sub(r"[ًٌٍَُِّْ~۞ٰۚۖۗۦٓۡ۩ۘۥۧ]", "", text)
-    # Remove Tatweel/Kashida
-    text = re.sub(r"ـ", "", text)
-    # Normalize Alef forms to bare Alef
-    text = re.sub(r"[إأآٱ]", "ا", text)
-    # Normalize Alef Maqsura to Yeh
-    text = re.sub(r"ى", "ي", text)
-    # Normalize Waw with Hamza above to Waw
-    text = re.sub(r"ؤ", "و", text)
-    # Normalize Yeh with Hamza above to Yeh
-    text = re.sub(r"ئ", "ي", text)
-    # Normalize Teh Marbuta to Heh
-    text = re.sub(r"ة", "ه", text)
-    # Normalize spacing (replace multiple spaces with one and strip)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
+# --- جداول محلية لأسماء السور وروابط التلاوة ---
+# --- Local tables for Surah names and recitation audio URLs ---
+DEFAULT_RECITER = "ar.saoodshuraym"
+# alquran.cloud serves recitations from the islamic.network CDN, keyed by the global
+# ayah number (1..6236 = "id" in Quran.json), so every audio URL is deterministic.
+# تُخدم التلاوات من CDN ثابت برقم الآية العام، لذا يمكن بناء الرابط محلياً دون أي طلب.
+RECITER_AUDIO_TEMPLATES = {
+    "ar.saoodshuraym": "https://cdn.islamic.network/quran/audio/64/ar.saoodshuraym/{number}.mp3",
+    "ar.alafasy": "https://cdn.islamic.network/quran/audio/128/ar.alafasy/{number}.mp3",
+    "ar.abdurrahmaansudais": "https://cdn.islamic.network/quran/audio/192/ar.abdurrahmaansudais/{number}.mp3",
+    "ar.husary": "https://cdn.islamic.network/quran/audio/128/ar.husary/{number}.mp3",
+    "ar.minshawi": "https://cdn.islamic.network/quran/audio/128/ar.minshawi/{number}.mp3",
+    "ar.mahermuaiqly": "https://cdn.islamic.network/quran/audio/128/ar.mahermuaiqly/{number}.mp3",
+}
+surah_names = {} # {sura_no: "سورة ..."}
+verse_index = {} # {(sura_no, aya_no): ayah_obj}
+normalized_emlaey = {} # {(sura_no, aya_no): normalized aya_text_emlaey} - verses are normalized once, not per search
+
+def build_verse_tables(data: list) -> None:
+    """
+    تبني جداول البحث المحلية (أسماء السور وفهرس الآيات) مرة واحدة عند التحميل.
+    Builds the local lookup tables (Surah names and verse index) once at load time.
+    """
+    surah_names.clear()
+    verse_index.clear()
+    normalized_emlaey.clear()
+    for ayah_obj in data:
+        s_num = ayah_obj.get("sura_no")
+        a_num = ayah_obj.get("aya_no")
+        if s_num is None or a_num is None:
+            continue
+        verse_index[(s_num, a_num)] = ayah_obj
+        normalized_emlaey[(s_num, a_num)] = normalize_arabic(ayah_obj.get("aya_text_emlaey") or "")
+        if s_num not in surah_names and ayah_obj.get("sura_name_ar"):
+            surah_names[s_num] = f"سورة {ayah_obj['sura_name_ar']}"
+    log.info(f"Built local verse tables: {len(surah_names)} surahs, {len(verse_index)} verses.")
+
+build_verse_tables(quran_data)
 
 # --- دالة إنشاء المقتطف (تعرض النص الأصلي) ---
 # --- Snippet Creation Function (Displays original text) ---
@@ -167,7 +205,8 @@ async def search_ayah_local_json_fuzzy(keyword: str, data: list) -> list[dict] |
          # لا حاجة لتطبيع text_to_match إذا كان بالفعل إملائي بسيط
          # However, applying normalize_arabic ensures consistency if emlaey isn't perfect
          # ومع ذلك، فإن تطبيق normalize_arabic يضمن الاتساق إذا لم يكن emlaey مثاليًا
-         normalized_verse_emlaey = normalize_arabic(text_to_match)
+         # (computed once in build_verse_tables; قيمة محسوبة مسبقاً عند التحميل)
+         normalized_verse_emlaey = normalized_emlaey.get((ayah_obj.get('sura_no'), ayah_obj.get('aya_no'))) or normalize_arabic(text_to_match)
          score = fuzz.token_set_ratio(normalized_keyword, normalized_verse_emlaey)
 
          verse_key = f"{ayah_obj.get('sura_no')}:{ayah_obj.get('aya_no')}"
@@ -196,72 +235,331 @@ async def search_ayah_local_json_fuzzy(keyword: str, data: list) -> list[dict] |
     return final_results
 
 
-# --- دالة مساعدة لجلب تفاصيل الآية والصوت (لا تزال تستخدم alquran.cloud) ---
-async def get_ayah_details(surah_number: int, ayah_number: int) -> dict | None:
+# --- ذاكرة مؤقتة لنتائج البحث (LRU + TTL، مع Redis اختياري) ---
+# --- Search result cache: normalized query -> ranked verse keys (LRU + TTL, optional Redis) ---
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL_SECONDS = 3600 * 6
+USE_REDIS_QUERY_CACHE = True # Uses the same Redis instance as the Hadith plugin (chiaa.py)
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+REDIS_DB = 0
+REDIS_KEY_PREFIX = "quran_search:"
+REDIS_RETRY_AFTER_SECONDS = 60 # Skip Redis for this long after a failure
+
+_query_cache = OrderedDict() # {cache_key: (expires_at, [(verseKey, score), ...])}
+query_cache_stats = {"hits": 0, "redis_hits": 0, "misses": 0}
+_redis_client = None
+_redis_disabled = not (USE_REDIS_QUERY_CACHE and aioredis)
+_redis_retry_at = 0.0
+
+def make_query_cache_key(keyword: str) -> str:
     """
-    تجلب التفاصيل (بما في ذلك الصوت واسم السورة) لآية محددة باستخدام api.alquran.cloud.
-    Fetches details (including audio and Surah name) for a specific Ayah using api.alquran.cloud.
-    Note: We get the primary text from the local DB now.
-    ملاحظة: نحصل على النص الأساسي من قاعدة البيانات المحلية الآن.
+    token_set_ratio ignores word order and repeats, so the sorted set of normalized
+    tokens identifies the result exactly: "نور الله" and "الله  نور" share one entry.
     """
-    reciter = "ar.saoodshuraym"
-    # Fetch only audio and surah name if possible, or fetch reciter edition and extract
-    # جلب الصوت واسم السورة فقط إذا أمكن، أو جلب نسخة القارئ واستخلاصها
-    details_url = f"https://api.alquran.cloud/v1/surah/{surah_number}/editions/{reciter}"
-    log.info(f"Fetching details (audio/surah name) from alquran.cloud: {details_url}")
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(details_url)
-            response.raise_for_status()
-            data = response.json()
+    return " ".join(sorted(set(normalize_arabic(keyword).split())))
 
-        if data.get('code') == 200 and data.get('data'):
-            edition_data = data['data'][0] # Assuming reciter is the first element
-            surah_name = edition_data.get('name', f'سورة {surah_number}')
-            ayah_data = next((ayah for ayah in edition_data.get('ayahs', []) if ayah.get('numberInSurah') == ayah_number), None)
-
-            if ayah_data:
-                log.info(f"Audio/Surah Name Details found for {surah_number}:{ayah_number}")
-                return {
-                    "surahName": surah_name,
-                    "audioUrl": ayah_data.get('audio'),
-                    # "reciterVerseText": ayah_data.get('text') # We use local DB text now
-                }
-            else:
-                log.warning(f"Ayah {ayah_number} not found in reciter edition (alquran.cloud) for Surah {surah_number}")
-                # Still return Surah name if available
-                return {"surahName": surah_name, "audioUrl": None}
-        else:
-            log.warning(f"API Error when fetching details (alquran.cloud): {data.get('status')}")
-            return None
-    except httpx.HTTPStatusError as e:
-        log.exception(f"HTTP Status Error fetching details (alquran.cloud): {e.response.status_code} - {e.response.text}")
+def _get_redis():
+    global _redis_client, _redis_disabled
+    if _redis_disabled or time.monotonic() < _redis_retry_at:
         return None
-    except httpx.RequestError as e:
-        log.exception(f"HTTP Request Error fetching details (alquran.cloud)")
+    if _redis_client is None:
+        try:
+            _redis_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True, socket_connect_timeout=2)
+        except Exception as e:
+            log.warning(f"Redis unavailable for Quran query cache, using memory only. Error: {e}")
+            _redis_disabled = True
+    return _redis_client
+
+def _mark_redis_down(error: Exception):
+    global _redis_retry_at
+    log.warning(f"Redis error in Quran query cache, memory only for {REDIS_RETRY_AFTER_SECONDS}s. Error: {error}")
+    _redis_retry_at = time.monotonic() + REDIS_RETRY_AFTER_SECONDS
+
+def _hydrate_results(ranked: list) -> list[dict] | None:
+    """Rebuilds the search result dicts from cached (verseKey, score) pairs."""
+    results = []
+    for verse_key, score in ranked:
+        s_num, a_num = map(int, verse_key.split(':'))
+        ayah_obj = verse_index.get((s_num, a_num))
+        if ayah_obj:
+            results.append({"verseKey": verse_key, "original_text": ayah_obj.get("aya_text"), "score": score})
+    return results or None
+
+def get_query_cache_stats() -> dict:
+    """Returns a copy of the hit/miss counters plus the current memory cache size."""
+    stats = dict(query_cache_stats)
+    stats["size"] = len(_query_cache)
+    total = stats["hits"] + stats["redis_hits"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["hits"] + stats["redis_hits"]) / total, 3) if total else 0.0
+    return stats
+
+def _query_cache_put(cache_key: str, ranked: list, now: float):
+    _query_cache[cache_key] = (now + QUERY_CACHE_TTL_SECONDS, ranked)
+    _query_cache.move_to_end(cache_key)
+    while len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+
+async def search_ayah_cached(keyword: str) -> list[dict] | None:
+    """
+    تبحث عن الآيات مع استخدام الذاكرة المؤقتة للاستعلامات المتكررة.
+    Same contract as search_ayah_local_json_fuzzy, but served from the memory LRU
+    (then Redis) when the normalized query was seen within the TTL.
+    """
+    cache_key = make_query_cache_key(keyword)
+    if not cache_key:
         return None
+    now = time.monotonic()
+
+    entry = _query_cache.get(cache_key)
+    if entry and entry[0] > now:
+        _query_cache.move_to_end(cache_key)
+        query_cache_stats["hits"] += 1
+        return _hydrate_results(entry[1])
+    if entry:
+        del _query_cache[cache_key] # Expired
+
+    redis_conn = _get_redis()
+    if redis_conn:
+        try:
+            cached = await redis_conn.get(REDIS_KEY_PREFIX + cache_key)
+            if cached is not None:
+                ranked = [tuple(item) for item in json.loads(cached)]
+                _query_cache_put(cache_key, ranked, now)
+                query_cache_stats["redis_hits"] += 1
+                return _hydrate_results(ranked)
+        except Exception as e:
+            _mark_redis_down(e)
+            redis_conn = None
+
+    query_cache_stats["misses"] += 1
+    results = await search_ayah_local_json_fuzzy(keyword, quran_data)
+    if results is None and not (THEFUZZ_AVAILABLE and quran_data):
+        return None # Don't cache "search unavailable"
+
+    ranked = [(r["verseKey"], r["score"]) for r in results or []] # Empty list caches "no matches" too
+    _query_cache_put(cache_key, ranked, now)
+    if redis_conn:
+        try:
+            await redis_conn.set(REDIS_KEY_PREFIX + cache_key, json.dumps(ranked), ex=QUERY_CACHE_TTL_SECONDS)
+        except Exception as e:
+            _mark_redis_down(e)
+    return results
+
+
+# --- دالة مساعدة لجلب تفاصيل الآية والصوت (من الجداول المحلية، بدون شبكة) ---
+def get_ayah_details(surah_number: int, ayah_number: int, reciter: str = DEFAULT_RECITER) -> dict | None:
+    """
+    تعيد التفاصيل (رابط الصوت واسم السورة) لآية محددة من الجداول المحلية دون أي طلب شبكة.
+    Returns details (audio URL and Surah name) for a specific Ayah from the local tables, with no network round trip.
+    Note: We get the primary text from the local DB.
+    ملاحظة: نحصل على النص الأساسي من قاعدة البيانات المحلية.
+    """
+    ayah_obj = verse_index.get((surah_number, ayah_number))
+    if not ayah_obj:
+        log.warning(f"Ayah {surah_number}:{ayah_number} not found in local verse index.")
+        return None
+
+    audio_url = None
+    template = RECITER_AUDIO_TEMPLATES.get(reciter)
+    if template and ayah_obj.get("id"):
+        audio_url = template.format(number=ayah_obj["id"])
+    else:
+        log.warning(f"No audio URL template for reciter '{reciter}' (or missing ayah id) for {surah_number}:{ayah_number}")
+
+    return {
+        "surahName": surah_names.get(surah_number, f"سورة {surah_number}"),
+        "audioUrl": audio_url,
+    }
+
+# --- جلب الصوت مسبقاً وإعادة استخدام معرفات الملفات في تيليجرام ---
+# --- Audio prefetch and Telegram file_id reuse (shared file_id store) ---
+AUDIO_DOWNLOAD_TIMEOUT = 30.0
+
+def ayah_audio_content_key(audio_url: str) -> str:
+    return f"quran_audio:{audio_url}"
+
+async def prefetch_ayah_audio(audio_url: str | None):
+    """
+    تجهز مصدر الصوت للإرسال إذا لم يكن مرفوعاً من قبل.
+    Returns the upload source for `audio=`: the downloaded bytes as a named BytesIO, or
+    the URL itself when the audio already has a stored file_id (nothing to download)
+    or the download failed (Telegram then fetches the URL).
+    """
+    if not audio_url:
+        return None
+    if get_file_id(ayah_audio_content_key(audio_url)):
+        return audio_url # send_cached_media will use the file_id; the URL is only a fallback
+    try:
+        response = await get_with_retry(audio_url, timeout=AUDIO_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        buffer = io.BytesIO(response.content)
+        buffer.name = audio_url.rsplit('/', 1)[-1] or "ayah.mp3"
+        return buffer
     except Exception as e:
-        log.exception(f"Unexpected error fetching details (alquran.cloud)")
+        log.warning(f"Audio prefetch failed for {audio_url}, letting Telegram fetch the URL. Error: {e}")
+        return audio_url
+
+async def send_ayah_audio(client: Client, chat_id: int, audio_url: str, audio_source, caption: str, reply_to_message_id: int | None = None):
+    """Sends ayah audio through the shared limiter, reusing (or storing) its Telegram file_id."""
+    if audio_source is None:
         return None
+    return await send_limiter.run(
+        chat_id, send_cached_media,
+        ayah_audio_content_key(audio_url), client.send_audio, "audio", audio_source,
+        chat_id=chat_id, caption=caption, reply_to_message_id=reply_to_message_id
+    )
+
+# --- مخزن التفسير الدائم (SQLite) مع ذاكرة LRU ---
+# --- Persistent Tafsir store (SQLite) with an in-memory LRU on top ---
+TAFSIR_EDITION = "ar.muyassar"
+TAFSIR_DB_PATH = "tafsir_cache.db"
+TAFSIR_LRU_SIZE = 512 # Max Tafsir entries kept in memory
+TAFSIR_BULK_IMPORT = False # True: import the whole edition once in the background on first use
+TOTAL_AYAHS = 6236
+
+_tafsir_lru = OrderedDict() # {(surah, ayah): text}
+_tafsir_bulk_started = False
+_tafsir_bulk_task = None
+
+def get_tafsir_db_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(TAFSIR_DB_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    return conn
+
+def init_tafsir_db():
+    """Creates the Tafsir cache table if needed."""
+    try:
+        with get_tafsir_db_connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tafsir (edition TEXT NOT NULL, surah INTEGER NOT NULL, ayah INTEGER NOT NULL, "
+                "text TEXT NOT NULL, PRIMARY KEY (edition, surah, ayah)) WITHOUT ROWID;"
+            )
+    except sqlite3.Error:
+        log.exception(f"Failed to initialize Tafsir cache DB at {TAFSIR_DB_PATH}")
 
-# --- دالة مساعدة جديدة لجلب التفسير الميسر من alquran.cloud ---
+def _tafsir_lru_put(key: tuple, text: str):
+    _tafsir_lru[key] = text
+    _tafsir_lru.move_to_end(key)
+    while len(_tafsir_lru) > TAFSIR_LRU_SIZE:
+        _tafsir_lru.popitem(last=False)
+
+def get_cached_tafsir(surah_number: int, ayah_number: int) -> str | None:
+    """
+    يبحث عن التفسير في الذاكرة ثم في قاعدة البيانات المحلية.
+    Looks up Tafsir in the memory LRU first, then in the local SQLite store.
+    """
+    key = (surah_number, ayah_number)
+    text = _tafsir_lru.get(key)
+    if text is not None:
+        _tafsir_lru.move_to_end(key)
+        return text
+    try:
+        with get_tafsir_db_connection() as conn:
+            row = conn.execute(
+                "SELECT text FROM tafsir WHERE edition = ? AND surah = ? AND ayah = ?",
+                (TAFSIR_EDITION, surah_number, ayah_number)
+            ).fetchone()
+    except sqlite3.Error:
+        log.exception(f"Tafsir cache read failed for {surah_number}:{ayah_number}")
+        return None
+    if row:
+        _tafsir_lru_put(key, row[0])
+        return row[0]
+    return None
+
+def store_tafsir(surah_number: int, ayah_number: int, text: str):
+    """Write-through: stores Tafsir in the memory LRU and the SQLite store."""
+    _tafsir_lru_put((surah_number, ayah_number), text)
+    try:
+        with get_tafsir_db_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tafsir (edition, surah, ayah, text) VALUES (?, ?, ?, ?)",
+                (TAFSIR_EDITION, surah_number, ayah_number, text)
+            )
+    except sqlite3.Error:
+        log.exception(f"Tafsir cache write failed for {surah_number}:{ayah_number}")
+
+def count_cached_tafsir() -> int:
+    try:
+        with get_tafsir_db_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM tafsir WHERE edition = ?", (TAFSIR_EDITION,)).fetchone()[0]
+    except sqlite3.Error:
+        log.exception("Failed to count cached Tafsir entries")
+        return 0
+
+async def bulk_import_tafsir() -> int:
+    """
+    يستورد نسخة التفسير كاملة مرة واحدة إلى قاعدة البيانات المحلية.
+    One-shot import of the whole Tafsir edition into the local store. Returns the number of rows written.
+    """
+    url = f"https://api.alquran.cloud/v1/quran/{TAFSIR_EDITION}"
+    log.info(f"Bulk importing Tafsir edition from: {url}")
+    try:
+        response = await get_with_retry(url, timeout=120.0)
+        response.raise_for_status()
+        data = response.json()
+    except Exception:
+        log.exception("Bulk Tafsir import request failed")
+        return 0
+
+    if data.get('code') != 200 or not data.get('data'):
+        log.warning(f"API Error during bulk Tafsir import: {data.get('status')}")
+        return 0
+
+    rows = []
+    for surah in data['data'].get('surahs', []):
+        s_num = surah.get('number')
+        for ayah in surah.get('ayahs', []):
+            if s_num and ayah.get('numberInSurah') and ayah.get('text'):
+                rows.append((TAFSIR_EDITION, s_num, ayah['numberInSurah'], ayah['text']))
+    try:
+        with get_tafsir_db_connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO tafsir (edition, surah, ayah, text) VALUES (?, ?, ?, ?)", rows)
+    except sqlite3.Error:
+        log.exception("Failed to write bulk Tafsir import")
+        return 0
+    log.info(f"Bulk Tafsir import stored {len(rows)} entries.")
+    return len(rows)
+
+def schedule_tafsir_bulk_import():
+    """Starts the one-shot background import if enabled and the store is incomplete."""
+    global _tafsir_bulk_started, _tafsir_bulk_task
+    if not TAFSIR_BULK_IMPORT or _tafsir_bulk_started:
+        return
+    _tafsir_bulk_started = True
+    if count_cached_tafsir() >= TOTAL_AYAHS:
+        return # Store already complete
+    _tafsir_bulk_task = asyncio.create_task(bulk_import_tafsir()) # Keep a reference so the task isn't GC'd
+
+init_tafsir_db()
+
+# --- دالة مساعدة لجلب التفسير الميسر (من المخزن المحلي أولاً ثم alquran.cloud) ---
 async def get_tafseer_from_api(surah_number: int, ayah_number: int) -> str | None:
     """
-    يجلب التفسير الميسر لآية محددة باستخدام api.alquran.cloud.
-    Fetches Tafsir Al-Muyassar for a specific Ayah using api.alquran.cloud.
+    يجلب التفسير الميسر لآية محددة من المخزن المحلي، وعند عدم وجوده من api.alquran.cloud ثم يحفظه.
+    Fetches Tafsir Al-Muyassar for a specific Ayah from the local store, falling back to
+    api.alquran.cloud on a miss and writing the result through to the store.
     """
-    tafseer_url = f"https://api.alquran.cloud/v1/ayah/{surah_number}:{ayah_number}/ar.muyassar"
+    cached_text = get_cached_tafsir(surah_number, ayah_number)
+    if cached_text:
+        log.info(f"Tafsir cache hit for {surah_number}:{ayah_number}")
+        return cached_text
+    schedule_tafsir_bulk_import()
+
+    tafseer_url = f"https://api.alquran.cloud/v1/ayah/{surah_number}:{ayah_number}/{TAFSIR_EDITION}"
     log.info(f"Fetching Tafsir from alquran.cloud: {tafseer_url}")
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(tafseer_url)
-            response.raise_for_status() # Raise exception for bad status codes
-            data = response.json()
+        response = await get_with_retry(tafseer_url, timeout=10.0)
+        response.raise_for_status() # Raise exception for bad status codes
+        data = response.json()
 
         if data.get('code') == 200 and data.get('data'):
             tafseer_text = data['data'].get('text')
             if tafseer_text:
                  log.info(f"Tafsir found for {surah_number}:{ayah_number}")
+                 store_tafsir(surah_number, ayah_number, tafseer_text)
                  return tafseer_text # Return original text
             else:
                  log.warning(f"Tafsir text not found in response for {surah_number}:{ayah_number}")
@@ -328,9 +626,9 @@ if app: # فقط قم بتعريف المعالج إذا تم العثور عل
         m = await message.reply_text(f"⏳ جار البحث (بشكل تقريبي محلياً) عن آية تحتوي على: `{keyword}`...")
 
         try:
-            # 1. Search using local fuzzy matching helper function
-            #    البحث باستخدام دالة البحث التقريبي المحلية المساعدة
-            search_outcome = await search_ayah_local_json_fuzzy(keyword, quran_data)
+            # 1. Search using local fuzzy matching (served from the query cache when possible)
+            #    البحث باستخدام دالة البحث التقريبي المحلية (مع الذاكرة المؤقتة للاستعلامات)
+            search_outcome = await search_ayah_cached(keyword)
 
             # --- Handle outcome ---
             if search_outcome is None:
@@ -351,56 +649,65 @@ if app: # فقط قم بتعريف المعالج إذا تم العثور عل
                 if num_results <= 2:
                     # Display full details for 1 or 2 results
                     log.info(f"Displaying full details for {num_results} fuzzy result(s).")
+                    chat_id = message.chat.id
+                    prepared_results = []
                     for index, result_data in enumerate(search_outcome):
                         verse_key = result_data["verseKey"]
-                        # Use the original text from the local data for display
-                        # استخدام النص الأصلي من البيانات المحلية للعرض
-                        display_text = result_data["original_text"]
-                        score = result_data["score"]
                         surah_number, ayah_number = map(int, verse_key.split(':'))
-                        log.info(f"Processing fuzzy result {index+1}/{num_results}: {verse_key} (Score: {score})")
-
-                        # Get details (Surah Name, Audio only needed now)
-                        # جلب التفاصيل (اسم السورة والصوت فقط مطلوبان الآن)
-                        details = await get_ayah_details(surah_number, ayah_number)
-
-                        surah_name = f"سورة {surah_number}"
-                        audio_url = None
-                        if details:
-                            surah_name = details["surahName"]
-                            audio_url = details["audioUrl"]
-                            log.info(f"Successfully fetched details (audio/name) for {verse_key} from alquran.cloud.")
-                        else:
-                             log.error(f"Failed to fetch details (audio/name) for {verse_key} from alquran.cloud.")
-
-                        # Format the message using the ORIGINAL text from DB
-                        # تنسيق الرسالة باستخدام النص الأصلي من قاعدة البيانات
-                        formatted_message = (
-                            f"📖 **{surah_name}** ({index+1}/{num_results}) [Score: {score}%]\n"
-                            f"🔢 الآية: **{ayah_number}**\n\n"
-                            f"{display_text}" # Display original text
-                        )
-                        buttons = InlineKeyboardMarkup(
-                            [[InlineKeyboardButton("📜 عرض التفسير الميسر", callback_data=f"get_tafseer_{surah_number}:{ayah_number}")]]
-                        )
-                        text_message = await message.reply_text(
-                            formatted_message, reply_markup=buttons, disable_web_page_preview=True
-                        )
-                        log.info(f"Sent fuzzy text result {index+1}/{num_results} for {verse_key} to user {message.from_user.id}")
-
-                        if audio_url:
-                            try:
-                                reply_to_msg_id = text_message.id
-                                log.info(f"Sending audio: {audio_url} for {verse_key}")
-                                await message.reply_audio(
-                                    audio=audio_url, caption=f"🔊 تلاوة الآية {ayah_number} من سورة {surah_name}", reply_to_message_id=reply_to_msg_id
-                                )
-                                log.info(f"Sent audio for {verse_key} to user {message.from_user.id}")
-                            except Exception as audio_error:
-                                log.exception(f"Error sending audio for {verse_key}")
-
-                        if num_results > 1 and index < num_results - 1:
-                             await asyncio.sleep(1)
+                        # Get details (Surah Name, Audio) from the local tables
+                        # جلب التفاصيل (اسم السورة والصوت) من الجداول المحلية
+                        details = get_ayah_details(surah_number, ayah_number)
+                        if not details:
+                             log.error(f"Failed to resolve details (audio/name) for {verse_key} from local tables.")
+                        prepared_results.append({
+                            "verse_key": verse_key,
+                            "surah_number": surah_number,
+                            "ayah_number": ayah_number,
+                            # Use the original text from the local data for display
+                            # استخدام النص الأصلي من البيانات المحلية للعرض
+                            "display_text": result_data["original_text"],
+                            "score": result_data["score"],
+                            "surah_name": details["surahName"] if details else f"سورة {surah_number}",
+                            "audio_url": details["audioUrl"] if details else None,
+                        })
+
+                    # Start every audio download now so it overlaps with sending the text results
+                    # بدء تحميل جميع ملفات الصوت فوراً بالتوازي مع إرسال النصوص
+                    audio_tasks = [asyncio.create_task(prefetch_ayah_audio(item["audio_url"])) for item in prepared_results]
+                    try:
+                        for index, item in enumerate(prepared_results):
+                            verse_key = item["verse_key"]
+                            log.info(f"Processing fuzzy result {index+1}/{num_results}: {verse_key} (Score: {item['score']})")
+                            # Format the message using the ORIGINAL text from DB
+                            # تنسيق الرسالة باستخدام النص الأصلي من قاعدة البيانات
+                            formatted_message = (
+                                f"📖 **{item['surah_name']}** ({index+1}/{num_results}) [Score: {item['score']}%]\n"
+                                f"🔢 الآية: **{item['ayah_number']}**\n\n"
+                                f"{item['display_text']}" # Display original text
+                            )
+                            buttons = InlineKeyboardMarkup(
+                                [[InlineKeyboardButton("📜 عرض التفسير الميسر", callback_data=f"get_tafseer_{item['surah_number']}:{item['ayah_number']}")]]
+                            )
+                            text_message = await send_limiter.run(
+                                chat_id, message.reply_text,
+                                formatted_message, reply_markup=buttons, disable_web_page_preview=True
+                            )
+                            log.info(f"Sent fuzzy text result {index+1}/{num_results} for {verse_key} to user {message.from_user.id}")
+
+                            audio_source = await audio_tasks[index]
+                            if audio_source:
+                                try:
+                                    await send_ayah_audio(
+                                        client, chat_id, item["audio_url"], audio_source,
+                                        caption=f"🔊 تلاوة الآية {item['ayah_number']} من {item['surah_name']}",
+                                        reply_to_message_id=text_message.id
+                                    )
+                                    log.info(f"Sent audio for {verse_key} to user {message.from_user.id}")
+                                except Exception as audio_error:
+                                    log.exception(f"Error sending audio for {verse_key}")
+                    finally:
+                        for task in audio_tasks:
+                            task.cancel() # No-op for finished tasks; stops leftovers after an error
                     return
 
                 elif 3 <= num_results <= 5:
@@ -495,7 +802,6 @@ if app: # فقط قم بتعريف المعالج إذا تم العثور عل
         يعالج الضغط على زر عرض الآية كاملة، ويرسل النص الكامل الأصلي والصوت وزر التفسير.
         Handles the 'Show Full Ayah' button press, sends full original text, audio, and Tafsir button.
         """
-        global quran_data # Access loaded data to get original text
         try:
             match = callback_query.matches[0]
             s_num = int(match.group(1))
@@ -506,32 +812,21 @@ if app: # فقط قم بتعريف المعالج إذا تم العثور عل
             await callback_query.answer("جاري جلب الآية والتفاصيل...", show_alert=False)
 
             # --- Get original text from local data ---
-            original_verse_text = None
-            if quran_data:
-                 # Find the specific verse in the loaded data
-                 # البحث عن الآية المحددة في البيانات المحملة
-                 for ayah_obj in quran_data:
-                     if ayah_obj.get('sura_no') == s_num and ayah_obj.get('aya_no') == a_num:
-                         original_verse_text = ayah_obj.get('aya_text')
-                         break
+            ayah_obj = verse_index.get((s_num, a_num))
+            original_verse_text = ayah_obj.get('aya_text') if ayah_obj else None
             # --- End get original text ---
 
             if not original_verse_text:
                  log.error(f"Could not find original text for {s_num}:{a_num} in local JSON data.")
-                 # Fallback: try fetching from get_ayah_details (might be inconsistent)
-                 details_fallback = await get_ayah_details(s_num, a_num)
-                 if details_fallback and details_fallback.get("reciterVerseText"):
-                      original_verse_text = details_fallback["reciterVerseText"]
-                      log.warning("Using fallback text from get_ayah_details for full ayah display.")
-                 else:
-                      await callback_query.answer("عذراً، لم أتمكن من العثور على نص الآية.", show_alert=True)
-                      return
+                 await callback_query.answer("عذراً، لم أتمكن من العثور على نص الآية.", show_alert=True)
+                 return
 
             # Fetch details for Surah name and audio URL only
             # جلب التفاصيل لاسم السورة ورابط الصوت فقط
-            details = await get_ayah_details(s_num, a_num)
+            details = get_ayah_details(s_num, a_num)
             surah_name = details.get("surahName", f"سورة {s_num}") if details else f"سورة {s_num}"
             audio_url = details.get("audioUrl") if details else None
+            audio_task = asyncio.create_task(prefetch_ayah_audio(audio_url)) if audio_url else None # Overlaps with the text send
 
             # Use the original text fetched from local data (or fallback)
             # استخدام النص الأصلي الذي تم جلبه من البيانات المحلية (أو البديل)
@@ -557,7 +852,8 @@ if app: # فقط قم بتعريف المعالج إذا تم العثور عل
 
             # Send the full original verse as a new message
             # إرسال الآية الكاملة الأصلية كرسالة جديدة
-            sent_message = await callback_query.message.reply_text(
+            sent_message = await send_limiter.run(
+                callback_query.message.chat.id, callback_query.message.reply_text,
                 full_ayah_message,
                 reply_markup=buttons,
                 disable_web_page_preview=True
@@ -567,13 +863,12 @@ if app: # فقط قم بتعريف المعالج إذا تم العثور عل
             # Send audio if available, replying to the full text message
             if audio_url:
                 try:
-                    reply_to_msg_id = sent_message.id # ID of the message just sent
+                    audio_source = await audio_task
                     log.info(f"Sending audio: {audio_url} for {s_num}:{a_num}")
-                    await client.send_audio(
-                        chat_id=callback_query.message.chat.id,
-                        audio=audio_url,
-                        caption=f"🔊 تلاوة الآية {a_num} من سورة {surah_name}",
-                        reply_to_message_id=reply_to_msg_id
+                    await send_ayah_audio(
+                        client, callback_query.message.chat.id, audio_url, audio_source,
+                        caption=f"🔊 تلاوة الآية {a_num} من {surah_name}",
+                        reply_to_message_id=sent_message.id # ID of the message just sent
                     )
                     log.info(f"Sent audio for {s_num}:{a_num} to user {callback_query.from_user.id}")
                 except Exception as audio_error:
@@ -1,11 +1,14 @@
 import os
 import json
-import re
+import time
+import asyncio
+import sqlite3
 import unicodedata
 import logging
-import httpx # استخدام httpx للطلبات غير المتزامنة
+import httpx # أنواع أخطاء httpx (الطلبات تمر عبر العميل المشترك)
 import urllib.parse # لترميز رابط الـ API
 import traceback # لاستخدامه في طباعة تتبع الخطأ الكامل
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
@@ -13,15 +16,48 @@ from pyrogram import Client, filters
 from pyrogram.types import Message
 from pyrogram.errors import MessageDeleteForbidden, RPCError
 
+# --- العميل المشترك لطلبات HTTP ---
+try:
+    from .http_client import get_with_retry, close_on_stop
+except ImportError:
+    from http_client import get_with_retry, close_on_stop
+
+# --- التطبيع المشترك للنص العربي وتحويل HTML إلى نص ---
+try:
+    from .arabic_text import normalize_arabic
+    from .html_text import convert_html_to_text
+except ImportError:
+    from arabic_text import normalize_arabic
+    from html_text import convert_html_to_text
+
+# --- فهرس الأحاديث المحلي (hadiths_fts في hadith_store.py) كبديل عند بطء الـ API ---
+try:
+    from .hadith_store import search_hadiths_db, get_hadith_details
+except ImportError:
+    from hadith_store import search_hadiths_db, get_hadith_details
+
 # --- استيراد تطبيق YukkiMusic ---
 try:
     from YukkiMusic import app
 except ImportError:
     logging.error("Could not import 'app' from YukkiMusic. Ensure the path is correct.")
     app = None
+close_on_stop(app) # Close the shared HTTP client's pooled connections when the bot stops
 
 # --- الإعدادات ---
 API_TIMEOUT = 20 # مهلة طلب API بالثواني
+SEARCH_CACHE_SIZE = 512 # عدد الاستعلامات المحفوظة في الذاكرة
+SEARCH_CACHE_TTL_SECONDS = 3600 * 24 # مدة صلاحية النتائج المحفوظة
+EMPTY_RESULT_TTL_SECONDS = 600 # "لا نتائج" تُحفظ لمدة أقصر
+SEARCH_CACHE_DB_PATH = "sunah_cache.db"
+LOCAL_FALLBACK_DEADLINE_SECONDS = 3.0 # بعد هذه المهلة تُعرض نتيجة الفهرس المحلي إن لم يرد الـ API
+LOCAL_FALLBACK_RESULTS = 5
+# سبب عرض نتيجة الفهرس المحلي -> ملاحظة أسفل الرسالة
+LOCAL_FALLBACK_NOTES = {
+    "timeout": "خدمة البحث الدلالي لم تستجب في الوقت المحدد",
+    "error": "تعذر الوصول إلى خدمة البحث الدلالي",
+    "empty": "لم تجد خدمة البحث الدلالي نتائج لهذا البحث",
+}
 
 # --- التهيئة ---
 logging.basicConfig(
@@ -36,26 +72,13 @@ def log_error(message: str, error: Optional[Exception] = None):
     if error: logger.error(f"{message}: {error}", exc_info=True)
     else: logger.error(message)
 
-def convert_html_to_text(html_content: str) -> str:
-    """Converts HTML content to plain text. Requires `beautifulsoup4`."""
-    if not html_content: return ""
-    try:
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        for a_tag in soup.find_all('a'): a_tag.unwrap()
-        for matn_tag in soup.find_all('a', class_='matn'): matn_tag.unwrap()
-        return soup.get_text(separator=' ', strip=True)
-    except ImportError:
-        log_error("BeautifulSoup4 not installed. Cannot parse HTML.")
-        text = re.sub('<[^>]+>', ' ', html_content)
-        return ' '.join(text.split())
-    except Exception as e:
-        log_error("Error converting HTML to text", e)
-        return html_content
-
 # --- دالة البحث (API فقط) ---
-async def search_hadith_api(query: str) -> List[Dict[str, Any]]:
-    """Searches using Alminasa Semantic Search API based on provided JSON structure."""
+async def search_hadith_api(query: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Searches using Alminasa Semantic Search API based on provided JSON structure.
+    Returns the processed results ([] when the API found nothing), or None when the
+    request itself failed so that failures are never cached as "no results".
+    """
     if not query: return []
     encoded_query = urllib.parse.quote(query)
     api_url = f"https://alminasa.ai/api/semantic?search={encoded_query}"
@@ -63,41 +86,223 @@ async def search_hadith_api(query: str) -> List[Dict[str, Any]]:
     processed_results = []
     response = None
     try:
-        async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
-            response = await client.get(api_url)
-            response.raise_for_status()
-            results = response.json()
-            if isinstance(results, dict) and 'data' in results and isinstance(results['data'], list):
-                 actual_results = results.get('data', [])
-                 logger.info(f"[Hadith Search] API returned {len(actual_results)} results under 'data' key.")
-                 for item in actual_results:
-                    source_data = item.get('_source', {})
-                    if not source_data: continue
-                    processed_results.append({
-                        'hadith_id': source_data.get('hadith_id'), 'book': source_data.get('hadith_book_name', 'غير متوفر'),
-                        'text': source_data.get('matn_with_tashkeel', ''), 'chapter': source_data.get('chapter', 'غير متوفر'),
-                        'sub_chapter': source_data.get('sub_chapter'), 'page': source_data.get('page'),
-                        'volume': source_data.get('volume'), 'narrators': source_data.get('narrators', []),
-                        'rulings': source_data.get('rulings', [])
-                    })
-            else:
-                logger.warning(f"[Hadith Search] API returned unexpected structure or no 'data' key: {type(results)}")
-                logger.debug(f"[Hadith Search] API Response content (first 500 chars): {str(results)[:500]}")
+        response = await get_with_retry(api_url, timeout=API_TIMEOUT)
+        response.raise_for_status()
+        results = response.json()
+        if isinstance(results, dict) and 'data' in results and isinstance(results['data'], list):
+             actual_results = results.get('data', [])
+             logger.info(f"[Hadith Search] API returned {len(actual_results)} results under 'data' key.")
+             for item in actual_results:
+                source_data = item.get('_source', {})
+                if not source_data: continue
+                processed_results.append({
+                    'hadith_id': source_data.get('hadith_id'), 'book': source_data.get('hadith_book_name', 'غير متوفر'),
+                    'text': source_data.get('matn_with_tashkeel', ''), 'chapter': source_data.get('chapter', 'غير متوفر'),
+                    'sub_chapter': source_data.get('sub_chapter'), 'page': source_data.get('page'),
+                    'volume': source_data.get('volume'), 'narrators': source_data.get('narrators', []),
+                    'rulings': source_data.get('rulings', [])
+                })
+        else:
+            logger.warning(f"[Hadith Search] API returned unexpected structure or no 'data' key: {type(results)}")
+            logger.debug(f"[Hadith Search] API Response content (first 500 chars): {str(results)[:500]}")
     except httpx.HTTPStatusError as e:
         log_error(f"[Hadith Search] API request failed (HTTP Status {e.response.status_code}) for URL: {api_url}", e)
         if response: logger.debug(f"[Hadith Search] API Response body: {response.text}")
+        return None
     except httpx.RequestError as e:
         log_error(f"[Hadith Search] API request failed (Network/Timeout) for URL: {api_url}", e)
+        return None
     except json.JSONDecodeError as e:
         log_error(f"[Hadith Search] Failed to decode API JSON response from URL: {api_url}", e)
         if response:
             try: logger.debug(f"[Hadith Search] API Raw response text: {response.text}")
             except Exception as debug_err: log_error("[Hadith Search] Error trying to log raw API response text", debug_err)
+        return None
     except Exception as e:
         log_error(f"[Hadith Search] Unexpected error during API search for URL: {api_url}", e)
+        return None
     return processed_results
 
 
+# --- ذاكرة مؤقتة للنتائج (LRU في الذاكرة + SQLite، مع TTL) ودمج الطلبات المتزامنة ---
+# --- Result cache: normalized query -> processed results (memory LRU + SQLite, TTL) and single-flight ---
+_search_cache = OrderedDict() # {query_key: (expires_at, results)} - expires_at is wall-clock time (shared with SQLite)
+_inflight_searches: Dict[str, asyncio.Future] = {} # {query_key: task of the one in-flight API request}
+search_cache_stats = {"hits": 0, "db_hits": 0, "coalesced": 0, "misses": 0}
+
+def get_cache_db_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(SEARCH_CACHE_DB_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    return conn
+
+def init_cache_db():
+    """Creates the result cache table if needed and drops expired rows."""
+    try:
+        with get_cache_db_connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_results (query_key TEXT PRIMARY KEY, results TEXT NOT NULL, "
+                "expires_at REAL NOT NULL) WITHOUT ROWID;"
+            )
+            conn.execute("DELETE FROM search_results WHERE expires_at < ?", (time.time(),))
+    except sqlite3.Error as e:
+        log_error(f"Failed to initialize Hadith search cache DB at {SEARCH_CACHE_DB_PATH}", e)
+
+def make_search_cache_key(query: str) -> str:
+    """Normalized query (tashkeel, hamza/alef forms, spacing folded): "الصَّلاة" and "الصلاة" share one entry."""
+    return normalize_arabic(query)
+
+def _search_cache_put(query_key: str, results: List[Dict[str, Any]], expires_at: float):
+    _search_cache[query_key] = (expires_at, results)
+    _search_cache.move_to_end(query_key)
+    while len(_search_cache) > SEARCH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
+
+def get_cached_search(query_key: str) -> Optional[List[Dict[str, Any]]]:
+    """Returns unexpired cached results (possibly []) from memory, then SQLite; None on a miss."""
+    now = time.time()
+    entry = _search_cache.get(query_key)
+    if entry:
+        if entry[0] > now:
+            _search_cache.move_to_end(query_key)
+            search_cache_stats["hits"] += 1
+            return entry[1]
+        del _search_cache[query_key] # Expired
+    try:
+        with get_cache_db_connection() as conn:
+            row = conn.execute(
+                "SELECT results, expires_at FROM search_results WHERE query_key = ? AND expires_at > ?", (query_key, now)
+            ).fetchone()
+    except sqlite3.Error as e:
+        log_error(f"[Hadith Search] Cache read failed for '{query_key}'", e)
+        return None
+    if not row:
+        return None
+    try:
+        results = json.loads(row[0])
+    except json.JSONDecodeError as e:
+        log_error(f"[Hadith Search] Corrupt cache entry for '{query_key}'", e)
+        return None
+    _search_cache_put(query_key, results, row[1])
+    search_cache_stats["db_hits"] += 1
+    return results
+
+def store_search_results(query_key: str, results: List[Dict[str, Any]]):
+    """Write-through to the memory LRU and SQLite; empty results get the shorter TTL."""
+    expires_at = time.time() + (SEARCH_CACHE_TTL_SECONDS if results else EMPTY_RESULT_TTL_SECONDS)
+    _search_cache_put(query_key, results, expires_at)
+    try:
+        with get_cache_db_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_results (query_key, results, expires_at) VALUES (?, ?, ?)",
+                (query_key, json.dumps(results, ensure_ascii=False), expires_at)
+            )
+    except sqlite3.Error as e:
+        log_error(f"[Hadith Search] Cache write failed for '{query_key}'", e)
+
+async def _fetch_and_store(query_key: str, query: str) -> Optional[List[Dict[str, Any]]]:
+    results = await search_hadith_api(query)
+    if results is not None: # Failed requests are not cached
+        store_search_results(query_key, results)
+    return results
+
+async def search_hadith_cached(query: str) -> List[Dict[str, Any]]:
+    """
+    يبحث مع استخدام الذاكرة المؤقتة، ويدمج الطلبات المتطابقة المتزامنة في طلب واحد.
+    Same results as search_hadith_api, served from the cache when the normalized query
+    was seen within the TTL. Concurrent identical queries share one in-flight API request.
+    """
+    query_key = make_search_cache_key(query)
+    if not query_key:
+        return []
+    cached = get_cached_search(query_key)
+    if cached is not None:
+        logger.info(f"[Hadith Search] Cache hit for '{query_key}'.")
+        return cached
+    return await _search_hadith_single_flight(query_key, query) or []
+
+async def _search_hadith_single_flight(query_key: str, query: str) -> Optional[List[Dict[str, Any]]]:
+    """API request shared by concurrent identical queries; None when the request failed."""
+    task = _inflight_searches.get(query_key)
+    if task is None:
+        search_cache_stats["misses"] += 1
+        task = asyncio.ensure_future(_fetch_and_store(query_key, query))
+        _inflight_searches[query_key] = task
+        task.add_done_callback(lambda _task: _inflight_searches.pop(query_key, None))
+    else:
+        search_cache_stats["coalesced"] += 1
+        logger.info(f"[Hadith Search] Joining in-flight request for '{query_key}'.")
+    # shield: one waiter being cancelled must not cancel the request the others are waiting on
+    return await asyncio.shield(task)
+
+init_cache_db()
+
+
+# --- البديل المحلي: سباق بين الـ API والفهرس المحلي مع مهلة قصيرة ---
+# --- Local fallback: race the API against the shared hadiths_fts index with a short deadline ---
+_background_searches = set() # API requests still running after a local answer was served (they fill the cache)
+
+def _local_row_to_result(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps a hadiths_fts row to the same shape search_hadith_api returns."""
+    grading = row.get('grading')
+    return {
+        'hadith_id': row.get('original_id'), 'book': row.get('book') or 'غير متوفر',
+        'text': row.get('arabic_text', ''), 'chapter': '', 'sub_chapter': None, 'page': None,
+        'volume': None, 'narrators': [],
+        'rulings': [{'ruler': 'الدرجة', 'ruling': grading, 'book_name': row.get('book') or '?'}] if grading else [],
+        'source': 'local'
+    }
+
+async def search_hadith_local(query: str) -> List[Dict[str, Any]]:
+    """Top LOCAL_FALLBACK_RESULTS matches from the local FTS index ([] if unavailable)."""
+    try:
+        rowids = (await search_hadiths_db(query))[:LOCAL_FALLBACK_RESULTS]
+        if not rowids:
+            return []
+        details = await asyncio.to_thread(get_hadith_details, rowids)
+    except Exception as e:
+        log_error(f"[Hadith Search] Local fallback search failed for '{query}'", e)
+        return []
+    return [_local_row_to_result(details[rowid]) for rowid in rowids if rowid in details]
+
+async def search_hadith_with_fallback(query: str) -> List[Dict[str, Any]]:
+    """
+    يرجع نتائج الـ API إن وصلت خلال المهلة، وإلا نتائج الفهرس المحلي.
+    Cached results are returned directly. Otherwise the API and the local index are
+    queried concurrently: API results win if they arrive within LOCAL_FALLBACK_DEADLINE_SECONDS
+    (or whenever the local index has nothing). When the local answer is served, the API
+    request keeps running and its results land in the cache for the next identical query.
+    """
+    query_key = make_search_cache_key(query)
+    if not query_key:
+        return []
+    cached = get_cached_search(query_key)
+    if cached is not None:
+        return cached
+
+    api_task = asyncio.ensure_future(_search_hadith_single_flight(query_key, query))
+    local_task = asyncio.ensure_future(search_hadith_local(query))
+    await asyncio.wait({api_task}, timeout=LOCAL_FALLBACK_DEADLINE_SECONDS)
+    if api_task.done() and not api_task.cancelled() and not api_task.exception() and api_task.result():
+        local_task.cancel()
+        return api_task.result()
+
+    local_results = await local_task
+    if local_results:
+        if not api_task.done():
+            reason = "timeout"
+            logger.info(f"[Hadith Search] API slower than {LOCAL_FALLBACK_DEADLINE_SECONDS}s for '{query_key}'; serving local results.")
+            _background_searches.add(api_task)
+            api_task.add_done_callback(_background_searches.discard)
+        else:
+            reason = "empty" if not api_task.cancelled() and not api_task.exception() and api_task.result() == [] else "error"
+            logger.info(f"[Hadith Search] API {'returned no results' if reason == 'empty' else 'request failed'} for '{query_key}'; serving local results.")
+        for result in local_results:
+            result['fallback_reason'] = reason
+        return local_results
+    return await api_task or []
+
+
 # --- معالج الرسائل (Handler) ---
 if app:
     # --- إزالة group=-1 للعودة إلى الأولوية الافتراضية (0) ---
@@ -132,7 +337,7 @@ if app:
 
             # --- البحث باستخدام API ---
             logger.info(f"[Hadith Handler] Attempting API search for '{keyword}'")
-            api_result = await search_hadith_api(keyword)
+            api_result = await search_hadith_with_fallback(keyword)
 
             # --- التحقق من نتيجة API وإرسال الرد ---
             if api_result:
@@ -148,13 +353,17 @@ if app:
                 chapter_info = hadith.get('chapter', ''); sub_chapter_info = hadith.get('sub_chapter')
                 if chapter_info: formatted_message += f"📁 **الباب:** {chapter_info}" + (f" ({sub_chapter_info})" if sub_chapter_info else "") + "\n\n"
                 else: formatted_message += "\n"
-                formatted_message += f"📜 **الحديث:**\n{hadith.get('text', 'النص غير متوفر')}\n\n"
+                # التحويل من HTML يتم هنا فقط، للنتيجة المعروضة (النتائج المخزنة تبقى كما أرجعها الـ API)
+                formatted_message += f"📜 **الحديث:**\n{convert_html_to_text(hadith.get('text', '')) or 'النص غير متوفر'}\n\n"
                 info_parts = [];
                 if hadith.get('volume'): info_parts.append(f"المجلد: {hadith.get('volume')}")
                 if hadith.get('page'): info_parts.append(f"الصفحة: {hadith.get('page')}")
                 if info_parts: formatted_message += f"ℹ️ **معلومات:** {' | '.join(info_parts)}\n\n"
                 if narrators_str != 'غير متوفر': formatted_message += f"👥 **الرواة:** {narrators_str}\n\n"
                 if rulings_str != 'لا يوجد أحكام مرفقة': formatted_message += f"⚖️ **الأحكام:**\n{rulings_str}"
+                if hadith.get('source') == 'local':
+                    note = LOCAL_FALLBACK_NOTES.get(hadith.get('fallback_reason'), LOCAL_FALLBACK_NOTES["timeout"])
+                    formatted_message += f"\n\n🗂 _نتيجة من القاعدة المحلية ({note})._"
 
                 logger.info(f"[Hadith Handler] Attempting to send formatted result for '{keyword}'.")
                 await message.reply_text(formatted_message.strip(), quote=True, disable_web_page_preview=True)
@@ -206,6 +415,8 @@ Send a message starting with `حديث ` followed by your search keyword.
 **Note:**
 - This command relies entirely on the `https://alminasa.ai/api/semantic` API. Ensure the bot has internet access.
 - Only the first result found by the API will be displayed.
+- Results are cached for 24 hours, so repeated searches are answered instantly.
+- If the API is slow or down, the best match from the bot's local Hadith database is shown instead.
 """
 
 # --- رسالة عند تحميل الـ Plugin ---
@@ -2,11 +2,16 @@ import logging
 import asyncio
 import traceback
 import math
+import time
+import heapq
+import itertools
+import sqlite3
 import re # <-- لاستخدام Regex
-from typing import Dict, Tuple, Optional # <-- لإدارة المهام النشطة
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple # <-- لإدارة المؤقتات النشطة
 
 from pyrogram import Client, filters
-from pyrogram.errors import FloodWait, MessageDeleteForbidden, UserNotParticipant
+from pyrogram.errors import MessageDeleteForbidden, UserNotParticipant
 from pyrogram.types import Message
 from pyrogram.enums import ChatMemberStatus # <-- لاستخدام حالة العضو
 import pytimeparse
@@ -18,6 +23,11 @@ try:
 except ImportError:
     raise ImportError("لا يمكن استيراد 'app' من 'YukkiMusic'. تأكد من صحة المسار وهيكلة المشروع.")
 
+try:
+    from .flood_control import edit_scheduler
+except ImportError:
+    from flood_control import edit_scheduler
+
 # --- تهيئة مسجل خاص بهذه الوحدة ---
 # Initialize a logger specific to this module
 logger = logging.getLogger(__name__)
@@ -25,8 +35,8 @@ logger = logging.getLogger(__name__)
 
 # --- قاموس لتتبع المؤقتات النشطة، رسائل التنبيه، وحالة المشرف ---
 # Dictionary to track active timers, warning messages, and admin status
-# key: chat_id, value: (asyncio.Task, warning_message_id | None, started_by_admin: bool)
-active_timers: Dict[int, Tuple[asyncio.Task, Optional[int], bool]] = {}
+# key: chat_id, value: timer state dict (see new_timer); all timers share one scheduler task
+active_timers: Dict[int, dict] = {}
 
 
 # --- دالة مساعد للتحقق مما إذا كان المستخدم مشرفًا ---
@@ -94,123 +104,274 @@ def format_seconds_to_readable_time(total_seconds: int) -> str:
     return " و ".join(parts)
 
 
-# --- دالة غير متزامنة لتشغيل العد التنازلي وتحديث الرسالة ---
-# Asynchronous function to run the countdown and update the message
-async def run_countdown(client: Client, chat_id: int, message_id: int, total_seconds: int):
-    """
-    Manages the countdown timer, updating the message periodically with
-    minutes/seconds display, sending/deleting a warning, and handling cancellation.
-    """
-    seconds_left = total_seconds
-    last_update_time = asyncio.get_event_loop().time()
-    timer_id = f"{chat_id}_{message_id}" # معرف فريد للمؤقت (للتسجيل)
-    warning_sent = False
-    warning_message_id: int | None = None # لتخزين ID رسالة التنبيه
-    logger.info(f"بدء العد التنازلي {timer_id} لمدة {total_seconds} ثانية.")
+# --- إعدادات المجدول ---
+# Scheduler settings
+TIMERS_DB_PATH = "timers.db" # Active timers survive restarts
+WARNING_SECONDS = 30
+MAX_EDIT_INTERVAL_SECONDS = 5.0 # Long timers; short ones edit as often as edit_scheduler allows per chat
+RESTORE_POLL_SECONDS = 2
+
+# --- مجدول مركزي واحد لكل المؤقتات ---
+# One scheduler task for every timer: a heap of (wake_at, seq, chat_id, version).
+# Each timer has exactly one live heap entry; re-scheduling bumps its version so
+# older entries are skipped when they surface. The task sleeps until the earliest
+# entry, so wakeups follow edits/deadlines, not seconds.
+_timer_heap: List[Tuple[float, int, int, int]] = []
+_timer_seq = itertools.count()
+_timer_wakeup = asyncio.Event() # Set when an entry earlier than the current head is pushed
+_timer_scheduler_task: Optional[asyncio.Task] = None
+_timer_steps: Set[asyncio.Task] = set() # Strong refs to running per-timer steps
+_timers_restored = False
+
+
+def get_timers_db_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(TIMERS_DB_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    return conn
 
+
+def init_timers_db():
     try:
-        while seconds_left > 0:
+        with get_timers_db_connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS active_timers (chat_id INTEGER PRIMARY KEY, message_id INTEGER NOT NULL, "
+                "total_seconds INTEGER NOT NULL, deadline REAL NOT NULL, started_by_admin INTEGER NOT NULL, "
+                "warning_message_id INTEGER)"
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to initialize timers DB at {TIMERS_DB_PATH}: {e}")
 
-            # --- إرسال تنبيه عند 30 ثانية ---
-            if seconds_left <= 30 and not warning_sent:
-                try:
-                    sent_warning_msg = await client.send_message(
-                        chat_id=chat_id,
-                        text="⚠️ **تنبيه:** تبقى 30 ثانية أو أقل على انتهاء المؤقت!",
-                        reply_to_message_id=message_id
-                    )
-                    warning_message_id = sent_warning_msg.id # تخزين ID الرسالة
-                    # تحديث القاموس بمعرف رسالة التنبيه
-                    if chat_id in active_timers:
-                         task, _, started_by_admin = active_timers[chat_id] # تجاهل معرف التنبيه القديم
-                         active_timers[chat_id] = (task, warning_message_id, started_by_admin) # تحديث بمعرف التنبيه الجديد
-
-                    warning_sent = True
-                    logger.info(f"تم إرسال تنبيه الـ 30 ثانية ({warning_message_id}) للمؤقت {timer_id}.")
-                except Exception as warn_err:
-                    logger.error(f"فشل إرسال تنبيه الـ 30 ثانية للمؤقت {timer_id}: {warn_err}")
-            # ------------------------------------
-
-            # حساب التقدم وعرض الوقت المتبقي بالدقائق والثواني
-            seconds_elapsed = total_seconds - seconds_left
-            progress_bar = render_progressbar(total_seconds, seconds_elapsed)
-            readable_time_left = format_seconds_to_readable_time(seconds_left)
-            message_text = f"⏳ الوقت المتبقي: **{readable_time_left}**\n{progress_bar}"
-
-            current_time = asyncio.get_event_loop().time()
-            update_interval = max(1.0, min(5.0, total_seconds / 100.0))
-
-            if current_time - last_update_time >= update_interval:
-                try:
-                    await client.edit_message_text(
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        text=message_text
-                    )
-                    last_update_time = current_time
-                except FloodWait as e:
-                    logger.warning(f"FloodWait للمؤقت {timer_id}: الانتظار لمدة {e.value} ثانية.")
-                    await asyncio.sleep(e.value + 0.5)
-                except Exception as e:
-                    logger.error(f"خطأ أثناء تحديث المؤقت {timer_id}: {e}")
-                    if "MESSAGE_ID_INVALID" in str(e) or "MESSAGE_NOT_MODIFIED" in str(e):
-                        logger.warning(f"إيقاف المؤقت {timer_id} بسبب خطأ في تعديل الرسالة.")
-                        return # الخروج من الدالة سيؤدي إلى تنفيذ finally
-            # إنقاص الوقت والانتظار
-            seconds_left -= 1
-            await asyncio.sleep(1)
-
-        # --- العد التنازلي انتهى ---
-        final_message = "✅ الوقت انتهى!"
-        progress_bar = render_progressbar(total_seconds, total_seconds)
-        final_message += f"\n{progress_bar}"
-        try:
-            await client.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=final_message
+
+def save_timer(timer: dict):
+    try:
+        with get_timers_db_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO active_timers (chat_id, message_id, total_seconds, deadline, started_by_admin, warning_message_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (timer["chat_id"], timer["message_id"], timer["total_seconds"], timer["deadline"],
+                 int(timer["started_by_admin"]), timer["warning_message_id"])
             )
-            logger.info(f"اكتمل المؤقت {timer_id}.")
-        except Exception as e:
-            logger.error(f"خطأ أثناء تحديث الرسالة النهائية للمؤقت {timer_id}: {e}")
+    except sqlite3.Error as e:
+        logger.error(f"فشل حفظ المؤقت للدردشة {timer['chat_id']}: {e}")
 
-    except asyncio.CancelledError:
-        logger.info(f"تم إلغاء العد التنازلي للمؤقت {timer_id}")
-        try:
-             await client.edit_message_text(chat_id, message_id, "🚫 تم إيقاف المؤقت.")
-        except Exception as edit_err:
-             logger.error(f"فشل تعديل رسالة الإيقاف للمؤقت {timer_id}: {edit_err}")
+
+def delete_saved_timer(chat_id: int):
+    try:
+        with get_timers_db_connection() as conn:
+            conn.execute("DELETE FROM active_timers WHERE chat_id = ?", (chat_id,))
+    except sqlite3.Error as e:
+        logger.error(f"فشل حذف المؤقت المحفوظ للدردشة {chat_id}: {e}")
+
+
+def load_saved_timers() -> List[tuple]:
+    try:
+        with get_timers_db_connection() as conn:
+            return conn.execute(
+                "SELECT chat_id, message_id, total_seconds, deadline, started_by_admin, warning_message_id FROM active_timers"
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"فشل تحميل المؤقتات المحفوظة: {e}")
+        return []
+
+
+def new_timer(client: Client, chat_id: int, message_id: int, total_seconds: int, deadline: float,
+              started_by_admin: bool, warning_message_id: Optional[int] = None) -> dict:
+    """حالة مؤقت واحد. `deadline` وقت حائطي (time.time) ليبقى صالحاً بعد إعادة التشغيل."""
+    edit_interval = max(edit_scheduler.per_chat_interval, min(MAX_EDIT_INTERVAL_SECONDS, total_seconds / 100.0))
+    return {
+        "client": client,
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "total_seconds": total_seconds,
+        "deadline": deadline,
+        "started_by_admin": started_by_admin,
+        "warning_message_id": warning_message_id,
+        "warning_sent": warning_message_id is not None,
+        "edit_interval": edit_interval,
+        "next_edit_at": time.time() + edit_interval, # The confirmation message covers the first interval
+        "version": 0,
+    }
+
+
+def render_timer_text(timer: dict, now: float) -> str:
+    total_seconds = timer["total_seconds"]
+    seconds_left = max(0, math.ceil(timer["deadline"] - now))
+    progress_bar = render_progressbar(total_seconds, total_seconds - seconds_left)
+    return f"⏳ الوقت المتبقي: **{format_seconds_to_readable_time(seconds_left)}**\n{progress_bar}"
+
+
+def _next_wake(timer: dict) -> float:
+    wake_at = min(timer["deadline"], timer["next_edit_at"])
+    if not timer["warning_sent"]:
+        wake_at = min(wake_at, timer["deadline"] - WARNING_SECONDS)
+    return wake_at
+
+
+def schedule_timer(timer: dict):
+    """Pushes the timer's next wakeup, replacing its previous heap entry, and makes sure the scheduler runs."""
+    global _timer_scheduler_task
+    timer["version"] += 1
+    wake_at = _next_wake(timer)
+    if not _timer_heap or wake_at < _timer_heap[0][0]:
+        _timer_wakeup.set()
+    heapq.heappush(_timer_heap, (wake_at, next(_timer_seq), timer["chat_id"], timer["version"]))
+    if _timer_scheduler_task is None or _timer_scheduler_task.done():
+        _timer_scheduler_task = asyncio.create_task(_timer_scheduler_loop())
+
+
+async def _timer_scheduler_loop():
+    """Sleeps until the earliest due timer, runs its step, repeats; exits when no timer is left."""
+    global _timer_scheduler_task
+    try:
+        while _timer_heap:
+            delay = _timer_heap[0][0] - time.time()
+            if delay > 0:
+                _timer_wakeup.clear()
+                try:
+                    await asyncio.wait_for(_timer_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, chat_id, version = heapq.heappop(_timer_heap)
+            timer = active_timers.get(chat_id)
+            if timer is None or timer["version"] != version:
+                continue # Stale entry: the timer was stopped or re-scheduled
+            # Network calls run outside the loop so a slow edit never delays other timers.
+            # A timer has no heap entry while its step runs, so its edits can't pile up.
+            step = asyncio.create_task(_run_timer_step(timer))
+            _timer_steps.add(step)
+            step.add_done_callback(_timer_steps.discard)
+    finally:
+        _timer_scheduler_task = None
+
+
+async def _send_warning(timer: dict):
+    timer_id = f"{timer['chat_id']}_{timer['message_id']}"
+    timer["warning_sent"] = True
+    try:
+        sent_warning_msg = await timer["client"].send_message(
+            chat_id=timer["chat_id"],
+            text=f"⚠️ **تنبيه:** تبقى {WARNING_SECONDS} ثانية أو أقل على انتهاء المؤقت!",
+            reply_to_message_id=timer["message_id"]
+        )
+    except Exception as warn_err:
+        logger.error(f"فشل إرسال تنبيه الـ {WARNING_SECONDS} ثانية للمؤقت {timer_id}: {warn_err}")
+        return
+    if active_timers.get(timer["chat_id"]) is not timer: # Stopped while the warning was being sent
+        await _delete_warning(timer["client"], timer["chat_id"], sent_warning_msg.id)
+        return
+    timer["warning_message_id"] = sent_warning_msg.id
+    save_timer(timer)
+    logger.info(f"تم إرسال تنبيه الـ {WARNING_SECONDS} ثانية ({sent_warning_msg.id}) للمؤقت {timer_id}.")
+
+
+async def _delete_warning(client: Client, chat_id: int, warning_message_id: int):
+    try:
+        await client.delete_messages(chat_id=chat_id, message_ids=warning_message_id)
+        logger.info(f"تم حذف رسالة التنبيه {warning_message_id} في الدردشة {chat_id}.")
+    except MessageDeleteForbidden:
+        logger.warning(f"ليس لدي صلاحية حذف رسالة التنبيه {warning_message_id} في الدردشة {chat_id}.")
+    except Exception as del_err:
+        logger.error(f"فشل حذف رسالة التنبيه {warning_message_id}: {del_err}")
+
+
+def _edit_timer_message(timer: dict, now: float):
+    """
+    Hands the current countdown text to the shared edit scheduler (per-chat/global budget,
+    latest text wins, unchanged text skipped). Close to the deadline the pending update is
+    dropped instead, so no stale countdown lands late and the final edit isn't queued behind it.
+    """
+    timer["next_edit_at"] = now + timer["edit_interval"]
+    if timer["deadline"] - now < edit_scheduler.per_chat_interval:
+        edit_scheduler.forget(timer["chat_id"], timer["message_id"])
+        return
+    client, chat_id, message_id = timer["client"], timer["chat_id"], timer["message_id"]
+
+    async def on_error(error: Exception):
+        if "MESSAGE_ID_INVALID" in str(error) and active_timers.get(chat_id) is timer:
+            logger.warning(f"إيقاف المؤقت {chat_id}_{message_id} لأن رسالته لم تعد موجودة.")
+            await end_timer(timer, None)
+
+    edit_scheduler.submit(chat_id, message_id, render_timer_text(timer, now), partial(client.edit_message_text, chat_id, message_id), on_error=on_error)
+
+
+async def _run_timer_step(timer: dict):
+    """Handles everything due for one timer at this wakeup (warning, edit, end), then re-schedules it."""
+    try:
+        now = time.time()
+        if now >= timer["deadline"]:
+            final_message = "✅ الوقت انتهى!\n" + render_progressbar(timer["total_seconds"], timer["total_seconds"])
+            await end_timer(timer, final_message)
+            logger.info(f"اكتمل المؤقت {timer['chat_id']}_{timer['message_id']}.")
+            return
+        if not timer["warning_sent"] and now >= timer["deadline"] - WARNING_SECONDS:
+            await _send_warning(timer)
+        if now >= timer["next_edit_at"]:
+            _edit_timer_message(timer, now)
     except Exception as e:
-        logger.error(f"خطأ غير متوقع في run_countdown للمؤقت {timer_id}: {e}")
+        logger.error(f"خطأ غير متوقع في خطوة المؤقت {timer['chat_id']}_{timer['message_id']}: {e}")
         traceback.print_exc()
+    if active_timers.get(timer["chat_id"]) is timer:
+        schedule_timer(timer)
+
+
+async def end_timer(timer: dict, final_text: Optional[str]):
+    """
+    يزيل المؤقت من القائمة والقاعدة، ويعدل رسالته إلى `final_text`، ويحذف رسالة التنبيه.
+    Removes the timer (memory + DB), edits its message to `final_text` and deletes the warning.
+    """
+    chat_id = timer["chat_id"]
+    if active_timers.get(chat_id) is timer:
+        active_timers.pop(chat_id)
+        delete_saved_timer(chat_id) # A replacing timer saves its own row after this
+    timer["version"] += 1 # Invalidates the pending heap entry
+    if final_text:
         try:
-            await client.send_message(chat_id, "حدث خطأ أثناء تشغيل المؤقت.")
-        except Exception as send_err:
-            logger.error(f"فشل إرسال رسالة الخطأ إلى {chat_id}: {send_err}")
-    finally:
-        # --- التنظيف: إزالة المؤقت من القائمة وحذف رسالة التنبيه ---
-        logger.debug(f"Entering finally block for timer {timer_id}")
-        warn_msg_id_to_delete = None
+            await edit_scheduler.edit_now(chat_id, timer["message_id"], final_text,
+                                          partial(timer["client"].edit_message_text, chat_id, timer["message_id"]))
+        except Exception as edit_err:
+            logger.error(f"فشل تعديل الرسالة النهائية للمؤقت {chat_id}_{timer['message_id']}: {edit_err}")
+    else:
+        edit_scheduler.forget(chat_id, timer["message_id"])
+    if timer["warning_message_id"]:
+        await _delete_warning(timer["client"], chat_id, timer["warning_message_id"])
+
+
+async def restore_timers(client: Client):
+    """
+    يعيد المؤقتات المحفوظة بعد إعادة التشغيل. المؤقتات التي انتهت أثناء التوقف تُختم فوراً.
+    Re-schedules timers saved before a restart; those whose deadline passed meanwhile
+    are due immediately and get their final edit on the first scheduler wakeup.
+    """
+    global _timers_restored
+    if _timers_restored:
+        return
+    _timers_restored = True
+    restored = 0
+    for chat_id, message_id, total_seconds, deadline, started_by_admin, warning_message_id in load_saved_timers():
         if chat_id in active_timers:
-            # استرجع معرف رسالة التنبيه قبل الحذف
-            _, warn_msg_id_to_delete, _ = active_timers.pop(chat_id)
-            logger.info(f"تمت إزالة المؤقت {timer_id} من القائمة النشطة.")
-        else:
-             logger.warning(f"المؤقت {timer_id} لم يكن في القائمة النشطة عند محاولة الإزالة.")
-
-        # حذف رسالة التنبيه إن وجدت
-        if warn_msg_id_to_delete:
-            logger.debug(f"محاولة حذف رسالة التنبيه {warn_msg_id_to_delete} للمؤقت {timer_id}")
-            try:
-                await client.delete_messages(chat_id=chat_id, message_ids=warn_msg_id_to_delete)
-                logger.info(f"تم حذف رسالة التنبيه {warn_msg_id_to_delete} للمؤقت {timer_id}.")
-            except MessageDeleteForbidden:
-                 logger.warning(f"ليس لدي صلاحية حذف رسالة التنبيه {warn_msg_id_to_delete} في الدردشة {chat_id}.")
-            except Exception as del_err:
-                logger.error(f"فشل حذف رسالة التنبيه {warn_msg_id_to_delete}: {del_err}")
-        else:
-            logger.debug(f"لا يوجد معرف لرسالة التنبيه لحذفه للمؤقت {timer_id}")
-        # ---------------------------------------------------------
+            continue
+        timer = new_timer(client, chat_id, message_id, total_seconds, deadline, bool(started_by_admin), warning_message_id)
+        timer["next_edit_at"] = 0.0 # Refresh the message right away
+        active_timers[chat_id] = timer
+        schedule_timer(timer)
+        restored += 1
+    if restored:
+        logger.info(f"تمت استعادة {restored} مؤقت(ات) من {TIMERS_DB_PATH}.")
+
+
+async def _restore_timers_when_ready():
+    """Waits for the bot to finish connecting, then restores the saved timers."""
+    while not (getattr(app, "is_connected", False) and getattr(app, "me", None)):
+        await asyncio.sleep(RESTORE_POLL_SECONDS)
+    await restore_timers(app)
+
+
+init_timers_db()
+try:
+    _restore_task = asyncio.get_running_loop().create_task(_restore_timers_when_ready())
+except RuntimeError: # Imported outside the event loop: restored on the first timer command instead
+    _restore_task = None
 
 
 # --- دالة مساعدة لبدء منطق المؤقت ---
@@ -218,11 +379,12 @@ async def run_countdown(client: Client, chat_id: int, message_id: int, total_sec
 async def start_timer_logic(client: Client, message: Message, time_input: str):
     """
     Parses time, validates permissions, stops existing timer if allowed,
-    sends confirmation, and starts countdown task.
+    sends confirmation, and hands the countdown to the shared scheduler.
     """
     chat_id = message.chat.id
     user_id = message.from_user.id
     seconds = None
+    await restore_timers(client)
     original_input_for_confirmation = time_input
 
     # --- التحقق من صلاحيات المستخدم ---
@@ -233,7 +395,7 @@ async def start_timer_logic(client: Client, message: Message, time_input: str):
     # --- التحقق من المؤقت القديم وصلاحيات الاستبدال ---
     # --- Check old timer and replacement permissions ---
     if chat_id in active_timers:
-        old_task, old_warning_id, old_timer_is_admin_started = active_timers[chat_id]
+        old_timer_is_admin_started = active_timers[chat_id]["started_by_admin"]
         logger.info(f"العثور على مؤقت نشط في الدردشة {chat_id} (بدأه مشرف: {old_timer_is_admin_started}).")
 
         # المنع إذا كان المستخدم الحالي ليس مشرفًا والمؤقت القديم بدأه مشرف
@@ -242,14 +404,9 @@ async def start_timer_logic(client: Client, message: Message, time_input: str):
             logger.info(f"User {user_id} (non-admin) blocked from replacing admin timer in chat {chat_id}.")
             return
 
-        # إذا كان المستخدم مشرفًا أو المؤقت القديم لم يبدأه مشرف، قم بالإلغاء
-        logger.info(f"User {user_id} allowed to replace timer in chat {chat_id}. Cancelling old timer.")
-        try:
-            if not old_task.done():
-                 old_task.cancel()
-        except Exception as cancel_err:
-             logger.error(f"خطأ أثناء محاولة إلغاء المؤقت القديم في الدردشة {chat_id}: {cancel_err}")
-        # لا تقم بالإزالة من active_timers هنا، سيتم ذلك في finally الخاص بالمهمة القديمة
+        # إذا كان المستخدم مشرفًا أو المؤقت القديم لم يبدأه مشرف، قم بالإيقاف
+        logger.info(f"User {user_id} allowed to replace timer in chat {chat_id}. Stopping old timer.")
+        await end_timer(active_timers[chat_id], "🚫 تم إيقاف المؤقت.")
     # ---------------------------------------------
 
     # التحقق مما إذا كان الإدخال رقمًا فقط (يعني دقائق)
@@ -296,10 +453,14 @@ async def start_timer_logic(client: Client, message: Message, time_input: str):
         logger.error(f"فشل في إرسال رسالة التأكيد إلى {chat_id}: {e}")
         return
 
-    # بدء العد التنازلي وتخزين المهمة وحالة المشرف
-    task = asyncio.create_task(run_countdown(client, chat_id, message_id, seconds))
-    # تخزين المهمة ومعرف التنبيه (None مبدئيًا) وحالة المشرف
-    active_timers[chat_id] = (task, None, current_user_is_admin)
+    # تسجيل المؤقت في المجدول المركزي وحفظه ليبقى بعد إعادة التشغيل
+    if chat_id in active_timers: # Another timer started while the confirmation was being sent
+        await end_timer(active_timers[chat_id], "🚫 تم إيقاف المؤقت.")
+    timer = new_timer(client, chat_id, message_id, seconds, time.time() + seconds, current_user_is_admin)
+    active_timers[chat_id] = timer
+    save_timer(timer)
+    schedule_timer(timer)
+    logger.info(f"بدء العد التنازلي {chat_id}_{message_id} لمدة {seconds} ثانية.")
     logger.info(f"تم تخزين المؤقت الجديد (بدأه مشرف: {current_user_is_admin}) للدردشة {chat_id} في القائمة النشطة.")
 
 
@@ -308,9 +469,11 @@ async def start_timer_logic(client: Client, message: Message, time_input: str):
 async def stop_timer_logic(client: Client, message: Message, chat_id: int, user_id: int):
     """Handles the logic for stopping a timer with permission checks."""
     logger.debug(f"stop_timer_logic called by user {user_id} in chat {chat_id}")
+    await restore_timers(client)
 
     if chat_id in active_timers:
-        task, warning_id, timer_is_admin_started = active_timers[chat_id]
+        timer = active_timers[chat_id]
+        timer_is_admin_started = timer["started_by_admin"]
         logger.info(f"Found active timer in chat {chat_id} to stop (admin started: {timer_is_admin_started}).")
 
         # التحقق من صلاحية الإيقاف
@@ -324,20 +487,12 @@ async def stop_timer_logic(client: Client, message: Message, chat_id: int, user_
             return
 
         # السماح بالإيقاف (إما المستخدم مشرف أو المؤقت لم يبدأه مشرف)
-        if not task.done():
-            try:
-                task.cancel()
-                # الرسالة سيتم إرسالها بواسطة run_countdown عند الإلغاء
-                logger.info(f"Cancel request sent for timer in chat {chat_id} by user {user_id}.")
-                # يمكن إضافة رد هنا إذا أردت تأكيدًا فوريًا
-                # await message.reply_text("✅ تم إرسال طلب إيقاف المؤقت.")
-            except Exception as e:
-                await message.reply_text("❌ حدث خطأ أثناء محاولة إيقاف المؤقت.")
-                logger.error(f"Error cancelling timer in chat {chat_id}: {e}")
-        else:
+        if active_timers.get(chat_id) is not timer:
             await message.reply_text("⚠️ يبدو أن المؤقت قد انتهى بالفعل.")
             logger.warning(f"Attempted to stop an already finished timer in chat {chat_id}.")
-            active_timers.pop(chat_id, None) # إزالته احتياطًا
+            return
+        await end_timer(timer, "🚫 تم إيقاف المؤقت.")
+        logger.info(f"Timer in chat {chat_id} stopped by user {user_id}.")
     else:
         await message.reply_text("⚠️ لا يوجد مؤقت نشط لإيقافه في هذه الدردشة.")
 
@@ -1,4 +1,3 @@
-import requests
 import random  # استيراد مكتبة الاختيار العشوائي
 import re     # استيراد مكتبة التعابير النمطية
 from pyrogram import filters
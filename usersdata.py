@@ -5,6 +5,7 @@ import time
 import asyncio
 import os # Import os for lock file handling
 import logging # Import the logging module
+from array import array # Packed user ID lists for bulk-action checkpoints
 from datetime import datetime, timedelta, timezone # Import timezone
 
 # --- Configure Logging ---
@@ -16,8 +17,7 @@ logging.basicConfig(
 log = logging.getLogger(__name__) # Create a logger instance for this module
 
 from pyrogram import filters, Client
-# Added ChatMembersFilter for new commands
-from pyrogram.enums import UserStatus, ParseMode, ChatMemberStatus, ChatMembersFilter
+from pyrogram.enums import UserStatus, ParseMode, ChatMemberStatus
 # Import specific exceptions for error handling
 from pyrogram.errors import PeerIdInvalid, FloodWait, UserIsBlocked, ChatAdminRequired, UserNotParticipant
 # Import types needed for new features
@@ -25,13 +25,30 @@ from pyrogram.types import (
     Message, User, Chat, ChatMemberUpdated, ChatPrivileges, ChatPermissions, ChatMember
 )
 
+# Shared adaptive token bucket (AIMD on FloodWait)
+try:
+    from .flood_control import TokenBucket, edit_scheduler
+except ImportError:
+    from flood_control import TokenBucket, edit_scheduler
+
+# Shared per-chat member roster (kept up to date from the handlers below)
+try:
+    from .member_roster import FLAG_BANNED, FLAG_RESTRICTED, FLAG_BOT, FLAG_DELETED, get_roster, note_user, apply_member_update, set_member_status, forget_member
+except ImportError:
+    from member_roster import FLAG_BANNED, FLAG_RESTRICTED, FLAG_BOT, FLAG_DELETED, get_roster, note_user, apply_member_update, set_member_status, forget_member
+
 # --- Configuration ---
 DB_FILE = "user_stats.db" # Database for message counts AND user status
 ADMIN_DB_FILE = "admin_actions.db" # Separate DB for admin actions
 # ADMIN_IDS list removed - Only Owner is exempt from auto-demote now
 DEFAULT_KICK_THRESHOLD = 3
-# Delay between actions in loops to avoid FloodWait
-LOOP_DELAY_SECONDS = 1.5
+# Bulk actions (clear banned / restricted): bounded concurrency + adaptive rate instead of a fixed delay
+BULK_CONCURRENCY = 4 # Parallel unban/unrestrict calls in flight
+BULK_START_RATE = 2.0 # Actions per second at the start; halved on every FloodWait, grows back on success (AIMD)
+BULK_MAX_RATE = 6.0
+BULK_MAX_ATTEMPTS = 3 # Non-FloodWait failures before an item is given up (FloodWait retries don't count)
+BULK_PROGRESS_INTERVAL_SECONDS = 5 # Status message edits (and checkpoints) at most this often
+BULK_CHECKPOINT_MAX_AGE_SECONDS = 24 * 3600 # Older checkpoints describe a stale member list: start fresh instead of resuming
 
 # --- New Feature Settings & Variables ---
 welcome_enabled = True
@@ -106,6 +123,18 @@ def init_admin_db():
                 kick_threshold INTEGER DEFAULT {DEFAULT_KICK_THRESHOLD}
             )
             ''')
+            # Table for resumable bulk actions (remaining user IDs packed as int64)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bulk_action_checkpoints (
+                chat_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                remaining BLOB NOT NULL,
+                done_count INTEGER DEFAULT 0,
+                failed_count INTEGER DEFAULT 0,
+                updated_at INTEGER NOT NULL,
+                PRIMARY KEY (chat_id, action)
+            )
+            ''')
             # Add other columns if they don't exist (from other plugins)
             try: cursor.execute("ALTER TABLE chat_settings ADD COLUMN is_chat_locked INTEGER DEFAULT 0")
             except sqlite3.OperationalError: pass
@@ -292,6 +321,7 @@ async def count_new_message(client: Client, message: Message):
     if not message.from_user: return # Ignore messages without a sender (e.g., channel posts)
     chat_id = message.chat.id
     user_id = message.from_user.id
+    note_user(chat_id, message.from_user) # Keep the member roster current (no RPC)
     try:
         # Connect to the database
         with sqlite3.connect(DB_FILE) as conn:
@@ -591,6 +621,7 @@ async def auto_demote_on_kick(client: Client, chat_member_updated: ChatMemberUpd
     they will be automatically demoted. Uses admin_actions.db SQLite database.
     Owner is exempt.
     """
+    apply_member_update(chat_member_updated) # Keep the member roster current (join/leave/ban/restrict/promote)
     if not welcome_enabled: return # Check if the feature is globally enabled
 
     try:
@@ -1014,6 +1045,114 @@ async def set_kick_threshold_command(client: Client, message: Message):
         await message.reply_text("⚠️ حدث خطأ أثناء حفظ الإعداد في قاعدة البيانات.")
 
 
+# --- Bulk Action Executor (bounded concurrency, AIMD rate, retry queue, checkpoints) ---
+bulk_actions_running = set() # {(chat_id, action)}: one run per chat and action at a time
+
+def load_bulk_checkpoint(chat_id: int, action: str):
+    """Returns (remaining_ids, done_count, failed_count) of an interrupted run, or None (expired checkpoints are dropped)."""
+    try:
+        with sqlite3.connect(ADMIN_DB_FILE) as conn:
+            row = conn.execute(
+                "SELECT remaining, done_count, failed_count, updated_at FROM bulk_action_checkpoints WHERE chat_id = ? AND action = ?",
+                (chat_id, action)
+            ).fetchone()
+    except sqlite3.Error:
+        log.exception(f"[DB:{ADMIN_DB_FILE}] Failed to read bulk checkpoint ({chat_id}, {action})")
+        return None
+    if not row: return None
+    if time.time() - row[3] > BULK_CHECKPOINT_MAX_AGE_SECONDS:
+        log.info(f"Discarding expired bulk checkpoint ({chat_id}, {action}) from {int(time.time() - row[3])}s ago.")
+        clear_bulk_checkpoint(chat_id, action)
+        return None
+    remaining = array('q'); remaining.frombytes(row[0])
+    return remaining.tolist(), row[1], row[2]
+
+def save_bulk_checkpoint(chat_id: int, action: str, remaining_ids, done_count: int, failed_count: int):
+    try:
+        with sqlite3.connect(ADMIN_DB_FILE) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO bulk_action_checkpoints (chat_id, action, remaining, done_count, failed_count, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, action, array('q', sorted(remaining_ids)).tobytes(), done_count, failed_count, int(time.time()))
+            )
+    except sqlite3.Error:
+        log.exception(f"[DB:{ADMIN_DB_FILE}] Failed to save bulk checkpoint ({chat_id}, {action})")
+
+def clear_bulk_checkpoint(chat_id: int, action: str):
+    try:
+        with sqlite3.connect(ADMIN_DB_FILE) as conn:
+            conn.execute("DELETE FROM bulk_action_checkpoints WHERE chat_id = ? AND action = ?", (chat_id, action))
+    except sqlite3.Error:
+        log.exception(f"[DB:{ADMIN_DB_FILE}] Failed to clear bulk checkpoint ({chat_id}, {action})")
+
+async def run_bulk_action(chat_id: int, action: str, user_ids: list, apply_func, status_message: Message,
+                          progress_label: str, done_count: int = 0, failed_count: int = 0) -> dict:
+    """
+    Applies `apply_func(user_id)` to every user with BULK_CONCURRENCY workers paced by a shared
+    TokenBucket (AIMD: FloodWait halves the rate and pauses all workers, success grows it back).
+    FloodWait items go back on the queue; other failures are retried up to BULK_MAX_ATTEMPTS.
+    The remaining IDs are checkpointed to ADMIN_DB_FILE with every (throttled) progress edit,
+    so re-running the command after a restart resumes. ChatAdminRequired aborts the run
+    (checkpoint kept) and is re-raised.
+    """
+    stats = {"total": done_count + failed_count + len(user_ids), "done": done_count, "failed": failed_count}
+    remaining = set(user_ids)
+    queue = asyncio.Queue()
+    for user_id in user_ids: queue.put_nowait((user_id, 0))
+    bucket = TokenBucket(BULK_START_RATE, capacity=BULK_CONCURRENCY, max_rate=BULK_MAX_RATE, increase_step=0.05)
+    last_progress_text = None
+
+    async def report_progress():
+        nonlocal last_progress_text
+        text = (f"⏳ {progress_label}\n"
+                f"تم: **{stats['done']}** / {stats['total']} | فشل: {stats['failed']} | المتبقي: {len(remaining)}\n"
+                f"المعدل الحالي: {bucket.rate:.1f} عملية/ثانية")
+        if text == last_progress_text: return # Nothing changed: no checkpoint, no edit
+        last_progress_text = text
+        save_bulk_checkpoint(chat_id, action, remaining, stats['done'], stats['failed'])
+        edit_scheduler.update_message(status_message, text) # Shared edit budget; never blocks the workers
+
+    async def progress_loop():
+        while True:
+            await asyncio.sleep(BULK_PROGRESS_INTERVAL_SECONDS)
+            await report_progress()
+
+    async def worker():
+        while True:
+            try: user_id, attempts = queue.get_nowait()
+            except asyncio.QueueEmpty: return
+            await bucket.acquire()
+            try:
+                await apply_func(user_id)
+                bucket.on_success()
+                stats['done'] += 1; remaining.discard(user_id)
+            except FloodWait as e:
+                if time.monotonic() >= bucket.paused_until: # Workers already in flight hit the same FloodWait: one decrease per pause
+                    log.warning(f"FloodWait {e.value}s during bulk {action} in chat {chat_id}; rate -> {bucket.rate * 0.5:.2f}/s, item requeued.")
+                    bucket.on_flood_wait(float(e.value or 1))
+                queue.put_nowait((user_id, attempts)) # Not the item's fault: retry without counting an attempt
+            except ChatAdminRequired:
+                raise
+            except Exception as e:
+                if attempts + 1 < BULK_MAX_ATTEMPTS:
+                    queue.put_nowait((user_id, attempts + 1))
+                else:
+                    log.error(f"Bulk {action} gave up on user {user_id} in chat {chat_id} after {BULK_MAX_ATTEMPTS} attempts: {e}")
+                    stats['failed'] += 1; remaining.discard(user_id)
+
+    progress_task = asyncio.create_task(progress_loop())
+    workers = [asyncio.create_task(worker()) for _ in range(min(BULK_CONCURRENCY, max(1, len(user_ids))))]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers: task.cancel()
+        save_bulk_checkpoint(chat_id, action, remaining, stats['done'], stats['failed']) # Resume from here next time
+        raise
+    finally:
+        progress_task.cancel()
+    clear_bulk_checkpoint(chat_id, action)
+    return stats
+
+
 # --- NEW: Command to unban all users ---
 @app.on_message(filters.command("مسح المحظورين", prefixes=[""]) & filters.group)
 async def unban_all_command(client: Client, message: Message):
@@ -1027,43 +1166,47 @@ async def unban_all_command(client: Client, message: Message):
         await message.reply_text(f"عذراً [{user_making_request.mention}]، يجب أن تكون المالك أو مشرفاً لديه صلاحية رفع المشرفين وتغيير معلومات المجموعة لاستخدام هذا الأمر.")
         return
 
-    unbanned_count = 0
-    status_message = await message.reply_text("⏳ جارِ البحث عن المحظورين وإلغاء حظرهم...")
+    if (chat_id, "unban") in bulk_actions_running:
+        await message.reply_text("⏳ عملية مسح المحظورين جارية بالفعل في هذه المجموعة.")
+        return
+    bulk_actions_running.add((chat_id, "unban")) # قبل أول await حتى لا يمر أمر ثانٍ متزامن
+    try:
+        status_message = await message.reply_text("⏳ جارِ البحث عن المحظورين وإلغاء حظرهم...")
+    except BaseException:
+        bulk_actions_running.discard((chat_id, "unban"))
+        raise
+
+    async def unban(user_id: int):
+        await client.unban_chat_member(chat_id, user_id)
+        forget_member(chat_id, user_id) # بعد إلغاء الحظر لم يعد في الدردشة
 
     try:
-        # جلب قائمة الأعضاء المحظورين
-        # ملاحظة: قد يتطلب هذا صلاحيات إدارية كاملة للبوت
-        async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.BANNED):
-            try:
-                # محاولة إلغاء الحظر
-                await client.unban_chat_member(chat_id, member.user.id)
-                unbanned_count += 1
-                log.info(f"Unbanned user {member.user.id} in chat {chat_id}")
-                # تأخير بسيط لتجنب أخطاء FloodWait
-                await asyncio.sleep(LOOP_DELAY_SECONDS)
-            except FloodWait as e:
-                log.warning(f"FloodWait encountered while unbanning in chat {chat_id}. Sleeping for {e.value} seconds.")
-                await asyncio.sleep(e.value + 2) # انتظر للمدة المحددة + ثانيتين إضافية
-                # أعد محاولة إلغاء الحظر بعد الانتظار
-                try:
-                     await client.unban_chat_member(chat_id, member.user.id)
-                     unbanned_count += 1
-                     log.info(f"Unbanned user {member.user.id} in chat {chat_id} after FloodWait.")
-                except Exception as retry_err:
-                     log.error(f"Failed to unban user {member.user.id} after FloodWait: {retry_err}")
-            except Exception as e:
-                log.error(f"Failed to unban user {member.user.id} in chat {chat_id}: {e}")
+        checkpoint = load_bulk_checkpoint(chat_id, "unban")
+        if checkpoint:
+            # استئناف عملية سابقة توقفت (إعادة تشغيل البوت أو خطأ)
+            banned_ids, done_count, failed_count = checkpoint
+            log.info(f"Resuming unban all in chat {chat_id}: {len(banned_ids)} remaining.")
+        else:
+            # قائمة المحظورين من سجل الأعضاء المخزن (بدون إعادة جلب قائمة الأعضاء في كل مرة)
+            # ملاحظة: قد يتطلب هذا صلاحيات إدارية كاملة للبوت
+            roster = await get_roster(client, chat_id)
+            banned_ids = [user_id for user_id, _, _ in roster.iter_members(include=FLAG_BANNED)]
+            done_count = failed_count = 0
+        stats = await run_bulk_action(chat_id, "unban", banned_ids, unban, status_message, "جارِ إلغاء حظر المحظورين...", done_count, failed_count)
 
         # تحديث رسالة الحالة بالنتيجة النهائية
-        await status_message.edit_text(f"✅ اكتمل مسح المحظورين.\nتم إلغاء حظر **{unbanned_count}** عضو.")
-        log.info(f"Unban all completed in chat {chat_id}. Unbanned: {unbanned_count}")
+        failed_text = f"\nتعذر إلغاء حظر **{stats['failed']}** عضو." if stats['failed'] else ""
+        await edit_scheduler.finish_message(status_message, f"✅ اكتمل مسح المحظورين.\nتم إلغاء حظر **{stats['done']}** عضو.{failed_text}")
+        log.info(f"Unban all completed in chat {chat_id}. Unbanned: {stats['done']}, failed: {stats['failed']}")
 
     except ChatAdminRequired:
         log.error(f"Bot lacks admin rights to get banned members in chat {chat_id}")
-        await status_message.edit_text("⚠️ فشل الأمر. البوت لا يملك الصلاحيات الكافية لجلب قائمة المحظورين أو إلغاء حظرهم.")
+        await edit_scheduler.finish_message(status_message, "⚠️ فشل الأمر. البوت لا يملك الصلاحيات الكافية لجلب قائمة المحظورين أو إلغاء حظرهم.")
     except Exception as e:
         log.exception(f"Error during unban all process in chat {chat_id}: {e}")
-        await status_message.edit_text(f"❌ حدث خطأ غير متوقع أثناء عملية مسح المحظورين: {e}")
+        await edit_scheduler.finish_message(status_message, f"❌ حدث خطأ غير متوقع أثناء عملية مسح المحظورين: {e}")
+    finally:
+        bulk_actions_running.discard((chat_id, "unban"))
 
 
 # --- NEW: Command to clear bot-mutes ---
@@ -1111,48 +1254,47 @@ async def unrestrict_all_command(client: Client, message: Message):
         await message.reply_text(f"عذراً [{user_making_request.mention}]، يجب أن تكون المالك أو مشرفاً لديه صلاحية رفع المشرفين وتغيير معلومات المجموعة لاستخدام هذا الأمر.")
         return
 
-    unrestricted_count = 0
-    status_message = await message.reply_text("⏳ جارِ البحث عن المقيدين وإلغاء تقييدهم...")
+    if (chat_id, "unrestrict") in bulk_actions_running:
+        await message.reply_text("⏳ عملية مسح المقيدين جارية بالفعل في هذه المجموعة.")
+        return
+    bulk_actions_running.add((chat_id, "unrestrict")) # قبل أول await حتى لا يمر أمر ثانٍ متزامن
+    try:
+        status_message = await message.reply_text("⏳ جارِ البحث عن المقيدين وإلغاء تقييدهم...")
+    except BaseException:
+        bulk_actions_running.discard((chat_id, "unrestrict"))
+        raise
+
+    async def unrestrict(user_id: int):
+        # إلغاء التقييد ومنح صلاحيات العضو العادي
+        await client.restrict_chat_member(chat_id, user_id, permissions=regular_member_permissions)
+        set_member_status(chat_id, user_id, 0) # عضو عادي الآن
 
     try:
-        # جلب قائمة الأعضاء المقيدين
-        async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.RESTRICTED):
-            # تجاهل البوتات والمستخدمين المحذوفين إن أمكن
-            if member.user.is_bot or member.user.is_deleted: continue
-            try:
-                # محاولة إلغاء التقييد ومنح صلاحيات العضو العادي
-                await client.restrict_chat_member(
-                    chat_id,
-                    member.user.id,
-                    permissions=regular_member_permissions # استخدام الصلاحيات المعرفة مسبقاً
-                )
-                unrestricted_count += 1
-                log.info(f"Unrestricted user {member.user.id} in chat {chat_id}")
-                # تأخير بسيط
-                await asyncio.sleep(LOOP_DELAY_SECONDS)
-            except FloodWait as e:
-                log.warning(f"FloodWait encountered while unrestricting in chat {chat_id}. Sleeping for {e.value} seconds.")
-                await asyncio.sleep(e.value + 2)
-                # إعادة المحاولة بعد الانتظار
-                try:
-                    await client.restrict_chat_member(chat_id, member.user.id, permissions=regular_member_permissions)
-                    unrestricted_count += 1
-                    log.info(f"Unrestricted user {member.user.id} in chat {chat_id} after FloodWait.")
-                except Exception as retry_err:
-                     log.error(f"Failed to unrestrict user {member.user.id} after FloodWait: {retry_err}")
-            except Exception as e:
-                log.error(f"Failed to unrestrict user {member.user.id} in chat {chat_id}: {e}")
+        checkpoint = load_bulk_checkpoint(chat_id, "unrestrict")
+        if checkpoint:
+            # استئناف عملية سابقة توقفت (إعادة تشغيل البوت أو خطأ)
+            restricted_ids, done_count, failed_count = checkpoint
+            log.info(f"Resuming unrestrict all in chat {chat_id}: {len(restricted_ids)} remaining.")
+        else:
+            # قائمة المقيدين من سجل الأعضاء المخزن، مع تجاهل البوتات والمستخدمين المحذوفين
+            roster = await get_roster(client, chat_id)
+            restricted_ids = [user_id for user_id, _, _ in roster.iter_members(include=FLAG_RESTRICTED, exclude=FLAG_BOT | FLAG_DELETED)]
+            done_count = failed_count = 0
+        stats = await run_bulk_action(chat_id, "unrestrict", restricted_ids, unrestrict, status_message, "جارِ إلغاء تقييد المقيدين...", done_count, failed_count)
 
         # تحديث رسالة الحالة بالنتيجة النهائية
-        await status_message.edit_text(f"✅ اكتمل مسح المقيدين.\nتم إلغاء تقييد **{unrestricted_count}** عضو.")
-        log.info(f"Unrestrict all completed in chat {chat_id}. Unrestricted: {unrestricted_count}")
+        failed_text = f"\nتعذر إلغاء تقييد **{stats['failed']}** عضو." if stats['failed'] else ""
+        await edit_scheduler.finish_message(status_message, f"✅ اكتمل مسح المقيدين.\nتم إلغاء تقييد **{stats['done']}** عضو.{failed_text}")
+        log.info(f"Unrestrict all completed in chat {chat_id}. Unrestricted: {stats['done']}, failed: {stats['failed']}")
 
     except ChatAdminRequired:
         log.error(f"Bot lacks admin rights to get/unrestrict members in chat {chat_id}")
-        await status_message.edit_text("⚠️ فشل الأمر. البوت لا يملك الصلاحيات الكافية لجلب قائمة المقيدين أو إلغاء تقييدهم.")
+        await edit_scheduler.finish_message(status_message, "⚠️ فشل الأمر. البوت لا يملك الصلاحيات الكافية لجلب قائمة المقيدين أو إلغاء تقييدهم.")
     except Exception as e:
         log.exception(f"Error during unrestrict all process in chat {chat_id}: {e}")
-        await status_message.edit_text(f"❌ حدث خطأ غير متوقع أثناء عملية مسح المقيدين: {e}")
+        await edit_scheduler.finish_message(status_message, f"❌ حدث خطأ غير متوقع أثناء عملية مسح المقيدين: {e}")
+    finally:
+        bulk_actions_running.discard((chat_id, "unrestrict"))
 
 
 # --- Help and Module Info (Updated with new command permissions) ---